@@ -1,17 +1,25 @@
+import logging
 import streamlit as st
-from chains.intent_chain import get_intent_and_slots
-from chains.destination_chain import recommend_destinations
-from chains.itinerary_chain import generate_itinerary
-from chains.explainability_chain import generate_explanation
-from guards.guardrails import input_guardrails, output_guardrails
-from utils.format_output import format_response
-from utils.evaluate_response import evaluate_response
+from utils.chat_history import ChatHistory, prune_spill_files
+from utils.planner_client import PlannerClient, PLANNER_SERVICE_URL
+from utils.resilient_llm import LLMUnavailableError
+from utils.sessions import new_session_id
+
+logger = logging.getLogger(__name__)
 
 # -------------------------
 # Initialize session state
 # -------------------------
+if "session_id" not in st.session_state:
+    st.session_state.session_id = new_session_id()
+
+# Capped in memory, older messages spill to disk (see utils.chat_history)
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = ChatHistory(st.session_state.session_id)
+
+# How many pages of history are shown ("Load older" adds one)
+if "history_pages" not in st.session_state:
+    st.session_state.history_pages = 1
 
 if "slots" not in st.session_state:
     st.session_state.slots = {
@@ -31,109 +39,116 @@ def update_slots(new_slots: dict):
             st.session_state.slots[key] = value
     return st.session_state.slots
 
-# -------------------------
-# Chat bubble renderer
-# -------------------------
-def render_chat(user_input=None, agent_response=None, is_warning=False):
-    if user_input:
-        st.markdown(f"""
-            <div style='text-align: right; margin-bottom: 10px;'>
-                <div style='display: inline-block; background-color: #cce5ff; 
-                            color: black; padding: 10px 15px; 
-                            border-radius: 15px; max-width: 75%;'>
-                    <b>You:</b><br>{user_input}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-
-    if is_warning and agent_response:
-        st.markdown(f"""
-            <div style='text-align: left; margin-bottom: 20px;'>
-                <div style='display: inline-block; background-color: #ffcccc; 
-                            color: black; padding: 10px 15px; 
-                            border-radius: 15px; max-width: 75%;'>
-                    <b>⚠️ Travel Assistant Warning:</b><br>{agent_response}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-    elif agent_response:
-        st.markdown(f"""
-            <div style='text-align: left; margin-bottom: 20px;'>
-                <div style='display: inline-block; background-color: #f1f0f0; 
-                            color: black; padding: 10px 15px; 
-                            border-radius: 15px; max-width: 75%;'>
-                    <b>Travel Assistant 🤖:</b><br>{agent_response}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-
-
 # -------------------------
 # Streamlit App
 # -------------------------
 st.set_page_config(page_title="Agentic Voyage", page_icon="🧳")
 st.title("✈ Agentic Voyage...")
 
-query = st.text_input("Ask your Agentic AI Powered travel Agent about your travel Itinerary?")
-
-if query:
+# Build the shared LLM / embedder / retriever once per server process instead
+# of on import of every chain module; later sessions reuse the same instances.
+@st.cache_resource(show_spinner="Warming up models...")
+def warm_up_models():
+    from utils.model_registry import warm_up
+    from utils.telemetry import start_metrics_server
+    start_metrics_server()  # only when METRICS_PORT is set
+    return warm_up()
+
+# With PLANNER_SERVICE_URL set, this script is a thin client of service.py:
+# the models, session slot memory and pipeline all live in the service.
+@st.cache_resource
+def get_planner_client():
+    return PlannerClient(PLANNER_SERVICE_URL)
+
+# Once per server process: drop history spill files of long-gone sessions
+@st.cache_resource
+def prune_chat_history():
+    return prune_spill_files()
+
+prune_chat_history()
+
+if PLANNER_SERVICE_URL:
+    planner_client = get_planner_client()
+else:
+    from chains.intent_chain import get_intent_and_slots
+    from chains.pipeline import plan_trip, stream_plan
+    warm_up_report = warm_up_models()
+
+stream_responses = st.sidebar.checkbox("Stream responses", value=True)
+
+# A form hands each query over once: later reruns ("Load older", the stream
+# toggle) see an empty box instead of re-planning the last query
+with st.form("query_form", clear_on_submit=True):
+    query = st.text_input("Ask your Agentic AI Powered travel Agent about your travel Itinerary?")
+    submitted = st.form_submit_button("Plan my trip")
+
+if submitted and query:
     with st.spinner("Planning your trip..."):
         try:
+            if PLANNER_SERVICE_URL:
+                # Steps 1-2 happen in the service, which keeps the slot memory
+                session_id = st.session_state.session_id
+                if stream_responses:
+                    events = planner_client.stream(query, session_id)
+                else:
+                    events = [planner_client.plan(query, session_id)]
+            else:
+                # Step 1: Extract intent + slots
+                intent, new_slots = get_intent_and_slots(query)
+                logger.debug("Intent and slots extracted: %s", new_slots)
 
-            st.write("huggingface_hub version:", huggingface_hub.__version__)
-
-            st.write("Running Agentic Voyage app")
-            # Step 1: Extract intent + slots
-            intent, new_slots = get_intent_and_slots(query)
-            print("Intent and slots extracted:", new_slots)
+                # Step 2: Merge into memory
+                slots = update_slots(new_slots)
+                logger.debug("Merged slots memory: %s", slots)
 
-            # Step 2: Merge into memory
-            slots = update_slots(new_slots)
-            print("Merged slots memory:", slots)
+                # Guardrails, retrieval, itinerary and explanation run as a
+                # stage graph; the LLM judge runs offline (evaluate_offline.py).
+                events = stream_plan(slots, live=True) if stream_responses \
+                    else [plan_trip(slots, live=True)]
 
             # Step 3: Save user bubble
-            st.session_state.chat_history.append((query, None, False))
-
-            # Step 4: Apply input guardrails
-            guard_check = input_guardrails(slots)
-            if guard_check["blocked"]:
-                warning_text = f"{guard_check['response']}"
-                st.session_state.chat_history.append((None, warning_text, True))
+            st.session_state.chat_history.append(query, None, False)
+
+            # Step 4: Render the day-by-day plan as tokens arrive
+            live_bubble = st.empty()
+            for event in events:
+                if event.get("type") == "partial":
+                    live_bubble.markdown(event["response"])
+                elif event.get("type") == "context":
+                    st.session_state.slots = event["slots"]
+                else:
+                    plan = event
+            live_bubble.empty()
+            if "slots" in plan:
+                st.session_state.slots = plan["slots"]
+            logger.debug("Pipeline stage timings: %s cached: %s", plan["timings"], plan["cached"])
+
+            if plan["blocked"]:
+                warning_text = f"{plan['response']}"
+                st.session_state.chat_history.append(None, warning_text, True)
             else:
-                # Step 5: Run pipeline
-                destination_result = recommend_destinations(slots)
-                print("Destination result extracted...")
-
-                itinerary = generate_itinerary(destination_result, slots)
-                print("Itinerary result generated...")
-
-                explanation = generate_explanation(itinerary, destination_result)
-                print("Explanation generated...")
-
-                # Step 6: Apply output guardrails
-                final_output = output_guardrails({
-                    "itinerary": itinerary,
-                    "explanation": explanation
-                })
-
-                formatted_response = format_response(final_output)
-
-                evaluated_response = evaluate_response(formatted_response)
-
-                print("Evaluated response generated...", evaluated_response)
-
-                # Step 7: Save assistant bubble
-                st.session_state.chat_history.append((None, formatted_response, False))
+                # Step 5: Save assistant bubble
+                st.session_state.chat_history.append(None, plan["response"], False)
 
+        except LLMUnavailableError:
+            error_msg = ("⚠️ The travel planner's language models are not responding right now. "
+                         "Please try again in a minute.")
+            st.session_state.chat_history.append(None, error_msg, True)
         except Exception as e:
             error_msg = f"⚠️ Sorry, an error occurred: {str(e)}"
-            st.session_state.chat_history.append((None, error_msg, True))
+            st.session_state.chat_history.append(None, error_msg, True)
 
 # -------------------------
 # Display conversation
 # -------------------------
-for user_input, assistant_reply, is_warning in st.session_state.chat_history:
-    render_chat(user_input, assistant_reply, is_warning)
+# Only the latest pages, as one block of HTML rendered when each message was added
+shown = st.session_state.chat_history.latest(st.session_state.history_pages)
+if shown and shown[0][0] > 0:
+    if st.button(f"⬆️ Load older messages ({shown[0][0]} more)"):
+        st.session_state.history_pages += 1
+        st.rerun()
+if shown:
+    st.markdown("\n".join(rendered for _, _, rendered in shown), unsafe_allow_html=True)
 
 # -------------------------
 # Styling (auto scroll)
@@ -0,0 +1,233 @@
+# batch_plan.py
+"""
+Headless batch planner: pre-generate trip plans for a JSONL file of queries.
+
+    python batch_plan.py queries.jsonl plans.jsonl --concurrency 8
+
+Each input line is a JSON object with the query under "query" (or "body",
+"text", "title") and an optional "id" (or "request_id"); lines without an id
+are numbered. Every query goes through intent extraction and ``plan_trip``
+(guardrails → retrieval → destination → itinerary → explanation → format)
+with at most ``--concurrency`` queries in flight, and each result is
+appended to the output file as soon as it is done.
+
+The output file is the checkpoint: ids already planned are skipped, so an
+interrupted run picks up where it stopped, and queries that failed are
+planned again (their new record supersedes the error). At the end throughput and
+p50/p95/p99 latency per stage are printed (and written with ``--report``).
+
+Every in-flight query can occupy up to three stage threads at once, so keep
+PIPELINE_WORKERS at roughly 3x the concurrency.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from chains.intent_chain import extract_intent_and_slots
+from chains.pipeline import plan_trip
+from utils.latency import latency_summary
+from utils.model_registry import warm_up
+from utils.telemetry import start_metrics_server
+
+QUERY_FIELDS = ("query", "body", "text", "title")
+ID_FIELDS = ("id", "request_id")
+
+
+# -------------------------
+# Input / checkpoint
+# -------------------------
+def read_queries(path: str):
+    """Yield ``(id, query)`` for every usable line of ``path``."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️ Skipping line {line_number}: not valid JSON")
+                continue
+            if isinstance(record, str):
+                record = {"query": record}
+            query = next((record[k] for k in QUERY_FIELDS if record.get(k)), None)
+            if not query:
+                print(f"⚠️ Skipping line {line_number}: no query field")
+                continue
+            query_id = next((record[k] for k in ID_FIELDS if record.get(k) is not None),
+                            f"line-{line_number}")
+            yield str(query_id), str(query)
+
+
+def completed_ids(path: str) -> set:
+    """
+    Ids already planned in the output. A query whose last record holds an
+    error (e.g. both LLM backends were down) is planned again. A crash
+    mid-write can leave a torn last line; it is cut off so the query is
+    simply planned again.
+    """
+    if not os.path.exists(path):
+        return set()
+    failed, good_bytes = {}, 0
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw)
+                failed[str(record["id"])] = record.get("error") is not None
+            except (ValueError, KeyError):
+                break
+            good_bytes += len(raw)
+    if good_bytes != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good_bytes)
+    return {query_id for query_id, error in failed.items() if not error}
+
+
+# -------------------------
+# Planning
+# -------------------------
+def plan_query(query_id: str, query: str, evaluate: bool = False, use_cache: bool = True) -> dict:
+    """Plan one query; errors are recorded in the result instead of raised."""
+    start = time.perf_counter()
+    record = {"id": query_id, "query": query}
+    try:
+        intent_start = time.perf_counter()
+        intent, slots, path = extract_intent_and_slots(query)
+        intent_seconds = round(time.perf_counter() - intent_start, 4)
+
+        plan = plan_trip(slots, evaluate=evaluate, use_cache=use_cache)
+        record.update({
+            "intent": intent,
+            "slots": slots,
+            "extraction_path": path,
+            "blocked": plan["blocked"],
+            "cached": plan["cached"],
+            "response": plan["response"],
+            "timings": {"intent": intent_seconds, **plan["timings"]},
+            "error": None,
+        })
+    except Exception as e:
+        record.update({"timings": {}, "error": f"{type(e).__name__}: {e}"})
+    record["timings"]["total"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+class BatchStats:
+    def __init__(self):
+        self.counts = {"planned": 0, "blocked": 0, "cached": 0, "errors": 0}
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            self.counts["planned"] += 1
+            self.counts["blocked"] += bool(record.get("blocked"))
+            self.counts["cached"] += bool(record.get("cached"))
+            self.counts["errors"] += record["error"] is not None
+            for stage, seconds in record["timings"].items():
+                self.samples.setdefault(stage, []).append(seconds)
+
+    def report(self, elapsed: float, skipped: int) -> dict:
+        return {
+            **self.counts,
+            "skipped": skipped,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_qps": round(self.counts["planned"] / elapsed, 3) if elapsed else 0.0,
+            "latency": latency_summary(self.samples),
+        }
+
+
+def run_batch(input_path: str, output_path: str, concurrency: int = 8, evaluate: bool = False,
+              use_cache: bool = True, limit: int = None) -> dict:
+    """
+    Plan every query of ``input_path`` not yet in ``output_path``. Queries are
+    read lazily, so only ``concurrency`` of them are held in memory at a time.
+    """
+    done = completed_ids(output_path)
+    stats, skipped = BatchStats(), 0
+    write_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def pending():
+        nonlocal skipped
+        submitted = 0
+        for query_id, query in read_queries(input_path):
+            if query_id in done:
+                skipped += 1
+                continue
+            if limit is not None and submitted >= limit:
+                return
+            done.add(query_id)  # duplicate ids in the input are planned once
+            submitted += 1
+            yield query_id, query
+
+    # A dedicated pool: plan_trip itself waits on the shared stage pool, so
+    # running batch workers there could starve it.
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        queries = pending()
+        in_flight = set()
+        try:
+            while True:
+                for query_id, query in queries:
+                    in_flight.add(pool.submit(plan_query, query_id, query, evaluate, use_cache))
+                    if len(in_flight) >= concurrency:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    with write_lock:
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        out.flush()
+                    stats.add(record)
+                    status = "error" if record["error"] else "blocked" if record.get("blocked") else "ok"
+                    print(f"[{stats.counts['planned']}] {record['id']}: {status} "
+                          f"({record['timings']['total']:.2f}s)")
+        except KeyboardInterrupt:
+            print("⏹️ Interrupted: waiting for in-flight queries; re-run to resume")
+            for future in in_flight:
+                future.cancel()
+            raise
+        finally:
+            os.fsync(out.fileno())
+
+    return stats.report(time.perf_counter() - start, skipped)
+
+
+def print_report(report: dict):
+    print(f"\n✅ Planned {report['planned']} queries in {report['elapsed_s']}s "
+          f"({report['throughput_qps']} queries/s); skipped {report['skipped']} already done, "
+          f"{report['blocked']} blocked, {report['cached']} cached, {report['errors']} errors")
+    print(f"{'stage':<14}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, row in report["latency"].items():
+        print(f"{stage:<14}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate trip plans for a JSONL file of queries")
+    parser.add_argument("input", help="JSONL file of queries")
+    parser.add_argument("output", help="JSONL file plans are appended to (also the resume checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=None, help="plan at most this many new queries")
+    parser.add_argument("--evaluate", action="store_true", help="also run the background LLM judge")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the plan cache")
+    parser.add_argument("--report", default=None, help="write the summary to this JSON file")
+    parser.add_argument("--skip-warm-up", action="store_true")
+    args = parser.parse_args()
+
+    start_metrics_server()  # only when METRICS_PORT is set
+    if not args.skip_warm_up:
+        warm_up()
+    report = run_batch(args.input, args.output, concurrency=args.concurrency,
+                       evaluate=args.evaluate, use_cache=not args.no_cache, limit=args.limit)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
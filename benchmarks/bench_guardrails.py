@@ -0,0 +1,76 @@
+# benchmarks/bench_guardrails.py
+"""
+Micro-benchmark of the guardrail engine against the old keyword scan.
+
+    python -m benchmarks.bench_guardrails
+
+For growing policy sizes it times:
+- naive: the previous ``any(k in text.lower() for k in keywords)``
+- regex: one compiled ``\\b(?:a|b|...)\\b`` alternation
+- engine: GuardrailEngine.scan (Aho-Corasick, normalization, spans)
+All three run on the same synthetic itinerary text.
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+from guards.engine import GuardrailEngine
+
+FILLER_WORDS = ["visit", "the", "fort", "lake", "palace", "dinner", "at", "sunset",
+                "market", "boat", "ride", "temple", "museum", "heritage", "walk", "cafe"]
+
+
+def synthetic_terms(count, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12)))
+            + (" " + "".join(rng.choices(string.ascii_lowercase, k=5)) if rng.random() < 0.3 else "")
+            for _ in range(count)]
+
+
+def synthetic_text(chars, seed=1):
+    rng = random.Random(seed)
+    words, size = [], 0
+    while size < chars:
+        word = rng.choice(FILLER_WORDS)
+        words.append(word.title() if rng.random() < 0.1 else word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Guardrail engine micro-benchmark")
+    parser.add_argument("--terms", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--text-kb", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = synthetic_text(args.text_kb * 1024)
+    print(f"text: {len(text):,} chars")
+    for count in args.terms:
+        terms = synthetic_terms(count)
+        build_start = time.perf_counter()
+        engine = GuardrailEngine({"policy": terms})
+        build_ms = (time.perf_counter() - build_start) * 1000
+        pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, terms)) + r")\b")
+
+        naive = best_of(lambda: (lambda lowered: any(k in lowered for k in terms))(text.lower()),
+                        args.repeat)
+        regex = best_of(lambda: pattern.findall(text.lower()), args.repeat)
+        automaton = best_of(lambda: engine.scan(text), args.repeat)
+        print(f"terms={count:>5}  naive={naive * 1000:8.1f} ms  regex={regex * 1000:8.1f} ms  "
+              f"engine={automaton * 1000:8.1f} ms  (build {build_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# benchmarks/bench_pipeline.py
+"""
+End-to-end benchmark of every chain and the full app flow, fully offline.
+
+    python -m benchmarks.bench_pipeline --concurrency 1 4 16 --requests 50
+    python -m benchmarks.bench_pipeline --llm-latency 0.3 --chunk-latency 0.005
+    python -m benchmarks.bench_pipeline --compare benchmarks/baselines/<older>.json
+
+The remote LLM and the vector store are replaced by benchmarks.stubs, so with
+the default zero latency the numbers are the pipeline's own overhead. Each
+scenario runs ``--requests`` calls at every concurrency level and reports
+p50/p95/p99 latency and throughput. Results are saved as a JSON baseline
+(benchmarks/baselines/<label>.json, label defaulting to the git commit) and
+``--compare`` prints the change against an earlier one.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import install_stubs
+from utils.latency import latency_summary
+from utils.model_registry import get_llm
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+SLOTS = {"destination": "Udaipur", "budget": "moderate", "trip_type": "honeymoon", "days": "3"}
+RULE_QUERY = "plan a {n} day honeymoon in udaipur on a moderate budget"
+LLM_QUERY = "somewhere calm with good food, trip number {n}"
+
+
+def build_scenarios() -> dict:
+    """name → fn(i); imported here so the stubs are installed first."""
+    from chains.intent_chain import extract_intent_and_slots, _llm_intent_and_slots
+    from chains.destination_chain import recommend_destinations, retrieve_context
+    from chains.itinerary_chain import generate_itinerary, stream_itinerary
+    from chains.explainability_chain import generate_explanation
+    from chains.pipeline import plan_trip
+    from guards.guardrails import input_guardrails, output_guardrails
+    from utils.format_output import format_response
+
+    destination_result = recommend_destinations(SLOTS)
+    itinerary = generate_itinerary(destination_result, SLOTS)
+    explanation = generate_explanation(itinerary, destination_result)
+    output = {"itinerary": itinerary, "explanation": explanation}
+
+    def app_flow(i):
+        # What one chat message costs in app.py: intent extraction, then the pipeline
+        _, slots, _ = extract_intent_and_slots(RULE_QUERY.format(n=i % 14 + 1))
+        return plan_trip(slots, evaluate=False, use_cache=False)
+
+    return {
+        # Distinct query text per call so the extractor memo never answers
+        "intent_rule": lambda i: extract_intent_and_slots(RULE_QUERY.format(n=i % 14 + 1) + f" #{i}"),
+        "intent_llm": lambda i: _llm_intent_and_slots(LLM_QUERY.format(n=i)),
+        # Everyone asking the same thing at once: identical prompts coalesce
+        "intent_llm_hot": lambda i: _llm_intent_and_slots(LLM_QUERY.format(n=0)),
+        "retrieval": lambda i: retrieve_context(SLOTS),
+        "destination": lambda i: recommend_destinations(SLOTS),
+        "itinerary": lambda i: generate_itinerary(destination_result, SLOTS),
+        "itinerary_stream": lambda i: "".join(stream_itinerary(destination_result, SLOTS)),
+        "explanation": lambda i: generate_explanation(itinerary, destination_result),
+        "guardrails": lambda i: (input_guardrails(SLOTS), output_guardrails(output)),
+        "format": lambda i: format_response(output),
+        "plan_trip": lambda i: plan_trip(SLOTS, evaluate=False, use_cache=False),
+        "app_flow": app_flow,
+    }
+
+
+def run_level(fn, requests: int, concurrency: int) -> dict:
+    def timed(i):
+        start = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+    row = latency_summary({"run": samples})["run"]
+    row["throughput_rps"] = round(requests / elapsed, 2)
+    return row
+
+
+def quiet(verbose: bool):
+    """Silence the chains' debug prints unless asked for."""
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict):
+    print(f"\nChange against baseline {baseline['meta']['label']} (negative latency is better):")
+    for name, levels in results.items():
+        for level, row in levels.items():
+            old = baseline["results"].get(name, {}).get(level)
+            if not old:
+                continue
+            p50 = (row["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+            rps = (row["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100
+            print(f"{name:<18}c={level:<4}p50 {p50:+7.1f}%   throughput {rps:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark with stub LLM and retriever")
+    parser.add_argument("--scenarios", nargs="+", default=None, help="default: all")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="stub time to first token (s)")
+    parser.add_argument("--chunk-latency", type=float, default=0.0, help="stub delay per streamed chunk (s)")
+    parser.add_argument("--retriever-latency", type=float, default=0.0)
+    parser.add_argument("--label", default=None, help="baseline name (default: git commit)")
+    parser.add_argument("--compare", default=None, help="earlier baseline JSON to diff against")
+    parser.add_argument("--verbose", action="store_true", help="keep the chains' own prints")
+    args = parser.parse_args()
+
+    install_stubs(args.llm_latency, args.chunk_latency, args.retriever_latency)
+    with quiet(args.verbose):
+        scenarios = build_scenarios()
+    names = args.scenarios or list(scenarios)
+
+    results = {}
+    print(f"{'scenario':<18}{'conc':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name in names:
+        results[name] = {}
+        for level in args.concurrency:
+            with quiet(args.verbose):
+                row = run_level(scenarios[name], args.requests, level)
+            results[name][str(level)] = row
+            print(f"{name:<18}{level:>5}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+                  f"{row['p99_ms']:>10}{row['throughput_rps']:>10}")
+
+    llm_stats = getattr(get_llm(), "stats", None)
+    if llm_stats:
+        print(f"\n🔁 LLM calls: {llm_stats}")
+
+    label = args.label or git_commit()
+    baseline = {
+        "meta": {"label": label, "commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "requests": args.requests, "llm_latency": args.llm_latency,
+                 "chunk_latency": args.chunk_latency, "retriever_latency": args.retriever_latency},
+        "results": results,
+    }
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f"{label}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+    print(f"\n💾 Baseline saved to {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
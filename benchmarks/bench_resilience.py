@@ -0,0 +1,97 @@
+# benchmarks/bench_resilience.py
+"""
+Tail latency of the LLM backend with and without the resilient layer,
+against the local stub servers (benchmarks.stub_servers).
+
+    python -m benchmarks.bench_resilience --requests 200 --slow-rate 0.05 --slow-latency 5
+
+Three runs over the same misbehaving endpoint:
+
+- ``direct``: HuggingFaceEndpoint on its own (the chains before the layer),
+- ``resilient``: the registry's LLM (budgets, hedging, breaker, fallback),
+- ``outage``: the registry's LLM while the endpoint is down for the first
+  half of the run, so the breaker opens, the fallback answers and the
+  endpoint is picked up again after the cooldown.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.latency import latency_summary
+
+PROMPT = "Return JSON with intent and slots for: a calm trip with good food, request #{n}"
+
+
+def run(llm, requests: int, concurrency: int, on_progress=None) -> dict:
+    errors = []
+
+    def timed(i):
+        if on_progress:
+            on_progress(i)
+        start = time.perf_counter()
+        try:
+            llm.invoke(PROMPT.format(n=i))
+        except Exception as e:
+            errors.append(type(e).__name__)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, range(requests)))
+    return dict(latency_summary({"run": samples})["run"], errors=len(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--ollama-latency", type=float, default=0.4)
+    parser.add_argument("--budget", type=float, default=2.0, help="stage latency budget (s)")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="circuit breaker cooldown (s)")
+    args = parser.parse_args()
+
+    # Read when utils.resilient_llm is first imported, so set before anything imports it
+    os.environ.update({"LLM_STAGE_BUDGETS": json.dumps({"default": args.budget}),
+                       "LLM_BREAKER_COOLDOWN": str(args.cooldown)})
+    os.environ.pop("HUGGINGFACEHUB_API_TOKEN", None)
+    from benchmarks.stub_servers import Behaviour, EndpointHandler, OllamaHandler, start_server
+    from utils import model_registry
+
+    behaviour = Behaviour(args.latency, args.slow_rate, args.slow_latency, args.error_rate)
+    endpoint = start_server(EndpointHandler, behaviour=behaviour)
+    ollama = start_server(OllamaHandler, behaviour=Behaviour(args.ollama_latency))
+    model_registry.LLM_ENDPOINT_URL = endpoint.url
+    model_registry.OLLAMA_BASE_URL = ollama.url
+
+    def fresh_llm():
+        model_registry.reset()
+        llm = model_registry.get_llm()
+        return getattr(llm, "inner", llm)  # distinct prompts: coalescing plays no part
+
+    results = {"direct": run(fresh_llm().primary, args.requests, args.concurrency)}
+
+    llm = fresh_llm()
+    results["resilient"] = dict(run(llm, args.requests, args.concurrency), **llm.stats)
+
+    llm = fresh_llm()
+    behaviour.down = True
+    half = args.requests // 2
+
+    def recover(i):
+        if i == half:
+            behaviour.down = False
+
+    results["outage"] = dict(run(llm, args.requests, args.concurrency, recover), **llm.stats)
+
+    for name, row in results.items():
+        print(f"{name:<10}{json.dumps(row)}")
+    print(f"Endpoint requests: {endpoint.requests}   Ollama requests: {ollama.requests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_vector_index.py
+"""
+Recall / latency of the local vector index against brute force.
+
+    python -m benchmarks.bench_vector_index --rows 100000 --dim 384
+
+Uses synthetic clustered vectors (roughly how sentence embeddings of one
+corpus behave), so it needs neither the embedder nor the PDF.
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from utils.local_vectorstore import RECALL_CHECK_K, LocalVectorIndex
+
+
+def synthetic_vectors(rows, dim, clusters=200, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    return centers[labels] + 0.6 * rng.normal(size=(rows, dim)).astype(np.float32), centers
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def bench(index, queries, k):
+    recalls, exact_times, search_times = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        truth = {row for _, row in index.exact_search(query, k)}
+        exact_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        found = {row for _, row in index.search(query, k)}
+        search_times.append(time.perf_counter() - start)
+
+        recalls.append(len(truth & found) / k)
+
+    return {
+        "ann": index.ann,
+        "dtype": index.meta["dtype"],
+        "vectors_mb": round(index.vectors.nbytes / 2 ** 20, 1),
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "recall_vs_float32": index.meta.get(f"recall@{RECALL_CHECK_K}_vs_float32", 1.0),
+        "search_p50_ms": percentile_ms(search_times, 50),
+        "search_p95_ms": percentile_ms(search_times, 95),
+        "brute_force_p50_ms": percentile_ms(exact_times, 50),
+        "brute_force_p95_ms": percentile_ms(exact_times, 95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)  # all-MiniLM-L6-v2
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--ann", nargs="+", default=["ivf", "hnsw"])
+    parser.add_argument("--dtype", nargs="+", default=["float32", "float16", "int8"])
+    args = parser.parse_args()
+
+    vectors, centers = synthetic_vectors(args.rows, args.dim)
+    rng = np.random.default_rng(1)
+    queries = centers[rng.integers(0, len(centers), args.queries)] \
+        + 0.6 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    ids = [str(i) for i in range(args.rows)]
+    texts = [""] * args.rows
+
+    for ann in args.ann:
+        for dtype in args.dtype:
+            with tempfile.TemporaryDirectory() as directory:
+                try:
+                    index = LocalVectorIndex.build(directory, ids, vectors, texts,
+                                                   dtype=dtype, ann=ann)
+                except ImportError as e:
+                    print(f"⚠️ Skipping {ann}: {e}")
+                    continue
+                print(bench(index, queries, args.k))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# benchmarks/stub_servers.py
+"""
+Local HTTP stand-ins for the two LLM backends, for testing the resilient
+LLM layer (utils.resilient_llm) end to end without any model:
+
+- an inference endpoint speaking the text-generation-inference API that
+  HuggingFaceEndpoint calls (JSON or server-sent-event streaming),
+- an Ollama server answering ``/api/generate`` (JSON lines streaming).
+
+Both answer with benchmarks.stubs' canned responses. The endpoint's latency,
+slow-request tail and error rate are configurable and can be changed while it
+runs (``server.behaviour``), e.g. to take it "down" halfway through a run.
+
+    python -m benchmarks.stub_servers --latency 0.2 --slow-rate 0.05 --slow-latency 5
+    LLM_ENDPOINT_URL=http://127.0.0.1:8081 OLLAMA_BASE_URL=http://127.0.0.1:11435 streamlit run app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.stubs import canned_response
+
+STREAM_CHUNK_CHARS = 8
+
+
+class Behaviour:
+    """How the stub endpoint misbehaves; read on every request."""
+
+    def __init__(self, latency=0.0, slow_rate=0.0, slow_latency=0.0, error_rate=0.0,
+                 down=False, seed=0):
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.down = down
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay_or_error(self):
+        """Seconds to wait before answering, or None to answer with a 503."""
+        with self._lock:
+            roll, tail = self._random.random(), self._random.random()
+        if self.down or roll < self.error_rate:
+            return None
+        return self.slow_latency if tail < self.slow_rate else self.latency
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send(self, status: int, payload, content_type="application/json"):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, lines, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for line in lines:
+            data = line.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class EndpointHandler(_Handler):
+    """text-generation-inference: POST {"inputs", "parameters", "stream"}."""
+
+    def do_POST(self):
+        body = self._body()
+        delay = self.server.behaviour.delay_or_error()
+        self.server.requests += 1
+        if delay is None:
+            return self._send(503, {"error": "stub endpoint unavailable"})
+        time.sleep(delay)
+        text = canned_response(body.get("inputs", ""))
+        if not body.get("stream"):
+            return self._send(200, [{"generated_text": text}])
+
+        pieces = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        events = [json.dumps({"token": {"id": n, "text": piece, "logprob": 0.0, "special": False},
+                              "generated_text": text if n == len(pieces) - 1 else None,
+                              "details": None})
+                  for n, piece in enumerate(pieces)]
+        self._send_stream((f"data:{event}\n\n" for event in events), "text/event-stream")
+
+
+class OllamaHandler(_Handler):
+    """Ollama: POST /api/generate {"model", "prompt", "stream"}."""
+
+    def do_POST(self):
+        body = self._body()
+        self.server.requests += 1
+        time.sleep(self.server.behaviour.latency)
+        text = canned_response(body.get("prompt", ""))
+        model = body.get("model", "stub")
+        done = {"model": model, "created_at": "1970-01-01T00:00:00Z", "response": "",
+                "done": True, "done_reason": "stop"}
+        if body.get("stream") is False:
+            return self._send(200, dict(done, response=text))
+        pieces = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        lines = [json.dumps({"model": model, "created_at": done["created_at"],
+                             "response": piece, "done": False}) + "\n" for piece in pieces]
+        self._send_stream(lines + [json.dumps(done) + "\n"], "application/x-ndjson")
+
+
+def start_server(handler, port: int = 0, behaviour: Behaviour = None) -> ThreadingHTTPServer:
+    """Serve ``handler`` on 127.0.0.1:``port`` (0 = any free port) from a daemon thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.behaviour = behaviour or Behaviour()
+    server.requests = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub LLM endpoint and Ollama servers")
+    parser.add_argument("--endpoint-port", type=int, default=8081)
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--ollama-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    endpoint = start_server(EndpointHandler, args.endpoint_port,
+                            Behaviour(args.latency, args.slow_rate, args.slow_latency,
+                                      args.error_rate))
+    ollama = start_server(OllamaHandler, args.ollama_port, Behaviour(args.ollama_latency))
+    print(f"Endpoint: {endpoint.url}   Ollama: {ollama.url}   (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# benchmarks/stubs.py
+"""
+Deterministic local stand-ins for the remote LLM and the vector store.
+
+``install_stubs()`` registers a StubLLM (canned answers chosen from the
+prompt, fixed time-to-first-token plus per-chunk latency), a hashing
+StubEmbeddings and an in-memory StubRetriever in the model registry, so every chain runs unchanged but
+offline. With zero latency what is left is the pipeline's own overhead:
+prompt building, JSON parsing, guardrails, formatting and retrieval plumbing.
+"""
+import json
+import os
+import re
+import time
+import zlib
+from typing import Any, Iterator, List, Optional
+
+# Offline means offline: a .env that turns on LangSmith tracing would
+# otherwise ship every stub run to the API (load_dotenv does not override)
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+os.environ["LANGSMITH_TRACING"] = "false"
+
+from langchain_core.callbacks import CallbackManagerForLLMRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from langchain_core.retrievers import BaseRetriever
+
+from chains.slot_extractor import SEED_DESTINATIONS, regions_of
+from utils import model_registry
+from utils.llm_coalescing import LLM_COALESCE, CoalescingLLM
+from utils.local_vectorstore import metadata_matches
+from utils.telemetry import TokenCountingCallback
+
+DAYS_IN_PROMPT = re.compile(r"itinerary for (\d+) days")
+BLOCK_IN_PROMPT = re.compile(r"Write ONLY days (\d+) to (\d+)")
+DESTINATION_IN_QUERY = re.compile(r"trip in ([A-Za-z ]+?) within")
+REASK_IN_PROMPT = re.compile(r"missing or had invalid values for: (.+)")
+
+REASK_ANSWERS = {"intent": "general", "destination": "Goa", "budget": "moderate",
+                 "trip_type": "relaxation", "days": "3", "relevance": 4, "completeness": 4,
+                 "correctness": 4, "clarity": 4, "safety": 5, "overall_feedback": "Reasonable plan."}
+
+ACTIVITIES = ["Sunrise walk along the old quarter", "Local market food trail",
+              "Heritage museum visit", "Boat ride at sunset", "Cooking class with a local family"]
+
+
+def canned_itinerary(days: int) -> str:
+    return json.dumps({
+        f"day_{day}": {
+            "activities": [ACTIVITIES[(day + i) % len(ACTIVITIES)] for i in range(3)],
+            "stay": f"Boutique heritage hotel (day {day})",
+            "description": "A relaxed day exploring the highlights and local food scene.",
+        }
+        for day in range(1, days + 1)
+    }, indent=2)
+
+
+def canned_response(prompt: str) -> str:
+    """The answer a well-behaved model would give, picked by prompt template."""
+    match = REASK_IN_PROMPT.search(prompt)
+    if match:
+        return json.dumps({field: REASK_ANSWERS.get(field, "")
+                           for field in match.group(1).strip().split(", ")})
+    if "Classify the user's intent" in prompt:
+        return json.dumps({"intent": "general", "destination": "Goa", "budget": "moderate",
+                           "trip_type": "relaxation", "days": "3"})
+    if "Draft a short outline" in prompt:
+        match = re.search(r"for a (\d+) day trip", prompt)
+        days = int(match.group(1)) if match else 3
+        return json.dumps({f"day_{day}": f"Area {day} - {ACTIVITIES[day % len(ACTIVITIES)]}"
+                           for day in range(1, days + 1)}, indent=2)
+    match = BLOCK_IN_PROMPT.search(prompt)
+    if match:
+        first, last = int(match.group(1)), int(match.group(2))
+        days = json.loads(canned_itinerary(last))
+        return json.dumps({key: days[key] for key in list(days)[first - 1:]}, indent=2)
+    if "travel itinerary for" in prompt:
+        match = DAYS_IN_PROMPT.search(prompt)
+        return canned_itinerary(int(match.group(1)) if match else 3)
+    if "explain why these destinations" in prompt:
+        return ("- Fits the stated budget with mid-range stays.\n"
+                "- Activities match the requested trip type.\n"
+                "- Sights are close together, so little time is lost in transit.\n"
+                "- Includes cultural highlights unique to the region.")
+    if "strict travel planner evaluator" in prompt:
+        return json.dumps({"relevance": 5, "completeness": 4, "correctness": 5, "clarity": 4,
+                           "safety": 5, "overall_feedback": "Solid, well structured plan."})
+    match = DESTINATION_IN_QUERY.search(prompt)
+    place = match.group(1) if match else "the region"
+    return (f"{place} is a great fit. Spend the first days around the old town and markets, "
+            f"then head out for nature and local experiences nearby.")
+
+
+class StubLLM(LLM):
+    """Canned-answer LLM with configurable latency; streams in small chunks."""
+    first_token_latency: float = 0.0
+    chunk_latency: float = 0.0
+    chunk_chars: int = 4
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        text = canned_response(prompt)
+        chunks = -(-len(text) // self.chunk_chars)
+        time.sleep(self.first_token_latency + chunks * self.chunk_latency)
+        return text
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        text = canned_response(prompt)
+        time.sleep(self.first_token_latency)
+        for start in range(0, len(text), self.chunk_chars):
+            time.sleep(self.chunk_latency)
+            chunk = GenerationChunk(text=text[start:start + self.chunk_chars])
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def synthetic_corpus(chunks_per_destination: int = 20, overlap: int = 50) -> List[Document]:
+    """
+    Guide-like chunks of about 512 characters, several sentences each, where
+    consecutive chunks of a destination share ``overlap`` characters the way
+    the ingestion splitter's chunk_overlap makes them.
+    """
+    documents = []
+    for place in SEED_DESTINATIONS:
+        previous = ""
+        for i in range(chunks_per_destination):
+            activity = ACTIVITIES[i % len(ACTIVITIES)].lower()
+            body = (f"{place} travel guide, part {i}. Visitors to {place} enjoy {activity}, "
+                    f"local cuisine and stays ranging from budget hostels to luxury resorts. "
+                    f"Honeymoon couples often book lake-view rooms with private dinners. "
+                    f"Adventure seekers head out early for treks and rafting nearby. "
+                    f"Families prefer short walks, museums and parks close to the centre. "
+                    f"Trains and buses connect the town with the rest of the region.")
+            text = (previous[-overlap:] + " " + body).strip() if previous else body
+            previous = body
+            documents.append(Document(
+                page_content=text,
+                metadata={"source": "synthetic", "page": i, "destination": place,
+                          "destinations": [place], "regions": regions_of([place])},
+            ))
+    return documents
+
+
+class StubEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: deterministic, offline and cheap."""
+    dim = 256
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            # crc32, not hash(): str hashes are salted per process (PYTHONHASHSEED)
+            vector[zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class StubRetriever(BaseRetriever):
+    """In-memory keyword-overlap retriever over a fixed list of documents."""
+    documents: List[Document]
+    k: int = 5
+    latency: float = 0.0
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun, k: int = None,
+                                filter: dict = None) -> List[Document]:
+        time.sleep(self.latency)
+        words = set(query.lower().split())
+        candidates = [doc for doc in self.documents
+                      if not filter or metadata_matches(doc.metadata, filter)]
+        scored = sorted(candidates,
+                        key=lambda doc: -len(words & set(doc.page_content.lower().split())))
+        return scored[:k or self.k]
+
+
+def install_stubs(first_token_latency: float = 0.0, chunk_latency: float = 0.0,
+                  retriever_latency: float = 0.0, k: int = 5) -> StubLLM:
+    """Register the stubs under the keys the chains ask the registry for."""
+    llm = StubLLM(first_token_latency=first_token_latency, chunk_latency=chunk_latency,
+                  callbacks=[TokenCountingCallback()])
+    # Same wrapping as the registry's real LLM, so coalescing is part of what is measured
+    model_registry.register(("llm", model_registry.LLM_REPO_ID, 0),
+                            CoalescingLLM(inner=llm) if LLM_COALESCE else llm)
+    for judge in {model_registry.JUDGE_MODEL, "llama3.2"}:
+        model_registry.register(("ollama", judge, 0), llm)
+    model_registry.register(("embedder", model_registry.EMBEDDING_MODEL), StubEmbeddings())
+    model_registry.register(("retriever", k), StubRetriever(documents=synthetic_corpus(), k=k,
+                                                            latency=retriever_latency))
+
+    # Chains are built once and keep their model, so rebuild them around the stubs
+    from chains.intent_chain import get_intent_chain
+    from chains.destination_chain import get_rag_chain
+    from chains.itinerary_chain import get_itinerary_chain
+    from chains.explainability_chain import get_explanation_chain
+    from utils.evaluate_response import get_evaluation_chain
+    for getter in (get_intent_chain, get_rag_chain, get_itinerary_chain,
+                   get_explanation_chain, get_evaluation_chain):
+        getter.cache_clear()
+    return llm
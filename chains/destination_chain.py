@@ -1,22 +1,72 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 from langchain.chains import RetrievalQA
-from utils.load_vectorstore import get_pinecone_retriever
 from langchain_ollama import OllamaLLM, ChatOllama
-from langchain_community.llms import HuggingFaceEndpoint
+from utils.model_registry import get_llm, get_retriever
+from utils.telemetry import traced, current_span
+from chains.slot_extractor import DEFAULT_SLOTS, find_destinations
+from utils.context_compression import compress_context
+from utils.resilient_llm import llm_stage
+
+# Chunks retrieved when the search is narrowed to the trip's destination: the
+# candidates are on-topic, so fewer of them fill the prompt
+FILTERED_RETRIEVAL_K = int(os.getenv("FILTERED_RETRIEVAL_K", "4"))
 
 #load_dotenv()
 #HF_TOKEN = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 
-llm = HuggingFaceEndpoint(
-    repo_id="meta-llama/Llama-2-13b-chat-hf",
-    huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-    temperature=0,             # pass directly here
-)
+@lru_cache(maxsize=None)
+def get_rag_chain():
+    # LLM and retriever are shared via the registry and built on first use
+    return RetrievalQA.from_chain_type(get_llm(), retriever=get_retriever())
+
+def build_destination_query(slots):
+    return f"Recommend cities and activities for a {slots['trip_type']} trip in {slots['destination']} within {slots['budget']}"
 
-retriever = get_pinecone_retriever()
-rag_chain = RetrievalQA.from_chain_type(llm, retriever=retriever)
+def destination_filter(slots):
+    """
+    Metadata pre-filter on the chunks tagged at ingestion with the slot's
+    destination (or region); None when there is no specific destination.
+    """
+    destination = str(slots.get("destination") or "").strip()
+    if not destination or destination == DEFAULT_SLOTS["destination"]:
+        return None
+    names = find_destinations(destination)
+    if not names:
+        return None
+    return {"$or": [{"destinations": {"$in": names}}, {"regions": {"$in": names}}]}
 
+@traced("destination.rag")
 def recommend_destinations(slots):
-    print(slots)
-    return rag_chain.invoke(f"Recommend cities and activities for a {slots['trip_type']} trip in {slots['destination']} within {slots['budget']}")
\ No newline at end of file
+    return recommend_from_documents(slots, retrieve_context(slots))
+
+# Split form of recommend_destinations so the pipeline can start retrieval
+# before the input guardrails have finished and only pay for the LLM after.
+@traced("retriever")
+def retrieve_context(slots):
+    query = build_destination_query(slots)
+    metadata_filter = destination_filter(slots)
+    documents = []
+    if metadata_filter is not None:
+        documents = get_retriever().invoke(query, filter=metadata_filter, k=FILTERED_RETRIEVAL_K)
+    filtered = bool(documents)
+    if not filtered:
+        # No destination, or nothing tagged with it (e.g. an index ingested before tagging)
+        documents = get_retriever().invoke(query)
+    current_span().set("filtered", filtered)
+    current_span().set("filter_fallback", metadata_filter is not None and not filtered)
+    current_span().set("documents", len(documents))
+    return documents
+
+@traced("destination")
+@llm_stage("destination")
+def recommend_from_documents(slots, documents):
+    query = build_destination_query(slots)
+    # Overlap, near-duplicates and off-topic sentences never reach the stuff prompt
+    answer = get_rag_chain().combine_documents_chain.invoke({
+        "input_documents": compress_context(documents, slots),
+        "question": query
+    })
+    # Same shape RetrievalQA.invoke returns
+    return {"query": query, "result": answer["output_text"]}
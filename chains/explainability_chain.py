@@ -2,9 +2,12 @@
 import os
 from dotenv import load_dotenv
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+from langchain_core.output_parsers import StrOutputParser
+from functools import lru_cache
 from langchain_community.chat_models import ChatOllama
-from langchain_community.llms import HuggingFaceEndpoint
+from utils.model_registry import get_llm
+from utils.telemetry import traced
+from utils.resilient_llm import in_stage, llm_stage
 
 # Initialize local LLM via Ollama (e.g., llama3)
 #llm = ChatOllama(model="llama3.2", temperature=0)
@@ -13,12 +16,6 @@ from langchain_community.llms import HuggingFaceEndpoint
 
 #HF_TOKEN = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 
-llm = HuggingFaceEndpoint(
-    repo_id="meta-llama/Llama-2-13b-chat-hf",
-    huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-    temperature=0,             # pass directly here
-)
-
 # Prompt template for generating explainable reasons in bullet points
 explanation_prompt = PromptTemplate(
     input_variables=["itinerary", "preferences"],
@@ -42,11 +39,12 @@ Explanation (in bullet points):
 """
 )
 
-explanation_chain = LLMChain(llm=llm, prompt=explanation_prompt)
-
-def generate_explanation(itinerary: dict, preferences: dict) -> str:
-    """Generate bullet-point style explanation for itinerary choices."""
+@lru_cache(maxsize=None)
+def get_explanation_chain():
+    # LCEL pipe (rather than LLMChain) so the same chain can also stream tokens
+    return explanation_prompt | get_llm() | StrOutputParser()
 
+def _chain_inputs(itinerary, preferences) -> dict:
     # Convert itinerary dict into readable string for the prompt
     if isinstance(itinerary, dict):
         itinerary_str = ""
@@ -67,11 +65,18 @@ def generate_explanation(itinerary: dict, preferences: dict) -> str:
     # Format preferences nicely
     prefs_str = ", ".join([f"{k}: {v}" for k, v in preferences.items()])
 
-    # Invoke LLM
-    response = explanation_chain.invoke({
+    return {
         "itinerary": itinerary_str,
         "preferences": prefs_str
-    })
+    }
+
+@traced("explanation")
+@llm_stage("explanation")
+def generate_explanation(itinerary: dict, preferences: dict) -> str:
+    """Generate bullet-point style explanation for itinerary choices."""
+
+    # Invoke LLM
+    response = get_explanation_chain().invoke(_chain_inputs(itinerary, preferences))
 
     # Extract clean string (response can be dict depending on LangChain version)
     if isinstance(response, dict) and "text" in response:
@@ -79,3 +84,8 @@ def generate_explanation(itinerary: dict, preferences: dict) -> str:
     elif hasattr(response, "content"):  # sometimes returns AIMessage
         return response.content.strip()
     return str(response).strip()
+
+def stream_explanation(itinerary: dict, preferences: dict):
+    """Yield the bullet-point explanation chunk by chunk as the model generates it."""
+    return in_stage("explanation",
+                    get_explanation_chain().stream(_chain_inputs(itinerary, preferences)))
@@ -1,11 +1,20 @@
 import os
 from dotenv import load_dotenv
-import json
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_ollama import ChatOllama
-from langchain_community.llms import HuggingFaceEndpoint
+from utils.model_registry import get_llm
+from utils.telemetry import span, traced, current_span, record_cache
+from utils.llm_json import field_problems, parse_llm_json, reask_fields
+from utils.resilient_llm import llm_stage
+from chains.slot_extractor import (
+    extract_slots, normalize_query, DEFAULT_SLOTS, RULE_CONFIDENCE_THRESHOLD,
+)
 
 
 #load_dotenv()
@@ -14,13 +23,6 @@ from langchain_community.llms import HuggingFaceEndpoint
 
 #llm = ChatOllama(model="llama3.2", temperature=0)
 
-# Initialize LLaMA 2 Chat model
-llm = HuggingFaceEndpoint(
-    repo_id="meta-llama/Llama-2-13b-chat-hf",
-    huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-    temperature=0,             # pass directly here
-)
-
 prompt = PromptTemplate(
     input_variables=["query"],
     template="""
@@ -50,34 +52,107 @@ prompt = PromptTemplate(
     """
 )
 
-intent_chain = prompt | llm | StrOutputParser()
+@lru_cache(maxsize=None)
+def get_intent_chain():
+    # LLaMA 2 Chat model comes from the shared registry, built on first use
+    return prompt | get_llm() | StrOutputParser()
 
 
-def get_intent_and_slots(query):
-    response = intent_chain.invoke({"query": query})
+logger = logging.getLogger(__name__)
+
+# How many queries each path answered, to measure the LLM calls saved
+extraction_stats = {"rule": 0, "llm": 0, "memo": 0}
+
+# Per-query memo of LLM answers (the rule path is memoized in slot_extractor),
+# shared by the service workers and batch threads
+_llm_memo = OrderedDict()
+_llm_memo_lock = threading.Lock()
+LLM_MEMO_SIZE = 1024
+
+
+def _memo_get(normalized: str):
+    with _llm_memo_lock:
+        entry = _llm_memo.get(normalized)
+        if entry is not None:
+            _llm_memo.move_to_end(normalized)
+        return entry
+
+
+def _memo_set(normalized: str, intent, slots: dict):
+    with _llm_memo_lock:
+        _llm_memo[normalized] = (intent, dict(slots))
+        _llm_memo.move_to_end(normalized)
+        while len(_llm_memo) > LLM_MEMO_SIZE:
+            _llm_memo.popitem(last=False)
+
+
+INTENT_FIELDS = {"intent": str, "destination": str, "budget": str, "trip_type": str,
+                 "days": (str, int)}
+FALLBACK_INTENT = "recommend"
+FALLBACK_SLOTS = {"destination": "India", "budget": "moderate", "trip_type": "general", "days": "3"}
 
-    print(f"response:", response)
+
+def _intent_problems(parsed):
+    return field_problems(parsed, INTENT_FIELDS)
+
+
+@traced("intent.llm")
+@llm_stage("intent")
+def _llm_intent_and_slots(query):
+    response = get_intent_chain().invoke({"query": query})
+
+    logger.debug("Intent chain response: %s", response)
 
     # Safely extract response string
     response_text = response.text if hasattr(response, "text") else str(response)
 
-    # Try to parse JSON from model response
-    try:
-        parsed = json.loads(response_text)
-        intent = parsed.get("intent", "recommend")
-        slots = {
-            "destination": parsed.get("destination", "India"),
-            "budget": parsed.get("budget", "moderate"),
-            "trip_type": parsed.get("trip_type", "general"),
-            "days": parsed.get("days", "3")  # Default to 3 if missing
-        }
-    except json.JSONDecodeError:
-        print("❌ Could not parse JSON — fallback used.")
-        intent = "recommend"
-        slots = {
-            "destination": "India",
-            "budget": "moderate",
-            "trip_type": "general",
-            "days": "3"
-        }
-    return intent, slots
\ No newline at end of file
+    # Repair what we can; only the fields still missing are asked for again
+    parsed = parse_llm_json(response_text, "intent", _intent_problems)
+    values = dict(parsed.value) if isinstance(parsed.value, dict) else {}
+    if parsed.problems:
+        values.update(reask_fields(get_llm(), "intent", f"Query: {query}", response_text,
+                                   parsed.problems))
+        missing = _intent_problems(values)
+        if missing:
+            logger.warning("Intent JSON still missing %s, using fallback values", missing)
+            current_span().set("parse_error", True)
+
+    intent = values.get("intent") or FALLBACK_INTENT
+    slots = {key: values.get(key) or default for key, default in FALLBACK_SLOTS.items()}
+    return intent, slots
+
+
+def extract_intent_and_slots(query):
+    """
+    Like ``get_intent_and_slots`` but also returns which path answered:
+    "rule" (deterministic extractor), "memo" (repeat of an LLM-answered
+    query) or "llm".
+    """
+    with span("intent") as intent_span:
+        normalized = normalize_query(query)
+        intent, rule_slots, confidence = extract_slots(normalized)
+
+        if confidence >= RULE_CONFIDENCE_THRESHOLD:
+            path = "rule"
+            slots = {key: value or DEFAULT_SLOTS[key] for key, value in rule_slots.items()}
+        elif (memo := _memo_get(normalized)) is not None:
+            path = "memo"
+            intent, slots = memo
+            slots = dict(slots)
+            record_cache("intent_memo", hits=1)
+        else:
+            path = "llm"
+            record_cache("intent_memo", misses=1)
+            intent, slots = _llm_intent_and_slots(query)
+            _memo_set(normalized, intent, slots)
+
+        intent_span.set("path", path)
+        intent_span.set("rule_confidence", confidence)
+    extraction_stats[path] += 1
+    return intent, slots, path
+
+
+def get_intent_and_slots(query):
+    intent, slots, path = extract_intent_and_slots(query)
+    logger.debug("Intent extraction path: %s (totals: %s)", path, extraction_stats)
+    return intent, slots
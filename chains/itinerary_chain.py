@@ -1,24 +1,31 @@
 import os
 from dotenv import load_dotenv
+import contextvars
 import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
 from langchain_core.output_parsers import StrOutputParser
 from langchain_ollama import ChatOllama
-from langchain_community.llms import HuggingFaceEndpoint
+from utils.model_registry import get_llm
+from utils.telemetry import traced, current_span
+from utils.llm_json import parse_llm_json, record_parse
+from utils.resilient_llm import in_stage, llm_stage
+
+logger = logging.getLogger(__name__)
+
+# Trips this long are planned as an outline plus day blocks generated in parallel
+CHUNKED_ITINERARY_MIN_DAYS = int(os.getenv("CHUNKED_ITINERARY_MIN_DAYS", "6"))
+ITINERARY_DAYS_PER_BLOCK = int(os.getenv("ITINERARY_DAYS_PER_BLOCK", "3"))
+ITINERARY_BLOCK_CONCURRENCY = int(os.getenv("ITINERARY_BLOCK_CONCURRENCY", "8"))
 
 #llm = ChatOllama(model="llama3.2", temperature=0.3)
 #load_dotenv()
 
 #HF_TOKEN = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 
-llm = HuggingFaceEndpoint(
-    repo_id="meta-llama/Llama-2-13b-chat-hf",
-    huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-    temperature=0,             # pass directly here
-)
-
-
 # Prompt
 prompt = PromptTemplate(
     input_variables=["input", "days"],
@@ -46,17 +53,154 @@ User Query: {input}
 """
 )
 
-itinerary_chain = LLMChain(
-    llm=llm,
-    prompt=prompt,
-    output_parser=StrOutputParser()
+# Long trips: a short day -> region outline first...
+skeleton_prompt = PromptTemplate(
+    input_variables=["input", "days", "destinations"],
+    template="""
+You are a helpful travel planner.
+
+Draft a short outline for a {days} day trip ONLY for the given destination {destinations} in the user query.
+Give each day one line naming the area or town and the theme of the day, so that consecutive days flow
+geographically and no place is repeated.
+
+Respond ONLY in valid JSON format like this:
+{{
+  "day_1": "Area - theme",
+  "day_2": "Area - theme"
+}}
+
+User Query: {input}
+"""
 )
 
-def generate_itinerary(destinations, slots):
+# ...then each block of days is written in full against that outline
+block_prompt = PromptTemplate(
+    input_variables=["input", "days", "destinations", "outline", "first_day", "last_day"],
+    template="""
+You are a helpful travel planner.
+
+This is part of a {days} day itinerary for the destination {destinations} in the user query.
+The whole trip follows this outline:
+{outline}
+
+Write ONLY days {first_day} to {last_day}, following the outline for those days.
+
+Respond ONLY in valid JSON format like this:
+{{
+  "day_{first_day}": {{
+    "activities": ["Activity 1", "Activity 2"],
+    "stay": "Suggested stay",
+    "description": "Short description of the place"
+  }}
+}}
+
+User Query: {input}
+"""
+)
+
+@lru_cache(maxsize=None)
+def get_itinerary_chain():
+    # LCEL pipe (rather than LLMChain) so the same chain can also stream tokens
+    return prompt | get_llm() | StrOutputParser()
+
+@lru_cache(maxsize=None)
+def get_skeleton_chain():
+    return skeleton_prompt | get_llm() | StrOutputParser()
+
+@lru_cache(maxsize=None)
+def get_block_chain():
+    return block_prompt | get_llm() | StrOutputParser()
+
+def _chain_inputs(destinations, slots):
     days = slots.get("days", 3)  # default to 3
-    response = itinerary_chain.invoke(
-        {"input": f"{destinations}, {slots}", "days": days, "destinations": destinations}
-    )
+    return {"input": f"{destinations}, {slots}", "days": days, "destinations": destinations}
+
+def trip_days(slots) -> int:
+    """Number of days in ``slots`` ("5", 5, "5 days"); 3 when missing."""
+    match = re.search(r"\d+", str(slots.get("days", "")))
+    return int(match.group()) if match else 3
+
+def use_chunked_itinerary(slots) -> bool:
+    return trip_days(slots) >= CHUNKED_ITINERARY_MIN_DAYS
+
+def _usable_day(details) -> bool:
+    return isinstance(details, dict) and bool(details.get("activities"))
+
+def itinerary_problems(itinerary, total_days: int = None) -> list:
+    """``day_N`` keys that are missing or have no activities (all days up to ``total_days``)."""
+    if not isinstance(itinerary, dict):
+        return ["<json>"]
+    if total_days is None:
+        total_days = sum(1 for key in itinerary if key.startswith("day_"))
+    return [f"day_{n}" for n in range(1, total_days + 1)
+            if not _usable_day(itinerary.get(f"day_{n}"))]
+
+def parse_itinerary(response_text: str, total_days: int = None) -> dict:
+    """
+    Parse the model's JSON itinerary, repairing fences, stray prose and
+    truncation; falls back to the raw text when no JSON is found. Incomplete
+    days are kept as generated (``complete_itinerary`` fills them in).
+    """
+    parsed = parse_llm_json(response_text, "itinerary",
+                            lambda value: itinerary_problems(value, total_days))
+    if not isinstance(parsed.value, dict):
+        logger.warning("Could not parse itinerary JSON (%s)", parsed.status)
+        current_span().set("parse_error", True)
+        return {"raw_itinerary": response_text}
+    return parsed.value
+
+def complete_itinerary(itinerary: dict, destinations, slots) -> dict:
+    """
+    Ask again for only the days that are missing or empty (one block prompt
+    per contiguous run of days), keeping every day that parsed. A raw-text
+    itinerary is returned unchanged.
+    """
+    if "raw_itinerary" in itinerary:
+        return itinerary
+    total = trip_days(slots)
+    missing = [int(key.split("_")[1]) for key in itinerary_problems(itinerary, total)]
+    if not missing:
+        return itinerary
+
+    outline = {key: str(details.get("description", "")) for key, details in itinerary.items()
+               if isinstance(details, dict)}
+    inputs = {**_chain_inputs(destinations, slots), "outline": _outline_text(outline, total)}
+    runs = []
+    for day in missing:
+        if runs and runs[-1][1] == day - 1:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    block_inputs = [{**inputs, "first_day": first, "last_day": last} for first, last in runs]
+    current_span().set("itinerary_missing_days", len(missing))
+    record_parse("itinerary", "reasked")
+    for (first, last), text in zip(runs, get_block_chain().batch(
+            block_inputs, config={"max_concurrency": ITINERARY_BLOCK_CONCURRENCY},
+            return_exceptions=True)):
+        if not isinstance(text, Exception):
+            itinerary.update(_block_days(text, first, last))
+
+    # Day order as in a well-formed answer
+    days = sorted((key for key in itinerary if key.startswith("day_") and key[4:].isdigit()),
+                  key=lambda key: int(key[4:]))
+    return {**{key: itinerary[key] for key in days}, **itinerary}
+
+@llm_stage("itinerary")
+def finish_itinerary(response_text: str, destinations, slots) -> dict:
+    """``parse_itinerary`` followed by ``complete_itinerary``."""
+    itinerary = parse_itinerary(response_text, trip_days(slots))
+    return complete_itinerary(itinerary, destinations, slots)
+
+@traced("itinerary")
+@llm_stage("itinerary")
+def generate_itinerary(destinations, slots):
+    if use_chunked_itinerary(slots):
+        itinerary = {}
+        for days in _itinerary_blocks(destinations, slots):
+            itinerary.update(days)
+        return itinerary
+
+    response = get_itinerary_chain().invoke(_chain_inputs(destinations, slots))
 
     # Debug print
     #print("Raw itinerary_chain response:", response)
@@ -67,11 +211,108 @@ def generate_itinerary(destinations, slots):
     else:
         response_text = str(response)
 
-    # Try parsing JSON
+    return finish_itinerary(response_text, destinations, slots)
+
+def stream_itinerary(destinations, slots):
+    """Yield the raw itinerary JSON text chunk by chunk as the model generates it."""
+    return in_stage("itinerary", _itinerary_chunks(destinations, slots))
+
+def _itinerary_chunks(destinations, slots):
+    if use_chunked_itinerary(slots):
+        # Same JSON text, one finished block of days at a time
+        yield "{"
+        separator = "\n"
+        for days in _itinerary_blocks(destinations, slots):
+            for key, details in days.items():
+                yield f"{separator}  {json.dumps(key)}: {json.dumps(details, ensure_ascii=False)}"
+                separator = ",\n"
+        yield "\n}"
+        return
+
+    for chunk in get_itinerary_chain().stream(_chain_inputs(destinations, slots)):
+        yield chunk
+
+# -------------------------
+# Chunked generation for long trips
+# -------------------------
+def _outline(inputs) -> dict:
     try:
-        parsed = json.loads(response_text)
-        print("✅ Parsed itinerary JSON")
-        return parsed
+        outline = parse_llm_json(get_skeleton_chain().invoke(inputs), "itinerary_outline").value
+        if isinstance(outline, dict):
+            return {key: str(value) for key, value in outline.items()}
     except Exception as e:
-        print("⚠️ Could not parse JSON:", e)
-        return {"raw_itinerary": response_text}
+        logger.warning("Could not draft itinerary outline: %s", e)
+    return {}
+
+def _outline_text(outline: dict, total: int) -> str:
+    return "\n".join(f"Day {n}: {outline.get(f'day_{n}') or '(free choice)'}"
+                     for n in range(1, total + 1))
+
+def _block_days(text: str, first_day: int, last_day: int) -> dict:
+    """The usable ``day_N`` entries of one block (possibly only some of them)."""
+    parsed = parse_llm_json(text, "itinerary_block",
+                            lambda value: [key for key in itinerary_problems(value, last_day)
+                                           if int(key[4:]) >= first_day]).value
+    if not isinstance(parsed, dict):
+        return {}
+    return {f"day_{n}": parsed[f"day_{n}"] for n in range(first_day, last_day + 1)
+            if _usable_day(parsed.get(f"day_{n}"))}
+
+def _itinerary_blocks(destinations, slots):
+    """
+    Outline the trip, then generate its blocks of days concurrently and yield
+    each block's ``{"day_N": {...}}`` in day order as soon as it (and every
+    earlier block) is done. Days a block did not deliver are asked for once
+    more, then fall back to their outline lines, so one bad completion no
+    longer costs the whole plan.
+
+    The blocks run on a pool of this generator's own: closing it early (the
+    streaming guard) cancels the blocks that have not started and stops
+    waiting for the ones in flight.
+    """
+    total = trip_days(slots)
+    inputs = _chain_inputs(destinations, slots)
+    outline = _outline(inputs)
+    outline_text = _outline_text(outline, total)
+
+    ranges = [(first, min(first + ITINERARY_DAYS_PER_BLOCK - 1, total))
+              for first in range(1, total + 1, ITINERARY_DAYS_PER_BLOCK)]
+    block_inputs = [{**inputs, "outline": outline_text, "first_day": first, "last_day": last}
+                    for first, last in ranges]
+    current_span().set("itinerary_blocks", len(ranges))
+
+    pool = ThreadPoolExecutor(max_workers=min(ITINERARY_BLOCK_CONCURRENCY, len(ranges)),
+                              thread_name_prefix="itinerary-block")
+    # Each block runs in a copy of the caller's context (LLM stage, tracing span)
+    futures = {pool.submit(contextvars.copy_context().run, get_block_chain().invoke, block): index
+               for index, block in enumerate(block_inputs)}
+    try:
+        yield from _finished_blocks(futures, ranges, block_inputs, outline)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _finished_blocks(futures, ranges, block_inputs, outline):
+    """Each block's days once it and every earlier block are done (see ``_itinerary_blocks``)."""
+    finished, next_block = {}, 0
+    for future in as_completed(futures):
+        index = futures[future]
+        first, last = ranges[index]
+        days = {} if future.exception() else _block_days(future.result(), first, last)
+        missing = [n for n in range(first, last + 1) if f"day_{n}" not in days]
+        if missing:
+            # Re-ask only for the days this block did not deliver
+            record_parse("itinerary_block", "reasked")
+            retry = {**block_inputs[index], "first_day": missing[0], "last_day": missing[-1]}
+            try:
+                days.update(_block_days(get_block_chain().invoke(retry), missing[0], missing[-1]))
+            except Exception as e:
+                logger.warning("Itinerary block %s-%s failed: %s", first, last, e)
+        for n in range(first, last + 1):
+            if f"day_{n}" not in days:
+                current_span().add("itinerary_block_fallbacks")
+                days[f"day_{n}"] = {"activities": [], "stay": "",
+                                    "description": outline.get(f"day_{n}", "")}
+        finished[index] = {f"day_{n}": days[f"day_{n}"] for n in range(first, last + 1)}
+        while next_block in finished:
+            yield finished.pop(next_block)
+            next_block += 1
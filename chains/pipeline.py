@@ -0,0 +1,291 @@
+# chains/pipeline.py
+"""
+Planning pipeline as a stage graph.
+
+    slots ──► guard ─────────────┐
+      │                          ▼
+      └───► retrieve ──► destination ──► itinerary ──► explanation ──► output_guard ──► format
+                                                                                        │
+                                                  (background, INLINE_EVALUATION=1) evaluate
+
+Retrieval starts speculatively alongside the input guardrails and is
+abandoned if the guard blocks. The LLM-as-judge evaluation is done offline
+(evaluate_offline.py); with INLINE_EVALUATION=1 it also runs in the
+background of live plans and its scores are logged when they arrive.
+
+``stream_plan`` runs the same context stages, then streams the itinerary and
+explanation tokens and yields progressively rendered Markdown.
+
+Both pipelines generate through a StreamingGuard: the first sensitive term
+in the itinerary or explanation closes the generation on the spot and the
+remaining stages are skipped.
+
+Every live user request (``live=True``) is appended to the query log (utils.query_log) with what
+served it, which is what the cache warmer (warm_cache.py) learns from.
+"""
+import logging
+import os
+import time
+from chains.destination_chain import retrieve_context, recommend_from_documents
+from chains.itinerary_chain import stream_itinerary, finish_itinerary
+from chains.explainability_chain import stream_explanation
+from guards.guardrails import input_guardrails, output_guardrails, RESTRICTED_OUTPUT
+from guards.streaming import StreamingGuard, consume_guarded, record_stream
+from utils.format_output import format_response, itinerary_days
+from utils.evaluate_response import evaluate_response
+from utils.llm_json import IncrementalJSONParser
+from utils.plan_cache import get_plan_cache
+from utils.query_log import log_query
+from utils.stage_graph import Stage, StageGraph, run_in_background
+from utils.telemetry import span, record_cache
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between partial re-renders while streaming
+STREAM_RENDER_INTERVAL = float(os.getenv("STREAM_RENDER_INTERVAL", "0.15"))
+# Judge live plans too (default: only the offline harness pays for the judge)
+INLINE_EVALUATION = os.getenv("INLINE_EVALUATION", "0").lower() in ("1", "true", "yes")
+
+
+def _combine_output(itinerary, explanation):
+    return output_guardrails({"itinerary": itinerary, "explanation": explanation})
+
+
+class GuardrailHit:
+    """Stage result standing in for a generation aborted by the streaming guard."""
+    def __init__(self, stage, guard_report):
+        self.stage = stage
+        self.report = guard_report
+
+
+def _is_guardrail_hit(value):
+    return isinstance(value, GuardrailHit)
+
+
+def _guarded_itinerary(destination_result, slots):
+    with span("itinerary", streamed=True) as itinerary_span:
+        guard = StreamingGuard()
+        text, match = consume_guarded(stream_itinerary(destination_result, slots), guard)
+        itinerary_span.set("guardrail_abort", match is not None)
+    report = record_stream(guard, skipped_generations=1)  # explanation never runs
+    if match:
+        return GuardrailHit("itinerary", report)
+    return finish_itinerary(text, destination_result, slots)
+
+
+def _guarded_explanation(itinerary, destination_result):
+    with span("explanation", streamed=True) as explanation_span:
+        guard = StreamingGuard()
+        text, match = consume_guarded(stream_explanation(itinerary, destination_result), guard)
+        explanation_span.set("guardrail_abort", match is not None)
+    report = record_stream(guard)
+    if match:
+        return GuardrailHit("explanation", report)
+    return text.strip()
+
+
+def _restricted_result(hit: GuardrailHit, timings) -> dict:
+    logger.warning("Output guardrail stopped the %s generation: %s", hit.stage, hit.report)
+    return {"blocked": False, "response": format_response(dict(RESTRICTED_OUTPUT)),
+            "cached": False, "timings": timings, "guardrail": hit.report}
+
+
+# Guardrails, speculative retrieval and the RAG answer: shared by the blocking
+# and the streaming pipelines.
+context_stages = [
+    Stage("guard", input_guardrails, inputs=["slots"], output="guard_check",
+          abort_when=lambda check: check["blocked"]),
+    Stage("retrieve", retrieve_context, inputs=["slots"], output="documents"),
+    Stage("destination", recommend_from_documents, inputs=["slots", "documents"],
+          output="destination_result", after=["guard_check"]),
+]
+
+context_graph = StageGraph(context_stages, initial_inputs=["slots"])
+
+plan_graph = StageGraph(context_stages + [
+    Stage("itinerary", _guarded_itinerary, inputs=["destination_result", "slots"],
+          output="itinerary", abort_when=_is_guardrail_hit),
+    Stage("explanation", _guarded_explanation, inputs=["itinerary", "destination_result"],
+          output="explanation", abort_when=_is_guardrail_hit),
+    Stage("output_guard", _combine_output, inputs=["itinerary", "explanation"],
+          output="final_output"),
+    Stage("format", format_response, inputs=["final_output"], output="formatted_response"),
+], initial_inputs=["slots"])
+
+
+def _log_evaluation(scores, error):
+    if error is not None:
+        logger.warning("Background evaluation failed: %s", error)
+    else:
+        logger.info("Evaluation scores: %s", scores)
+
+
+def _served_by(result: dict) -> str:
+    if result["blocked"]:
+        return "guard"
+    if result["cached"]:
+        return "warmed" if result.get("warmed") else "cache"
+    return "pipeline"
+
+
+def plan_trip(slots: dict, evaluate: bool = None, use_cache: bool = True,
+              live: bool = False) -> dict:
+    """
+    Run the full pipeline for ``slots`` (``evaluate`` defaults to INLINE_EVALUATION).
+
+    Returns ``{"blocked", "response", "cached", "timings"}`` where ``response``
+    is the guardrail warning when blocked, otherwise the formatted Markdown.
+    Only ``live=True`` calls (real users: app.py, service.py) go to the query
+    log, so benchmarks, batches, evaluations and the warmer never skew it.
+    """
+    if evaluate is None:
+        evaluate = INLINE_EVALUATION
+    with span("plan_trip") as plan_span:
+        result = _plan_trip(slots, evaluate, use_cache)
+        if live:
+            log_query(slots, _served_by(result))
+        plan_span.set("blocked", result["blocked"])
+        plan_span.set("cached", result["cached"])
+    return result
+
+
+def _plan_trip(slots, evaluate, use_cache):
+    slots = dict(slots)  # stages read it from worker threads
+    plan_cache = get_plan_cache()
+
+    if use_cache:
+        cached_plan = plan_cache.get(slots)
+        record_cache("plan", hits=cached_plan is not None, misses=cached_plan is None)
+        # Blocked plans are never stored, but re-check in case the policy changed
+        if cached_plan is not None and not input_guardrails(slots)["blocked"]:
+            return {"blocked": False, "response": cached_plan["formatted_response"],
+                    "cached": True, "warmed": "warmed_at" in cached_plan, "timings": {}}
+
+    run = plan_graph.run(slots=slots)
+    values = run["values"]
+
+    if run["aborted_by"] == "guard":
+        return {"blocked": True, "response": values["guard_check"]["response"],
+                "cached": False, "timings": run["timings"]}
+    if run["aborted_by"] in ("itinerary", "explanation"):
+        return _restricted_result(values[run["aborted_by"]], run["timings"])
+
+    formatted_response = values["formatted_response"]
+    if use_cache:
+        plan_cache.set(slots, {"formatted_response": formatted_response})
+    if evaluate:
+        run_in_background(evaluate_response, formatted_response, on_done=_log_evaluation)
+
+    return {"blocked": False, "response": formatted_response,
+            "cached": False, "timings": run["timings"]}
+
+
+def stream_plan(slots: dict, evaluate: bool = None, use_cache: bool = True,
+                live: bool = False):
+    """
+    Streaming variant of ``plan_trip``.
+
+    Yields ``{"type": "partial", "response": markdown}`` while the itinerary
+    and explanation are generated (at most every STREAM_RENDER_INTERVAL
+    seconds), then one ``{"type": "final", ...}`` event with the same fields
+    ``plan_trip`` returns.
+    """
+    if evaluate is None:
+        evaluate = INLINE_EVALUATION
+    with span("stream_plan") as plan_span:
+        for event in _stream_plan(slots, evaluate, use_cache):
+            if event["type"] == "final":
+                plan_span.set("blocked", event["blocked"])
+                plan_span.set("cached", event["cached"])
+                if live:
+                    log_query(slots, _served_by(event))
+            yield event
+
+
+def _stream_plan(slots, evaluate, use_cache):
+    slots = dict(slots)
+    plan_cache = get_plan_cache()
+
+    if use_cache:
+        cached_plan = plan_cache.get(slots)
+        record_cache("plan", hits=cached_plan is not None, misses=cached_plan is None)
+        if cached_plan is not None and not input_guardrails(slots)["blocked"]:
+            yield {"type": "final", "blocked": False, "response": cached_plan["formatted_response"],
+                   "cached": True, "warmed": "warmed_at" in cached_plan, "timings": {}}
+            return
+
+    run = context_graph.run(slots=slots)
+    values, timings = run["values"], run["timings"]
+    if run["aborted_by"] == "guard":
+        yield {"type": "final", "blocked": True, "response": values["guard_check"]["response"],
+               "cached": False, "timings": timings}
+        return
+
+    destination_result = values["destination_result"]
+    last_render = 0.0
+
+    def should_render():
+        nonlocal last_render
+        now = time.perf_counter()
+        if now - last_render >= STREAM_RENDER_INTERVAL:
+            last_render = now
+            return True
+        return False
+
+    # ---------- ITINERARY ----------
+    start = time.perf_counter()
+    guard = StreamingGuard()
+    with span("itinerary", streamed=True):
+        chunks = stream_itinerary(destination_result, slots)
+        parser = IncrementalJSONParser()  # days are parsed once, as each one completes
+        for chunk in chunks:
+            parser.feed(chunk)
+            if guard.feed(chunk):
+                break
+            if should_render():
+                days = itinerary_days(parser.completed)
+                yield {"type": "partial",
+                       "response": format_response({"itinerary": days,
+                                                    "day_in_progress": len(days) + 1},
+                                                   partial=True)}
+        else:
+            guard.finish()
+        chunks.close()  # stops the in-flight generation if the guard fired
+    timings["itinerary"] = round(time.perf_counter() - start, 4)
+    report = record_stream(guard, skipped_generations=1)
+    if guard.match:
+        yield dict(_restricted_result(GuardrailHit("itinerary", report), timings), type="final")
+        return
+    itinerary = finish_itinerary(parser.text, destination_result, slots)
+
+    # ---------- EXPLANATION ----------
+    start = time.perf_counter()
+    guard = StreamingGuard()
+    with span("explanation", streamed=True):
+        chunks = stream_explanation(itinerary, destination_result)
+        explanation = ""
+        for chunk in chunks:
+            explanation += chunk
+            if guard.feed(chunk):
+                break
+            if should_render():
+                yield {"type": "partial",
+                       "response": format_response({"itinerary": itinerary, "explanation": explanation},
+                                                   partial=True)}
+        else:
+            guard.finish()
+        chunks.close()
+    timings["explanation"] = round(time.perf_counter() - start, 4)
+    report = record_stream(guard)
+    if guard.match:
+        yield dict(_restricted_result(GuardrailHit("explanation", report), timings), type="final")
+        return
+
+    formatted_response = format_response(_combine_output(itinerary, explanation.strip()))
+    if use_cache:
+        plan_cache.set(slots, {"formatted_response": formatted_response})
+    if evaluate:
+        run_in_background(evaluate_response, formatted_response, on_done=_log_evaluation)
+
+    yield {"type": "final", "blocked": False, "response": formatted_response,
+           "cached": False, "timings": timings}
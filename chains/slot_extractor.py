@@ -0,0 +1,288 @@
+# chains/slot_extractor.py
+"""
+Deterministic intent and slot extraction, tried before the LLM.
+
+A destination gazetteer (seed list + place names mined from the ingested
+corpus), regexes for day counts and ₹ ranges and keyword lexicons for trip
+types and budget tiers fill the same slots ``get_intent_and_slots`` returns.
+Each extraction carries a confidence; below RULE_CONFIDENCE_THRESHOLD the
+caller falls through to the LLM.
+"""
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join("data", "gazetteer.json"))
+RULE_CONFIDENCE_THRESHOLD = float(os.getenv("RULE_CONFIDENCE_THRESHOLD", "0.7"))
+
+# Same defaults the LLM path falls back to
+DEFAULT_SLOTS = {"destination": "India", "budget": "moderate", "trip_type": "general", "days": "3"}
+
+# How much each slot contributes to confidence; without a destination the
+# score can never reach the default threshold.
+SLOT_WEIGHTS = {"destination": 0.5, "days": 0.2, "trip_type": 0.15, "budget": 0.15}
+
+SEED_DESTINATIONS = [
+    "Agra", "Alleppey", "Amritsar", "Andaman", "Bangalore", "Chandigarh", "Chennai",
+    "Coorg", "Darjeeling", "Delhi", "Dharamshala", "Gangtok", "Goa", "Gokarna", "Hampi",
+    "Hyderabad", "Jaipur", "Jaisalmer", "Jodhpur", "Kasol", "Kashmir", "Kerala",
+    "Khajuraho", "Kodaikanal", "Kolkata", "Ladakh", "Leh", "Lonavala", "Manali",
+    "McLeod Ganj", "Mount Abu", "Mumbai", "Munnar", "Mussoorie", "Mysore", "Nainital",
+    "Ooty", "Pondicherry", "Pushkar", "Rishikesh", "Shillong", "Shimla", "Sikkim",
+    "Spiti", "Srinagar", "Udaipur", "Varanasi", "Wayanad",
+]
+
+# State / territory of each seed destination; ingestion tags chunks with it so
+# a query for "Kerala" also finds chunks that only mention Munnar or Alleppey
+DESTINATION_REGIONS = {
+    "Agra": "Uttar Pradesh", "Alleppey": "Kerala", "Amritsar": "Punjab",
+    "Andaman": "Andaman and Nicobar", "Bangalore": "Karnataka", "Chandigarh": "Punjab",
+    "Chennai": "Tamil Nadu", "Coorg": "Karnataka", "Darjeeling": "West Bengal",
+    "Delhi": "Delhi", "Dharamshala": "Himachal Pradesh", "Gangtok": "Sikkim", "Goa": "Goa",
+    "Gokarna": "Karnataka", "Hampi": "Karnataka", "Hyderabad": "Telangana",
+    "Jaipur": "Rajasthan", "Jaisalmer": "Rajasthan", "Jodhpur": "Rajasthan",
+    "Kasol": "Himachal Pradesh", "Kashmir": "Kashmir", "Kerala": "Kerala",
+    "Khajuraho": "Madhya Pradesh", "Kodaikanal": "Tamil Nadu", "Kolkata": "West Bengal",
+    "Ladakh": "Ladakh", "Leh": "Ladakh", "Lonavala": "Maharashtra",
+    "Manali": "Himachal Pradesh", "McLeod Ganj": "Himachal Pradesh", "Mount Abu": "Rajasthan",
+    "Mumbai": "Maharashtra", "Munnar": "Kerala", "Mussoorie": "Uttarakhand",
+    "Mysore": "Karnataka", "Nainital": "Uttarakhand", "Ooty": "Tamil Nadu",
+    "Pondicherry": "Puducherry", "Pushkar": "Rajasthan", "Rishikesh": "Uttarakhand",
+    "Shillong": "Meghalaya", "Shimla": "Himachal Pradesh", "Sikkim": "Sikkim",
+    "Spiti": "Himachal Pradesh", "Srinagar": "Kashmir", "Udaipur": "Rajasthan",
+    "Varanasi": "Uttar Pradesh", "Wayanad": "Kerala",
+}
+
+# Capitalized words that follow "in"/"to"/"visit" in the corpus but are not places
+GAZETTEER_STOPWORDS = {
+    "the", "a", "an", "india", "day", "days", "this", "that", "these", "those", "our",
+    "your", "their", "its", "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december", "summer",
+    "winter", "monsoon", "spring", "autumn",
+}
+
+# Words that put the place after them as the trip's destination (not its origin)
+DESTINATION_CUE_PATTERN = re.compile(r"\b(?:to|in|visit|visiting|explore|exploring)\s+$")
+
+PLACE_CONTEXT_PATTERN = re.compile(
+    r"\b(?i:in|to|visit|visiting|explore|exploring|around|near|at)\s+"
+    r"([A-Z][a-z]+(?:\s[A-Z][a-z]+)?)"
+)
+
+TRIP_TYPE_LEXICON = {
+    "honeymoon": ["honeymoon", "romantic", "couple", "anniversary"],
+    "adventure": ["adventure", "trek", "trekking", "hiking", "rafting", "paragliding",
+                  "camping", "scuba", "skiing"],
+    "family": ["family", "kids", "children", "parents"],
+    "solo": ["solo", "alone", "by myself"],
+    "friends": ["friends", "group trip", "bachelor"],
+    "spiritual": ["spiritual", "pilgrimage", "temple", "temples"],
+    "beach": ["beach", "beaches"],
+    "cultural": ["heritage", "culture", "cultural", "history", "historical", "forts"],
+    "wildlife": ["wildlife", "safari", "national park"],
+    "relaxation": ["relax", "relaxing", "relaxation", "leisure", "chill"],
+}
+
+# Bare "budget" is no tier: "budget: luxury" and "my budget is high" say nothing cheap
+BUDGET_LEXICON = {
+    "low": ["cheap", "on a budget", "budget trip", "budget-friendly", "budget friendly",
+            "low budget", "tight budget", "budget is low", "backpacking", "affordable",
+            "low cost", "low-cost", "economical", "inexpensive"],
+    "moderate": ["moderate", "mid-range", "mid range", "reasonable", "mid budget"],
+    "luxury": ["luxury", "luxurious", "premium", "5-star", "5 star", "five star",
+               "lavish", "high-end", "high end", "high budget", "budget is high"],
+}
+
+INTENT_LEXICON = {
+    "budget": ["cost", "costs", "price", "how much", "expensive", "budget"],
+    "activity": ["things to do", "activities", "what to do", "activity", "experiences"],
+    "destination_info": ["tell me about", "best time", "weather", "famous for",
+                         "known for", "information about", "info about"],
+}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+    "fourteen": 14, "fifteen": 15,
+}
+
+DAYS_PATTERN = re.compile(
+    r"\b(\d{1,2}|" + "|".join(NUMBER_WORDS) + r")[\s-]*(days?|nights?)\b"
+)
+WEEK_PATTERN = re.compile(r"\b(a|one|two|\d)\s*weeks?\b")
+WEEKEND_PATTERN = re.compile(r"\b(long\s+)?weekend\b")
+
+AMOUNT = r"(\d[\d,]*(?:\.\d+)?)\s*(k|lakhs?|l)?"
+CURRENCY = r"(?:₹|rs\.?|inr|rupees)"
+BUDGET_RANGE_PATTERN = re.compile(
+    rf"{CURRENCY}\s*{AMOUNT}\s*(?:-|–|to)\s*{CURRENCY}?\s*{AMOUNT}"
+    rf"|{AMOUNT}\s*(?:-|–|to)\s*{AMOUNT}\s*{CURRENCY}"
+)
+BUDGET_SINGLE_PATTERN = re.compile(
+    rf"(?:(under|below|within|upto|up to|max)\s+)?{CURRENCY}\s*{AMOUNT}"
+    rf"|(?:(under|below|within|upto|up to|max)\s+)?{AMOUNT}\s*{CURRENCY}"
+)
+AMOUNT_MULTIPLIERS = {"k": 1_000, "l": 100_000, "lakh": 100_000, "lakhs": 100_000}
+
+
+# -------------------------
+# Gazetteer
+# -------------------------
+def build_gazetteer(texts, min_count: int = 3) -> list:
+    """
+    Seed destinations plus capitalized names that the corpus repeatedly uses
+    after "in", "to", "visit", ... (at least ``min_count`` times).
+    """
+    counts = Counter()
+    for text in texts:
+        for name in PLACE_CONTEXT_PATTERN.findall(text):
+            if name.lower() not in GAZETTEER_STOPWORDS:
+                counts[name] += 1
+    mined = [name for name, count in counts.items() if count >= min_count]
+    return sorted(set(SEED_DESTINATIONS) | set(mined))
+
+
+def update_gazetteer(texts, path: str = GAZETTEER_PATH, min_count: int = 3) -> list:
+    """Merge names mined from ``texts`` into the gazetteer file."""
+    names = set(build_gazetteer(texts, min_count))
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            names |= set(json.load(f))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(sorted(names), f, indent=2, ensure_ascii=False)
+    load_gazetteer.cache_clear()
+    extract_slots.cache_clear()
+    return sorted(names)
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer(path: str = GAZETTEER_PATH):
+    """Return ({lowercase: canonical name}, matcher); longest names win so "Mount Abu" beats "Abu"."""
+    names = list(SEED_DESTINATIONS)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            names = sorted(set(names) | set(json.load(f)))
+    alternation = "|".join(re.escape(n.lower()) for n in sorted(names, key=len, reverse=True))
+    canonical = {n.lower(): n for n in names}
+    return canonical, re.compile(rf"\b({alternation})\b")
+
+
+# -------------------------
+# Extraction
+# -------------------------
+def normalize_query(query: str) -> str:
+    text = unicodedata.normalize("NFKC", str(query)).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _amount(number: str, suffix: str) -> int:
+    return int(float(number.replace(",", "")) * AMOUNT_MULTIPLIERS.get(suffix or "", 1))
+
+
+def _first_lexicon_match(text: str, lexicon: dict):
+    best = None
+    for label, keywords in lexicon.items():
+        for keyword in keywords:
+            match = re.search(rf"\b{re.escape(keyword)}\b", text)
+            if match and (best is None or match.start() < best[0]):
+                best = (match.start(), label)
+    return best[1] if best else None
+
+
+def destination_mentions(text: str) -> list:
+    """
+    Distinct gazetteer destinations in ``text``, the ones right after "to",
+    "in", "visit", ... first (so "from delhi to manali" gives Manali first).
+    """
+    canonical, matcher = load_gazetteer()
+    cued, others = [], []
+    for match in matcher.finditer(text):
+        name = canonical[match.group(1)]
+        cue = DESTINATION_CUE_PATTERN.search(text[max(0, match.start() - 12):match.start()])
+        (cued if cue else others).append(name)
+    return list(dict.fromkeys(cued + others))
+
+
+def lexicon_label(value: str, lexicon: dict) -> str:
+    """The lexicon label ``value`` stands for ("romantic" → "honeymoon"); ``value`` if none."""
+    text = normalize_query(value)
+    return text if text in lexicon else _first_lexicon_match(text, lexicon) or value
+
+
+def extract_destination(text: str):
+    mentions = destination_mentions(text)
+    return mentions[0] if mentions else None
+
+
+def find_destinations(text: str) -> list:
+    """Every gazetteer destination mentioned in ``text``, most mentioned first."""
+    canonical, matcher = load_gazetteer()
+    counts = Counter(canonical[name] for name in matcher.findall(normalize_query(text)))
+    return [name for name, _ in counts.most_common()]
+
+
+def regions_of(destinations) -> list:
+    """Regions of ``destinations`` (names without a known region are skipped)."""
+    return sorted({DESTINATION_REGIONS[name] for name in destinations if name in DESTINATION_REGIONS})
+
+
+def extract_days(text: str):
+    match = DAYS_PATTERN.search(text)
+    if match:
+        number = match.group(1)
+        count = int(number) if number.isdigit() else NUMBER_WORDS[number]
+        # "3 nights" is a 4 day trip
+        return str(count + 1 if match.group(2).startswith("night") else count)
+    match = WEEK_PATTERN.search(text)
+    if match:
+        number = match.group(1)
+        weeks = int(number) if number.isdigit() else NUMBER_WORDS.get(number, 1)
+        return str(7 * weeks)
+    match = WEEKEND_PATTERN.search(text)
+    if match:
+        return "3" if match.group(1) else "2"
+    return None
+
+
+def extract_budget(text: str):
+    match = BUDGET_RANGE_PATTERN.search(text)
+    if match:
+        groups = [g for g in match.groups()]
+        amounts = [(groups[i], groups[i + 1]) for i in range(0, 8, 2) if groups[i]]
+        low, high = (_amount(*a) for a in amounts[:2])
+        return f"₹{low:,} - ₹{high:,}"
+    match = BUDGET_SINGLE_PATTERN.search(text)
+    if match:
+        groups = match.groups()
+        qualifier, number, suffix = groups[0:3] if groups[1] else groups[3:6]
+        amount = f"₹{_amount(number, suffix):,}"
+        return f"under {amount}" if qualifier else amount
+    return _first_lexicon_match(text, BUDGET_LEXICON)
+
+
+def extract_intent(text: str) -> str:
+    return _first_lexicon_match(text, INTENT_LEXICON) or "general"
+
+
+@lru_cache(maxsize=2048)
+def extract_slots(normalized_query: str):
+    """
+    Rule-based extraction for an already normalized query. Returns
+    ``(intent, slots, confidence)`` where missing slots are None.
+    """
+    destinations = destination_mentions(normalized_query)
+    slots = {
+        "destination": destinations[0] if destinations else None,
+        "budget": extract_budget(normalized_query),
+        "trip_type": _first_lexicon_match(normalized_query, TRIP_TYPE_LEXICON),
+        "days": extract_days(normalized_query),
+    }
+    confidence = sum(weight for key, weight in SLOT_WEIGHTS.items() if slots[key])
+    if len(destinations) > 1:
+        # Several places (origin, stops, comparisons): let the LLM decide
+        confidence = min(confidence, RULE_CONFIDENCE_THRESHOLD - SLOT_WEIGHTS["budget"])
+    return extract_intent(normalized_query), slots, round(confidence, 2)
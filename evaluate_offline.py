@@ -0,0 +1,176 @@
+# evaluate_offline.py
+"""
+Offline quality evaluation: judge scores next to per-stage latency.
+
+    python evaluate_offline.py                                   # data/eval_queries.jsonl
+    python evaluate_offline.py --plans plans.jsonl               # judge existing batch_plan output
+    python evaluate_offline.py --label llama2-13b --compare eval_runs/llama3-8b.report.json
+
+Plans come either from ``--plans`` (output of batch_plan.py, so a model or
+prompt configuration can be planned once and judged many times) or are
+generated for the fixed query set with batch_plan's runner into
+eval_runs/<label>.plans.jsonl, which resumes like any batch run. Planning
+bypasses the plan cache: its key ignores the model and prompts, so a cached
+plan may come from another configuration and has no stage timings
+(``--plan-cache`` opts back in; cached plans are left out of the latency).
+
+Every planned response is scored by the LLM judge (utils.evaluate_response)
+with at most ``--judge-concurrency`` verdicts in flight. Verdicts are cached
+by hash of response + judge prompt + judge model, so re-running the harness
+only pays for responses that changed.
+
+The report (eval_runs/<label>.report.json) holds the mean score per
+criterion, p50/p95/p99 latency per stage, and quality per second (mean
+score / mean seconds per plan), the number to compare configurations on.
+
+``--stubs`` swaps every model for benchmarks.stubs to smoke-test the harness.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.latency import latency_summary
+
+EVAL_QUERIES = os.path.join("data", "eval_queries.jsonl")
+EVAL_DIR = "eval_runs"
+
+
+def read_plans(path: str) -> list:
+    """batch_plan output records, last one per id."""
+    plans = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                plans[str(record["id"])] = record
+    return list(plans.values())
+
+
+def judge_plans(plans: list, concurrency: int, use_cache: bool = True) -> list:
+    """``{"id", "scores", "judge_s"}`` for every plan that produced a response."""
+    from utils.evaluate_response import evaluate_response
+
+    def judge(record):
+        start = time.perf_counter()
+        try:
+            scores, error = evaluate_response(record["response"], use_cache=use_cache), None
+        except Exception as e:
+            scores, error = {}, f"{type(e).__name__}: {e}"
+        return {"id": record["id"], "scores": scores, "error": error,
+                "judge_s": round(time.perf_counter() - start, 4)}
+
+    judged = [record for record in plans if not record.get("error") and not record.get("blocked")]
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="judge") as pool:
+        return list(pool.map(judge, judged))
+
+
+def summarize(plans: list, verdicts: list) -> dict:
+    from utils.evaluate_response import CRITERIA
+
+    criteria = {}
+    for name in CRITERIA:
+        scores = [v["scores"].get(name) for v in verdicts if v["scores"].get(name) is not None]
+        criteria[name] = round(sum(scores) / len(scores), 3) if scores else None
+    scored = [score for score in criteria.values() if score is not None]
+    overall = round(sum(scored) / len(scored), 3) if scored else None
+
+    samples = {}
+    for record in plans:
+        if record.get("cached"):
+            continue  # no stage ran: would count as a zero-second plan
+        for stage, seconds in record.get("timings", {}).items():
+            samples.setdefault(stage, []).append(seconds)
+    totals = samples.get("total", [])
+    mean_total = sum(totals) / len(totals) if totals else None
+
+    return {
+        "plans": len(plans),
+        "judged": len(verdicts),
+        "blocked": sum(bool(record.get("blocked")) for record in plans),
+        "cached": sum(bool(record.get("cached")) for record in plans),
+        "plan_errors": sum(bool(record.get("error")) for record in plans),
+        "judge_errors": sum(v["error"] is not None for v in verdicts),
+        "criteria": criteria,
+        "overall": overall,
+        "mean_plan_s": round(mean_total, 4) if mean_total is not None else None,
+        "quality_per_second": round(overall / mean_total, 4) if overall and mean_total else None,
+        "latency": latency_summary(samples),
+        "judge_latency": latency_summary({"judge": [v["judge_s"] for v in verdicts]})["judge"]
+        if verdicts else None,
+    }
+
+
+def print_summary(label: str, summary: dict):
+    print(f"\n📊 {label}: {summary['judged']}/{summary['plans']} plans judged "
+          f"({summary['blocked']} blocked, {summary['cached']} cached, "
+          f"{summary['plan_errors']} plan errors, {summary['judge_errors']} judge errors)")
+    for name, score in summary["criteria"].items():
+        print(f"  {name:<14}{score if score is not None else '-':>7}")
+    print(f"  {'overall':<14}{summary['overall'] if summary['overall'] is not None else '-':>7}"
+          f"   mean plan {summary['mean_plan_s']}s   quality/s {summary['quality_per_second']}")
+    print(f"{'stage':<14}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, row in summary["latency"].items():
+        print(f"{stage:<14}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+
+def compare(summary: dict, baseline: dict):
+    old = baseline["summary"]
+    print(f"\nChange against {baseline['label']}:")
+    for name in list(summary["criteria"]) + ["overall", "mean_plan_s", "quality_per_second"]:
+        new_value = summary["criteria"].get(name, summary.get(name))
+        old_value = old["criteria"].get(name, old.get(name))
+        if new_value is None or old_value is None:
+            continue
+        print(f"  {name:<20}{old_value:>9} → {new_value:<9}({new_value - old_value:+.3f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score plans with the LLM judge next to stage latency")
+    parser.add_argument("--queries", default=EVAL_QUERIES, help="fixed JSONL query set to plan")
+    parser.add_argument("--plans", default=None, help="judge this batch_plan output instead of planning")
+    parser.add_argument("--label", default=None, help="run name (default: timestamp)")
+    parser.add_argument("--concurrency", type=int, default=4, help="queries planned at once")
+    parser.add_argument("--judge-concurrency", type=int, default=2, help="verdicts in flight at once")
+    parser.add_argument("--plan-cache", action="store_true",
+                        help="reuse cached plans (may come from another model/prompt configuration)")
+    parser.add_argument("--no-verdict-cache", action="store_true", help="judge every response afresh")
+    parser.add_argument("--compare", default=None, help="earlier report JSON to diff against")
+    parser.add_argument("--stubs", action="store_true", help="use benchmarks.stubs instead of real models")
+    args = parser.parse_args()
+
+    if args.stubs:
+        from benchmarks.stubs import install_stubs
+        install_stubs()
+    label = args.label or time.strftime("%Y%m%d-%H%M%S")
+    os.makedirs(EVAL_DIR, exist_ok=True)
+
+    plans_path = args.plans
+    if plans_path is None:
+        from batch_plan import run_batch
+        plans_path = os.path.join(EVAL_DIR, f"{label}.plans.jsonl")
+        run_batch(args.queries, plans_path, concurrency=args.concurrency, evaluate=False,
+                  use_cache=args.plan_cache)
+    plans = read_plans(plans_path)
+
+    start = time.perf_counter()
+    verdicts = judge_plans(plans, args.judge_concurrency, use_cache=not args.no_verdict_cache)
+    print(f"⚖️ Judged {len(verdicts)} responses in {time.perf_counter() - start:.1f}s")
+
+    summary = summarize(plans, verdicts)
+    print_summary(label, summary)
+    report_path = os.path.join(EVAL_DIR, f"{label}.report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"label": label, "plans_path": plans_path, "summary": summary,
+                   "verdicts": verdicts}, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Report saved to {report_path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(summary, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# guards/engine.py
+"""
+Guardrail engine: every policy list compiled into one Aho-Corasick automaton.
+
+Text and terms go through the same normalization (Unicode NFKD with
+diacritics stripped, casefolding, punctuation and whitespace runs collapsed
+to one space), so "Crédit-Card" matches "credit card". Matches must sit on
+word boundaries ("visa" does not fire inside "Visakhapatnam") and are
+reported with their span in the original, un-normalized text. One pass over
+the text finds every term of every list, however many terms there are.
+"""
+import json
+import os
+import re
+import unicodedata
+from collections import deque, namedtuple
+from functools import lru_cache
+
+POLICY_PATH = os.getenv("GUARDRAIL_POLICY_PATH",
+                        os.path.join(os.path.dirname(__file__), "policies.json"))
+
+Match = namedtuple("Match", ["policy", "term", "start", "end"])
+
+ASCII_WORD = re.compile(r"[A-Za-z0-9]+")
+
+
+def normalize(text: str):
+    """
+    Return ``(normalized, offsets)`` where ``offsets[i]`` is the index in
+    ``text`` of the character that produced ``normalized[i]``.
+    """
+    if text.isascii():
+        # Fast path: no decomposition, so each word maps 1:1 onto the original
+        words, offsets = [], []
+        for match in ASCII_WORD.finditer(text):
+            if words:
+                offsets.append(match.start())
+            words.append(match.group().lower())
+            offsets.extend(range(match.start(), match.end()))
+        return " ".join(words), offsets
+
+    chars, offsets = [], []
+    pending_space = False
+    for index, char in enumerate(text):
+        for piece in unicodedata.normalize("NFKD", char):
+            if unicodedata.combining(piece):
+                continue
+            for folded in piece.casefold():
+                if folded.isalnum():
+                    if pending_space and chars:
+                        chars.append(" ")
+                        offsets.append(index)
+                    pending_space = False
+                    chars.append(folded)
+                    offsets.append(index)
+                else:
+                    pending_space = True
+    return "".join(chars), offsets
+
+
+class GuardrailEngine:
+    def __init__(self, policies: dict):
+        """``policies`` maps a policy name to its list of terms."""
+        self.policies = {name: list(terms) for name, terms in policies.items()}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # node -> [(term, policy names)]
+        self.max_term_length = 0
+        self._build()
+
+    # -------------------------
+    # Build
+    # -------------------------
+    def _build(self):
+        term_policies = {}
+        for name, terms in self.policies.items():
+            for term in terms:
+                normalized, _ = normalize(term)
+                if normalized:
+                    term_policies.setdefault(normalized, set()).add(name)
+                    self.max_term_length = max(self.max_term_length, len(normalized))
+
+        for term, names in term_policies.items():
+            node = 0
+            for char in term:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = next_node
+            self._output[node].append((term, tuple(sorted(names))))
+
+        # Breadth-first failure links; outputs of the fallback state are inherited
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    # -------------------------
+    # Scan
+    # -------------------------
+    def scan(self, text: str, policies=None, final: bool = True) -> list:
+        """
+        All word-bounded matches in ``text``, optionally limited to some policies.
+
+        With ``final=False`` the text is a prefix of a stream: a term touching
+        the very end cannot be confirmed yet ("visa" may become "visakhapatnam")
+        and is left for the next call.
+        """
+        wanted = set(policies) if policies else None
+        normalized, offsets = normalize(str(text))
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        node = 0
+        for position, char in enumerate(normalized):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not output[node]:
+                continue
+            for term, names in output[node]:
+                start = position - len(term) + 1
+                end = position + 1
+                # Word boundaries in normalized text: neighbours are spaces or the ends
+                if start > 0 and normalized[start - 1] != " ":
+                    continue
+                if end < len(normalized) and normalized[end] != " ":
+                    continue
+                if not final and end == len(normalized):
+                    continue
+                for name in names:
+                    if wanted is None or name in wanted:
+                        matches.append(Match(name, term, offsets[start], offsets[end - 1] + 1))
+        return matches
+
+    def first_match(self, text: str, policies=None, final: bool = True):
+        matches = self.scan(text, policies, final)
+        return matches[0] if matches else None
+
+
+def load_policies(path: str = POLICY_PATH) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def get_engine(path: str = POLICY_PATH) -> GuardrailEngine:
+    """Engine compiled once per policy file."""
+    return GuardrailEngine(load_policies(path))
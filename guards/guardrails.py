@@ -1,13 +1,28 @@
-def apply_guardrails(itinerary, explanation, slots):
-    sensitive_keywords = ["visa", "passport", "credit card", "insurance", "legal"]
-    restricted_places = ["north korea", "gaza", "syria"]
+from guards.engine import get_engine
+from utils.telemetry import traced
+
+# Keyword lists live in guards/policies.json and are compiled once into a
+# single automaton by guards.engine.
+
+# Replaces the whole answer when the generated output hits a sensitive topic
+RESTRICTED_OUTPUT = {
+    "itinerary": "⚠️ Restricted Information",
+    "explanation": (
+        "Some parts of the generated response included sensitive or financial guidance "
+        "which I am not authorized to provide. "
+        "Please focus on destinations, activities, and travel experiences instead."
+    )
+}
 
-    query_text = " ".join(str(v).lower() for v in slots.values() if isinstance(v, str))
 
-    if any(k in query_text for k in sensitive_keywords):
+def apply_guardrails(itinerary, explanation, slots):
+    query_text = " ".join(str(v) for v in slots.values() if isinstance(v, str))
+    engine = get_engine()
+
+    if engine.first_match(query_text, ["sensitive_advice"]):
         return "⚠️ I'm not authorized to provide sensitive or financial advice."
 
-    if any(loc in query_text for loc in restricted_places):
+    if engine.first_match(query_text, ["restricted_places"]):
         return "⚠️ Travel to this location is restricted. Please choose another destination."
 
     return {
@@ -15,17 +30,18 @@ def apply_guardrails(itinerary, explanation, slots):
         "explanation": explanation
     }
 
+@traced("guardrails.input")
 def input_guardrails(slots: dict):
     """
     Check for unsafe or restricted destinations in user input (slots).
     """
-    restricted_places = ["syria", "ukraine", "north korea", "gaza", "afghanistan"]
-
     # Check destination slot
-    destination = str(slots.get("destination", "")).lower()
-    if any(loc in destination for loc in restricted_places):
+    destination = str(slots.get("destination", ""))
+    matches = get_engine().scan(destination, ["restricted_destinations"])
+    if matches:
         return {
             "blocked": True,
+            "matches": matches,
             "response": {
                 "itinerary": "⚠️ Travel Advisory",
                 "explanation": (
@@ -38,26 +54,15 @@ def input_guardrails(slots: dict):
         }
     return {"blocked": False}
 
+@traced("guardrails.output")
 def output_guardrails(response: dict):
     """
     Validate final model output to block sensitive/unsafe topics.
     """
-    sensitive_keywords = [
-        "visa", "passport", "credit card", "insurance",
-        "loan", "bank account", "money transfer"
-    ]
-
-    # Flatten itinerary + explanation text for scanning
-    combined_text = f"{response.get('itinerary', '')} {response.get('explanation', '')}".lower()
+    # Flatten itinerary + explanation text for scanning (one pass over both)
+    combined_text = f"{response.get('itinerary', '')} {response.get('explanation', '')}"
 
-    if any(k in combined_text for k in sensitive_keywords):
-        return {
-            "itinerary": "⚠️ Restricted Information",
-            "explanation": (
-                "Some parts of the generated response included sensitive or financial guidance "
-                "which I am not authorized to provide. "
-                "Please focus on destinations, activities, and travel experiences instead."
-            )
-        }
+    if get_engine().first_match(combined_text, ["sensitive_output"]):
+        return dict(RESTRICTED_OUTPUT)
 
     return response
\ No newline at end of file
@@ -0,0 +1,108 @@
+# guards/streaming.py
+"""
+Incremental output guardrail for token streams.
+
+StreamingGuard re-scans only a sliding window (the unconfirmed tail of the
+previous text plus the new chunk), so a term split across tokens ("cre" +
+"dit card") is still caught, and reports the first policy hit as soon as it
+is certain. The caller then closes the generation and skips any later stage.
+"""
+import os
+import threading
+
+from guards.engine import get_engine
+
+# max_new_tokens of the generation; used to estimate tokens saved by aborting
+GENERATION_TOKEN_BUDGET = int(os.getenv("MAX_NEW_TOKENS", "512"))
+
+# Totals across all streams
+streaming_guard_stats = {"streams": 0, "aborts": 0, "tokens_consumed": 0, "tokens_saved": 0}
+_stats_lock = threading.Lock()
+
+
+class StreamingGuard:
+    def __init__(self, policies=("sensitive_output",), engine=None):
+        self.policies = list(policies)
+        self.engine = engine or get_engine()
+        # Keep at least a few terms' worth of characters so separators and
+        # odd whitespace inside a multi-word term still fit in the window.
+        self.window = max(64, 4 * self.engine.max_term_length)
+        self.tail = ""
+        self.tail_start = 0  # position of the tail in the full streamed text
+        self.tokens_seen = 0
+        self.match = None
+
+    def _check(self, text: str, final: bool):
+        match = self.engine.first_match(text, self.policies, final=final)
+        if match is not None:
+            # Report the span in the full streamed text, not the window
+            self.match = match._replace(start=match.start + self.tail_start,
+                                        end=match.end + self.tail_start)
+        return self.match
+
+    def _trim_tail(self, text: str):
+        if len(text) <= self.window:
+            return
+        cut = len(text) - self.window
+        # Start the window on a word boundary so a cut word never looks like a term
+        while cut > 0 and text[cut - 1].isalnum():
+            cut -= 1
+        self.tail = text[cut:]
+        self.tail_start += cut
+
+    def feed(self, chunk: str):
+        """Add one streamed chunk; return the first confirmed Match or None."""
+        if self.match is not None:
+            return self.match
+        self.tokens_seen += 1
+        self.tail += chunk
+        if self._check(self.tail, final=False) is None:
+            self._trim_tail(self.tail)
+        return self.match
+
+    def finish(self):
+        """End of stream: confirm a term that was waiting on the last chunk."""
+        if self.match is None:
+            self._check(self.tail, final=True)
+        return self.match
+
+
+def record_stream(guard: StreamingGuard, skipped_generations: int = 0) -> dict:
+    """
+    Add a finished (or aborted) stream to ``streaming_guard_stats``.
+
+    Tokens saved is estimated from the generation budget: the remainder of the
+    aborted generation plus the full budget of each skipped later generation.
+    """
+    saved = 0
+    if guard.match is not None:
+        saved = max(0, GENERATION_TOKEN_BUDGET - guard.tokens_seen) \
+            + skipped_generations * GENERATION_TOKEN_BUDGET
+    with _stats_lock:
+        streaming_guard_stats["streams"] += 1
+        streaming_guard_stats["tokens_consumed"] += guard.tokens_seen
+        if guard.match is not None:
+            streaming_guard_stats["aborts"] += 1
+            streaming_guard_stats["tokens_saved"] += saved
+    return {"match": guard.match, "tokens_consumed": guard.tokens_seen, "tokens_saved": saved}
+
+
+def consume_guarded(chunks, guard: StreamingGuard, on_chunk=None):
+    """
+    Drain ``chunks`` through ``guard``. On the first hit the generator is
+    closed, which stops the in-flight generation. Returns ``(text, match)``.
+    """
+    text = ""
+    try:
+        for chunk in chunks:
+            text += chunk
+            if guard.feed(chunk):
+                break
+            if on_chunk:
+                on_chunk(text)
+        else:
+            guard.finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    return text, guard.match
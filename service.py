@@ -0,0 +1,266 @@
+# service.py
+"""
+Headless planning service: the pipeline behind a small asyncio HTTP API.
+
+    python service.py --port 8600
+
+Endpoints (JSON in, JSON out):
+
+    POST   /plan                {"query": ..., "session_id": optional}
+    POST   /stream              same body; newline-delimited JSON events
+    GET    /session/<id>        slots remembered for a session
+    DELETE /session/<id>        forget a session
+    GET    /health
+    GET    /metrics             Prometheus text (see utils.telemetry)
+
+Each query goes through intent extraction, is merged into the session's slot
+memory (the same rule as ``update_slots`` in app.py) and planned with
+``plan_trip`` / ``stream_plan``. Connections are HTTP/1.1 keep-alive and
+served by one event loop. The blocking chain calls run on a bounded worker
+pool (SERVICE_WORKERS); the LLM calls themselves are made from the resilient
+layer's own pools (utils.resilient_llm). So one process serves many
+concurrent users, and Streamlit becomes a thin client (PLANNER_SERVICE_URL
+in app.py). A request neither LLM backend could answer gets a 503 (an error
+event with "status": 503 once streaming has started).
+
+Each in-flight plan also holds up to three threads of the shared stage pool,
+so raise PIPELINE_WORKERS along with SERVICE_WORKERS.
+
+With CACHE_WARMER=1 the service also precomputes the plans of popular slot
+combinations during the off-peak window (utils.cache_warmer).
+"""
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from chains.intent_chain import extract_intent_and_slots
+from chains.pipeline import plan_trip, stream_plan
+from utils.cache_warmer import start_background_warmer
+from utils.model_registry import warm_up
+from utils.resilient_llm import LLMUnavailableError
+from utils.sessions import SessionStore, new_session_id
+from utils.telemetry import render_metrics
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "0.0.0.0")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8600"))
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "32"))
+# Precompute popular plans in this process during the off-peak WARM_WINDOW
+CACHE_WARMER = os.getenv("CACHE_WARMER", "0").lower() in ("1", "true", "yes")
+MAX_BODY_BYTES = 64 * 1024
+KEEP_ALIVE_SECONDS = 75
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def _evaluate_flag(body: dict):
+    """The request's "evaluate" as a bool, or None for the server default (INLINE_EVALUATION)."""
+    evaluate = body.get("evaluate")
+    return None if evaluate is None else bool(evaluate)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class PlannerService:
+    def __init__(self, workers: int = SERVICE_WORKERS, sessions: SessionStore = None):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="service")
+        self.sessions = sessions or SessionStore()
+
+    # -------------------------
+    # Planning (runs on the worker pool)
+    # -------------------------
+    def _prepare(self, body: dict):
+        query = str(body.get("query") or "").strip()
+        if not query:
+            raise HTTPError(400, "'query' is required")
+        session_id = str(body.get("session_id") or new_session_id())
+        intent, new_slots, path = extract_intent_and_slots(query)
+        slots = self.sessions.update(session_id, new_slots)
+        return {"session_id": session_id, "intent": intent, "extraction_path": path,
+                "slots": slots}
+
+    def _plan(self, body: dict) -> dict:
+        context = self._prepare(body)
+        plan = plan_trip(context["slots"], evaluate=_evaluate_flag(body), live=True)
+        return {**context, **plan}
+
+    # -------------------------
+    # Routes
+    # -------------------------
+    async def plan(self, body: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, self._plan, body)
+
+    async def stream(self, context: dict, body: dict):
+        """Async iterator over stream_plan events, produced on the worker pool."""
+        loop = asyncio.get_running_loop()
+        yield {"type": "context", **context}
+
+        queue = asyncio.Queue()
+        done = object()
+        stop = False
+
+        def produce():
+            events = stream_plan(context["slots"], evaluate=_evaluate_flag(body), live=True)
+            try:
+                for event in events:
+                    if stop:  # client went away: stop generating
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
+            except Exception as e:
+                status = 503 if isinstance(e, LLMUnavailableError) else 500
+                loop.call_soon_threadsafe(queue.put_nowait,
+                                          {"type": "error", "status": status, "error": str(e)})
+            finally:
+                events.close()
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        loop.run_in_executor(self.pool, produce)
+        try:
+            while (event := await queue.get()) is not done:
+                if event["type"] == "final":
+                    event = {**event, "session_id": context["session_id"]}
+                yield event
+        finally:
+            stop = True
+
+    async def route(self, method: str, path: str, body: dict):
+        parts = [p for p in path.split("/") if p]
+        if parts == ["plan"] and method == "POST":
+            return await self.plan(body)
+        if parts == ["stream"] and method == "POST":
+            # Prepare first so a bad request still gets a proper error status
+            loop = asyncio.get_running_loop()
+            context = await loop.run_in_executor(self.pool, self._prepare, body)
+            return self.stream(context, body)
+        if len(parts) == 2 and parts[0] == "session":
+            if method == "GET":
+                return {"session_id": parts[1], "slots": self.sessions.get(parts[1])}
+            if method == "DELETE":
+                self.sessions.reset(parts[1])
+                return {"session_id": parts[1], "reset": True}
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        if parts == ["health"]:
+            return {"status": "ok", "sessions": len(self.sessions)}
+        if parts == ["metrics"]:
+            return render_metrics()
+        if parts and parts[0] in ("plan", "stream"):
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        raise HTTPError(404, f"No route for {path}")
+
+    # -------------------------
+    # HTTP/1.1 plumbing
+    # -------------------------
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_SECONDS)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version == "HTTP/1.1")
+
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False  # the unread body would corrupt the next request
+                        raise HTTPError(413, "Request body too large")
+                    raw_body = await reader.readexactly(length) if length else b""
+                    body = json.loads(raw_body) if raw_body else {}
+                    if not isinstance(body, dict):
+                        raise HTTPError(400, "Body must be a JSON object")
+                    result = await self.route(method.upper(), urlsplit(target).path, body)
+                except HTTPError as e:
+                    await self._respond(writer, e.status, {"error": str(e)}, keep_alive)
+                except (ValueError, asyncio.IncompleteReadError) as e:
+                    await self._respond(writer, 400, {"error": f"Bad request: {e}"}, keep_alive)
+                except LLMUnavailableError as e:
+                    await self._respond(writer, 503, {"error": str(e)}, keep_alive)
+                except Exception as e:
+                    await self._respond(writer, 500, {"error": str(e)}, keep_alive)
+                else:
+                    if hasattr(result, "__aiter__"):
+                        await self._respond_stream(writer, result, keep_alive)
+                    else:
+                        await self._respond(writer, 200, result, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _head(status: int, content_type: str, keep_alive: bool, extra: str = "") -> bytes:
+        return (f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                f"{extra}\r\n").encode("latin-1")
+
+    async def _respond(self, writer, status: int, payload, keep_alive: bool):
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            content_type = "application/json"
+        writer.write(self._head(status, content_type, keep_alive,
+                                f"Content-Length: {len(body)}\r\n") + body)
+        await writer.drain()
+
+    async def _respond_stream(self, writer, events, keep_alive: bool):
+        """Chunked transfer encoding, one JSON event per line."""
+        writer.write(self._head(200, "application/x-ndjson", keep_alive,
+                                "Transfer-Encoding: chunked\r\n"))
+        try:
+            async for event in events:
+                line = json.dumps(event, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+                writer.write(f"{len(line):X}\r\n".encode("latin-1") + line + b"\r\n")
+                await writer.drain()
+        finally:
+            await events.aclose()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+async def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT, workers: int = SERVICE_WORKERS):
+    service = PlannerService(workers=workers)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"🧳 Planning service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async HTTP planning service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--skip-warm-up", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_warm_up:
+        warm_up()
+    if CACHE_WARMER:
+        start_background_warmer()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,254 @@
+# utils/cache_warmer.py
+"""
+Popularity-driven plan cache warmer.
+
+Traffic is dominated by a few destinations, yet each one's first request
+after the plan cache expired pays full pipeline latency. The warmer
+precomputes those plans during off-peak hours:
+
+- targets: the slot combinations of WARM_SLOTS_FILE (a configured JSON list
+  of slot objects) first, then the WARM_TOP_N most requested combinations of
+  the query log (utils.query_log) over the last WARM_LOOKBACK_HOURS,
+- every target whose plan cache entry is missing or expires within
+  WARM_MIN_TTL seconds is planned with ``plan_trip`` and stored, marked as
+  warmed. The plan cache hit skips retrieval and all LLM calls, and the
+  query embedding lands in the persistent embedding cache on the way,
+- at most WARM_RATE_PER_MINUTE plans are started per minute, one at a time,
+  and the run stops after WARM_MAX_PLANS plans, after WARM_MAX_SECONDS of
+  pipeline time (the spend) or when the WARM_WINDOW ("HH:MM-HH:MM", local
+  time) closes.
+
+``traffic_report`` reads the query log back: the share of live requests
+that warmed entries served is what the warmer is worth.
+
+Warmed plans live in the plan cache of the process that made them, so run
+the warmer inside the service (CACHE_WARMER=1) or point every process at
+the same PLAN_CACHE_DB, and keep PLAN_CACHE_TTL longer than the time from
+the window to the peak.
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from utils.plan_cache import get_plan_cache, slot_cache_key
+from utils.query_log import SERVED_BY, read_query_log
+from utils.telemetry import increment
+
+logger = logging.getLogger(__name__)
+
+WARM_SLOTS_FILE = os.getenv("WARM_SLOTS_FILE", os.path.join("data", "warm_slots.json"))
+WARM_TOP_N = int(os.getenv("WARM_TOP_N", "20"))
+WARM_MIN_REQUESTS = int(os.getenv("WARM_MIN_REQUESTS", "2"))
+WARM_LOOKBACK_HOURS = float(os.getenv("WARM_LOOKBACK_HOURS", str(7 * 24)))
+WARM_RATE_PER_MINUTE = float(os.getenv("WARM_RATE_PER_MINUTE", "6"))
+WARM_MAX_PLANS = int(os.getenv("WARM_MAX_PLANS", "50"))
+WARM_MAX_SECONDS = float(os.getenv("WARM_MAX_SECONDS", str(30 * 60)))
+WARM_WINDOW = os.getenv("WARM_WINDOW", "02:00-06:00")  # "" = any time
+WARM_MIN_TTL = float(os.getenv("WARM_MIN_TTL", str(60 * 60)))
+
+
+# -------------------------
+# Targets
+# -------------------------
+def load_warm_slots(path: str = WARM_SLOTS_FILE) -> list:
+    """
+    The configured slot combinations (a JSON list of slot objects); [] without
+    a file. Trip types and budget tiers are mapped to the labels the slot
+    extractor emits, so the warmed keys match what live traffic looks up.
+    """
+    from chains.slot_extractor import BUDGET_LEXICON, TRIP_TYPE_LEXICON, lexicon_label
+
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    slots = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            entry = dict(entry)
+            if entry.get("trip_type"):
+                entry["trip_type"] = lexicon_label(entry["trip_type"], TRIP_TYPE_LEXICON)
+            if entry.get("budget"):
+                entry["budget"] = lexicon_label(entry["budget"], BUDGET_LEXICON)
+            slots.append(entry)
+    return slots
+
+
+def top_slot_combinations(records, top_n: int = WARM_TOP_N,
+                          min_requests: int = WARM_MIN_REQUESTS) -> list:
+    """
+    ``(slots, requests)`` of the ``top_n`` most requested combinations with at
+    least ``min_requests`` requests. Combinations are compared on their cache
+    key; the slots of the latest request stand for each one.
+    """
+    counts, latest = Counter(), {}
+    for record in records:
+        if record.get("served_by") == "guard":
+            continue
+        key = slot_cache_key(record["slots"])
+        counts[key] += 1
+        latest[key] = record["slots"]
+    return [(latest[key], count) for key, count in counts.most_common(top_n)
+            if count >= min_requests]
+
+
+def warm_targets(slots_file: str = WARM_SLOTS_FILE, log_path: str = None,
+                 top_n: int = WARM_TOP_N, lookback_hours: float = WARM_LOOKBACK_HOURS) -> list:
+    """Configured combinations, then the popular ones, each cache key once."""
+    since = time.time() - lookback_hours * 3600
+    popular = top_slot_combinations(read_query_log(log_path, since), top_n)
+    targets, seen = [], set()
+    for slots in load_warm_slots(slots_file) + [slots for slots, _ in popular]:
+        key = slot_cache_key(slots)
+        if key not in seen:
+            seen.add(key)
+            targets.append(slots)
+    return targets
+
+
+# -------------------------
+# Off-peak window
+# -------------------------
+def parse_window(window: str):
+    """``"HH:MM-HH:MM"`` as (start, end) minutes after midnight; None for any time."""
+    if not window:
+        return None
+    start, end = (datetime.datetime.strptime(part.strip(), "%H:%M") for part in window.split("-"))
+    return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+
+def _minute_of_day(now: datetime.datetime) -> float:
+    return now.hour * 60 + now.minute + now.second / 60
+
+
+def in_window(window, now: datetime.datetime = None) -> bool:
+    if window is None:
+        return True
+    start, end = window
+    minute = _minute_of_day(now or datetime.datetime.now())
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end  # wraps past midnight
+
+
+def seconds_until_window(window, now: datetime.datetime = None) -> float:
+    """0 inside the window, otherwise seconds until it next opens."""
+    if window is None or in_window(window, now):
+        return 0.0
+    minute = _minute_of_day(now or datetime.datetime.now())
+    return ((window[0] - minute) % (24 * 60)) * 60
+
+
+# -------------------------
+# Warming
+# -------------------------
+def warm_cache(targets: list, rate_per_minute: float = WARM_RATE_PER_MINUTE,
+               max_plans: int = WARM_MAX_PLANS, max_seconds: float = WARM_MAX_SECONDS,
+               window=None, min_ttl: float = WARM_MIN_TTL, dry_run: bool = False) -> dict:
+    """
+    Plan and store every target that is not fresh in the plan cache, within
+    the rate limit, the spend limits and ``window`` (see ``parse_window``).
+    With ``dry_run`` nothing is planned; the report lists the slots that
+    would have been under ``would_warm``.
+    """
+    from chains.pipeline import plan_trip
+
+    plan_cache = get_plan_cache()
+    counts = {"targets": len(targets), "warmed": 0, "fresh": 0, "blocked": 0,
+              "restricted": 0, "errors": 0}
+    interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+    spent, next_start, stopped_by = 0.0, 0.0, None
+    would_warm = []
+    start = time.perf_counter()
+
+    for slots in targets:
+        if not in_window(window):
+            stopped_by = "window"
+            break
+        remaining = plan_cache.remaining_ttl(slots)
+        if remaining is not None and remaining >= min_ttl:
+            counts["fresh"] += 1
+            continue
+        planned = counts["warmed"] + counts["blocked"] + counts["restricted"] + counts["errors"]
+        if planned >= max_plans:
+            stopped_by = "max_plans"
+            break
+        if spent >= max_seconds:
+            stopped_by = "max_seconds"
+            break
+        if dry_run:
+            would_warm.append(slots)
+            counts["warmed"] += 1
+            continue
+
+        time.sleep(max(0.0, next_start - time.perf_counter()))
+        next_start = time.perf_counter() + interval
+        plan_start = time.perf_counter()
+        try:
+            result = plan_trip(slots, evaluate=False, use_cache=False)
+        except Exception as e:
+            logger.warning("Warming %s failed: %s", slots, e)
+            outcome = "errors"
+        else:
+            if result["blocked"]:
+                outcome = "blocked"
+            elif result.get("guardrail"):
+                outcome = "restricted"  # the output guard stopped it: nothing worth serving
+            else:
+                plan_cache.set(slots, {"formatted_response": result["response"],
+                                       "warmed_at": time.time()})
+                outcome = "warmed"
+        spent += time.perf_counter() - plan_start
+        counts[outcome] += 1
+        increment("voyage_cache_warmer_plans_total", outcome=outcome)
+
+    report = {**counts, "stopped_by": stopped_by, "spent_s": round(spent, 2),
+              "elapsed_s": round(time.perf_counter() - start, 2)}
+    if dry_run:
+        report["would_warm"] = would_warm
+    return report
+
+
+def traffic_report(records) -> dict:
+    """How live requests were served, and the share the warmed entries took."""
+    served = Counter(record.get("served_by") for record in records)
+    requests = sum(served.values())
+    hits = served["cache"] + served["warmed"]
+    return {
+        "requests": requests,
+        "served_by": {name: served[name] for name in SERVED_BY},
+        "cache_hit_rate": round(hits / requests, 4) if requests else 0.0,
+        "warmed_share": round(served["warmed"] / requests, 4) if requests else 0.0,
+    }
+
+
+# -------------------------
+# Schedule
+# -------------------------
+def run_scheduled(window=None, stop: threading.Event = None, targets=warm_targets,
+                  **warm_options):
+    """
+    Warm once per opening of ``window`` (every WARM_MIN_TTL seconds when it is
+    None) until ``stop`` is set, calling ``targets()`` afresh each time.
+    """
+    stop = stop or threading.Event()
+    while not stop.wait(seconds_until_window(window)):
+        report = warm_cache(targets(), window=window, **warm_options)
+        logger.info("Cache warmer: %s", report)
+        if window is None:
+            stop.wait(WARM_MIN_TTL)
+        else:
+            while in_window(window) and not stop.wait(60):
+                pass  # once per window
+
+
+def start_background_warmer(window: str = WARM_WINDOW) -> threading.Event:
+    """``run_scheduled`` on a daemon thread; set the returned event to stop it."""
+    stop = threading.Event()
+    threading.Thread(target=run_scheduled, args=(parse_window(window), stop),
+                     name="cache-warmer", daemon=True).start()
+    return stop
@@ -0,0 +1,135 @@
+# utils/chat_history.py
+"""
+Bounded chat history for the Streamlit app.
+
+The most recent CHAT_HISTORY_CAP messages stay in memory. Older ones are
+appended to one JSON-lines file per session under CHAT_HISTORY_DIR and read
+back a page at a time (byte offsets of every line are kept, so a page is one
+seek). Each message's bubble HTML is rendered once, when it is added, and
+the app shows one page of bubbles per rerun, so a rerun costs the same at
+message 10 as at message 10,000.
+"""
+import html
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from utils.sessions import SESSION_TTL
+
+CHAT_HISTORY_CAP = int(os.getenv("CHAT_HISTORY_CAP", "50"))
+CHAT_HISTORY_DIR = os.getenv("CHAT_HISTORY_DIR", os.path.join("data", "chat_history"))
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "20"))
+
+BUBBLE_STYLES = {
+    "user": ("right", "#cce5ff", "10px", "You:"),
+    "assistant": ("left", "#f1f0f0", "20px", "Travel Assistant 🤖:"),
+    "warning": ("left", "#ffcccc", "20px", "⚠️ Travel Assistant Warning:"),
+}
+
+
+def bubble_html(text: str, kind: str) -> str:
+    """One chat bubble (``kind`` is user / assistant / warning) as inline HTML."""
+    align, background, margin, label = BUBBLE_STYLES[kind]
+    if kind == "user":
+        text = html.escape(text)  # what the user typed is shown, never interpreted
+    return (f"<div style='text-align: {align}; margin-bottom: {margin};'>"
+            f"<div style='display: inline-block; background-color: {background}; "
+            f"color: black; padding: 10px 15px; border-radius: 15px; max-width: 75%;'>"
+            f"<b>{label}</b><br>{text}</div></div>")
+
+
+def message_html(user_input=None, agent_response=None, is_warning=False) -> str:
+    parts = []
+    if user_input:
+        parts.append(bubble_html(user_input, "user"))
+    if agent_response:
+        parts.append(bubble_html(agent_response, "warning" if is_warning else "assistant"))
+    return "\n".join(parts)
+
+
+class ChatHistory:
+    """
+    Append-only history of ``(user_input, agent_response, is_warning)``
+    messages, with the rendered HTML kept alongside each one.
+    """
+
+    def __init__(self, session_id: str, cap: int = CHAT_HISTORY_CAP,
+                 directory: str = CHAT_HISTORY_DIR):
+        self.session_id = session_id
+        self.cap = cap
+        self.path = os.path.join(directory, f"{session_id}.jsonl")
+        self._recent = deque()  # (index, message, html)
+        self._offsets = []      # byte offset of each spilled message
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def spilled(self) -> int:
+        """Messages that only live on disk."""
+        return len(self._offsets)
+
+    def append(self, user_input=None, agent_response=None, is_warning=False):
+        message = (user_input, agent_response, bool(is_warning))
+        with self._lock:
+            self._recent.append((self._count, message, message_html(*message)))
+            self._count += 1
+            while len(self._recent) > self.cap:
+                self._spill(self._recent.popleft())
+
+    def _spill(self, entry):
+        index, message, rendered = entry
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            self._offsets.append(f.tell())
+            f.write(json.dumps({"index": index, "message": message, "html": rendered},
+                               ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def page(self, start: int, stop: int) -> list:
+        """``(index, message, html)`` for messages ``start`` up to ``stop``, oldest first."""
+        start, stop = max(0, start), min(stop, self._count)
+        with self._lock:
+            first_recent = self._count - len(self._recent)
+            entries = []
+            if start < first_recent:
+                entries.extend(self._read_spilled(start, min(stop, first_recent)))
+            entries.extend(entry for entry in self._recent if start <= entry[0] < stop)
+        return entries
+
+    def _read_spilled(self, start: int, stop: int) -> list:
+        entries = []
+        with open(self.path, "rb") as f:
+            f.seek(self._offsets[start])
+            for _ in range(start, stop):
+                record = json.loads(f.readline())
+                entries.append((record["index"], tuple(record["message"]), record["html"]))
+        return entries
+
+    def latest(self, pages: int = 1, page_size: int = CHAT_PAGE_SIZE) -> list:
+        """The last ``pages`` pages of messages."""
+        return self.page(self._count - pages * page_size, self._count)
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._offsets.clear()
+            self._count = 0
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def prune_spill_files(directory: str = CHAT_HISTORY_DIR, ttl_seconds: float = SESSION_TTL) -> int:
+    """Delete spill files of sessions idle for longer than ``ttl_seconds``."""
+    if not os.path.isdir(directory):
+        return 0
+    removed, cutoff = 0, time.time() - ttl_seconds
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith(".jsonl") and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+    return removed
@@ -0,0 +1,189 @@
+# utils/context_compression.py
+"""
+Context assembly between retrieval and the RAG "stuff" prompt.
+
+The retriever hands back k chunks of 512 characters that overlap by 50 and
+often repeat each other. ``compress_context`` turns them into a smaller
+context:
+
+1. trims the text a chunk shares with a neighbouring chunk (splitter overlap),
+2. drops chunks that are near-duplicates of a better-ranked one (cosine
+   similarity of their embeddings, word overlap if the embedder fails),
+3. splits what is left into sentences and keeps the ones most relevant to
+   the slots (destination and its region, trip type and budget words),
+4. stops at CONTEXT_TOKEN_BUDGET tokens, counted like the telemetry counts
+   prompt tokens (tiktoken cl100k_base).
+
+Kept sentences stay in their original order and chunk, so the prompt reads
+the same way, only shorter.
+"""
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.telemetry import count_tokens, span
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "400"))
+CONTEXT_MIN_TOKENS = 120
+NEAR_DUPLICATE_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_SIMILARITY", "0.92"))
+# Word-overlap threshold used when no embeddings are available
+NEAR_DUPLICATE_JACCARD = 0.8
+MIN_OVERLAP_CHARS = 12
+MAX_OVERLAP_CHARS = 200  # comfortably above the splitter's chunk_overlap
+PLACE_WEIGHT = 2  # a sentence naming the destination beats one matching a theme word
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n\s*\n|\n(?=\s*[-•*▪]\s)")
+WORD = re.compile(r"[a-z0-9₹]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "the", "to", "trip", "with", "general",
+}
+
+Sentence = namedtuple("Sentence", ["score", "rank", "position", "text", "tokens"])
+
+
+def _words(text: str) -> list:
+    return WORD.findall(text.lower())
+
+
+# -------------------------
+# Overlap and near-duplicates
+# -------------------------
+def shared_edge(left: str, right: str) -> int:
+    """Length of the longest end of ``left`` that ``right`` starts with (splitter overlap)."""
+    limit = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _trim_overlaps(documents) -> list:
+    kept = []
+    for doc in documents:
+        text = doc.page_content
+        for other in kept:
+            if other.metadata.get("source") != doc.metadata.get("source"):
+                continue
+            text = text[shared_edge(other.page_content, text):]  # other chunk came first
+            cut = shared_edge(text, other.page_content)          # this chunk came first
+            if cut:
+                text = text[:-cut]
+        if text.strip():
+            kept.append(Document(page_content=text.strip(), metadata=doc.metadata))
+    return kept
+
+
+def _similarities(texts):
+    """(pairwise similarity matrix, threshold): embedding cosine, or word Jaccard as fallback."""
+    try:
+        from utils.model_registry import get_embedder
+        vectors = np.asarray(get_embedder().embed_documents(list(texts)), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors @ vectors.T, NEAR_DUPLICATE_SIMILARITY
+    except Exception:
+        sets = [set(_words(text)) for text in texts]
+        matrix = np.array([[len(a & b) / max(len(a | b), 1) for b in sets] for a in sets])
+        return matrix, NEAR_DUPLICATE_JACCARD
+
+
+def drop_near_duplicates(documents) -> list:
+    """Keep a chunk only if it is not a near-duplicate of a better-ranked kept one."""
+    if len(documents) < 2:
+        return list(documents)
+    similarity, threshold = _similarities([doc.page_content for doc in documents])
+    kept = []
+    for i in range(len(documents)):
+        if all(similarity[i, j] < threshold for j in kept):
+            kept.append(i)
+    return [documents[i] for i in kept]
+
+
+# -------------------------
+# Sentence selection
+# -------------------------
+def relevance_terms(slots: dict):
+    """(theme words, place words) a relevant sentence is expected to contain."""
+    from chains.slot_extractor import (
+        BUDGET_LEXICON, TRIP_TYPE_LEXICON, find_destinations, regions_of,
+    )
+    trip_type = str(slots.get("trip_type") or "").lower()
+    budget = str(slots.get("budget") or "").lower()
+    themes = set(_words(f"{trip_type} {budget}"))
+    themes |= set(_words(" ".join(TRIP_TYPE_LEXICON.get(trip_type, []))))
+    themes |= set(_words(" ".join(BUDGET_LEXICON.get(budget, []))))
+    destinations = find_destinations(str(slots.get("destination") or ""))
+    places = set(_words(" ".join(destinations + regions_of(destinations))))
+    if not places:
+        places = set(_words(str(slots.get("destination") or "")))
+    return themes - STOPWORDS, places - STOPWORDS
+
+
+def split_sentences(text: str) -> list:
+    return [s.strip() for s in SENTENCE_SPLIT.split(text) if s and s.strip()]
+
+
+def _fit(text: str, tokens: int, budget: int) -> str:
+    """Cut ``text`` down to roughly ``budget`` tokens, at a word boundary."""
+    cut = text[:max(1, len(text) * budget // max(tokens, 1))]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+def select_sentences(documents, slots: dict, token_budget: int) -> list:
+    themes, places = relevance_terms(slots)
+    candidates, seen = [], set()
+    for rank, doc in enumerate(documents):
+        for position, sentence in enumerate(split_sentences(doc.page_content)):
+            words = _words(sentence)
+            key = " ".join(words)
+            if not key or key in seen:  # the same sentence in two chunks
+                continue
+            seen.add(key)
+            unique = set(words)
+            score = len(unique & themes) + PLACE_WEIGHT * len(unique & places)
+            candidates.append(Sentence(score, rank, position, sentence, count_tokens(sentence)))
+
+    # Unmatched sentences only pad a context that would otherwise be too thin
+    relevant = [c for c in candidates if c.score > 0]
+    if sum(c.tokens for c in relevant) < min(CONTEXT_MIN_TOKENS, token_budget):
+        relevant = candidates
+    chosen, used = [], 0
+    for candidate in sorted(relevant, key=lambda c: (-c.score, c.rank, c.position)):
+        if used + candidate.tokens <= token_budget:
+            chosen.append(candidate)
+            used += candidate.tokens
+        elif not chosen:  # a single sentence larger than the budget
+            chosen.append(candidate._replace(text=_fit(candidate.text, candidate.tokens,
+                                                       token_budget),
+                                             tokens=token_budget))
+            used = token_budget
+    return chosen
+
+
+def compress_context(documents, slots: dict, token_budget: int = CONTEXT_TOKEN_BUDGET) -> list:
+    """
+    The retrieved ``documents`` reduced to at most ``token_budget`` tokens of
+    the sentences most relevant to ``slots``, one Document per surviving chunk
+    (metadata kept, retrieval order kept).
+    """
+    documents = list(documents)
+    if not documents or token_budget <= 0:
+        return documents
+    with span("context", documents=len(documents)) as context_span:
+        tokens_in = sum(count_tokens(doc.page_content) for doc in documents)
+        unique = drop_near_duplicates(_trim_overlaps(documents))
+        chosen = select_sentences(unique, slots, token_budget)
+
+        compressed = []
+        for rank, doc in enumerate(unique):
+            sentences = sorted((c for c in chosen if c.rank == rank), key=lambda c: c.position)
+            if sentences:
+                compressed.append(Document(page_content=" ".join(c.text for c in sentences),
+                                           metadata=doc.metadata))
+        context_span.set("kept_documents", len(compressed))
+        context_span.set("context_tokens_in", tokens_in)
+        context_span.set("context_tokens_out", sum(c.tokens for c in chosen))
+    return compressed
@@ -0,0 +1,186 @@
+# utils/embedding_cache.py
+"""
+Persistent embedding cache in front of the sentence-transformers embedder.
+
+Vectors are keyed by (model name, query/document, text hash) and kept in a
+bounded in-memory LRU backed by an append-only float32 file that is
+memory-mapped for reads. Cache misses of one ``embed_documents`` call are
+de-duplicated and sent to the model in batches, so repeated (templated)
+queries never reach the model.
+
+The disk store assumes one writing process per cache directory.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.telemetry import record_cache
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join("data", ".embedding_cache"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+# Misses handed to the model per call (and persisted per call, so an interrupted
+# ingestion keeps what it embedded); the engine sub-batches them by length
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "1024"))
+
+
+class DiskVectorStore:
+    """Append-only ``vectors.f32`` + ``keys.jsonl`` pair, read through np.memmap."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.keys_path = os.path.join(directory, "keys.jsonl")
+        self.rows = {}
+        self.dim = None
+        self._mapped = None
+        self._mapped_rows = 0
+
+        records, good_bytes = [], 0
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "rb") as f:
+                for raw in f:
+                    try:
+                        record = json.loads(raw)
+                    except ValueError:
+                        break
+                    if not raw.endswith(b"\n"):
+                        break
+                    records.append(record)
+                    good_bytes += len(raw)
+        # Vectors are appended before their keys, so a crash between (or during)
+        # the two appends leaves vector rows no key points at, a torn row, or
+        # (torn key line) a partial record. Keep only rows that are both on disk
+        # and recorded in keys.jsonl, and cut both files back to exactly those.
+        self.dim = records[0]["dim"] if records else None
+        complete_rows = 0
+        if self.dim and os.path.exists(self.vectors_path):
+            complete_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+        kept = [record for record in records if record["row"] < complete_rows]
+        self.rows = {record["key"]: record["row"] for record in kept}
+        self.next_row = max((record["row"] + 1 for record in kept), default=0)
+        if len(kept) < len(records):
+            with open(self.keys_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in kept)
+        elif os.path.exists(self.keys_path) and good_bytes != os.path.getsize(self.keys_path):
+            with open(self.keys_path, "r+b") as f:
+                f.truncate(good_bytes)
+        if os.path.exists(self.vectors_path):
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(self.next_row * 4 * (self.dim or 0))
+        if not self.rows:
+            self.dim = None
+
+    def get(self, key):
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        if row >= self._mapped_rows:
+            self._mapped_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+            self._mapped = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                     shape=(self._mapped_rows, self.dim))
+        return np.array(self._mapped[row])
+
+    def put_many(self, items):
+        """Append ``[(key, vector), ...]``; keys already on disk are skipped."""
+        items = [(key, np.asarray(vector, dtype=np.float32)) for key, vector in items
+                 if key not in self.rows]
+        if not items:
+            return
+        self.dim = self.dim or len(items[0][1])
+        with open(self.vectors_path, "ab") as vectors_file:
+            for _, vector in items:
+                vectors_file.write(vector.tobytes())
+        with open(self.keys_path, "a", encoding="utf-8") as keys_file:
+            for offset, (key, _) in enumerate(items):
+                row = self.next_row + offset
+                keys_file.write(json.dumps({"key": key, "row": row, "dim": self.dim}) + "\n")
+                self.rows[key] = row
+        self.next_row += len(items)
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, inner: Embeddings, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR,
+                 max_entries: int = EMBEDDING_CACHE_SIZE, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.inner = inner
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "model_calls": 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if cache_dir:
+            safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+            self._disk = DiskVectorStore(os.path.join(cache_dir, safe_name))
+
+    def _key(self, kind: str, text: str) -> str:
+        payload = f"{self.model_name}\0{kind}\0{text}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _lookup(self, key):
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return vector
+        if self._disk is not None:
+            vector = self._disk.get(key)
+            if vector is not None:
+                self._remember(key, vector)
+                self.stats["disk_hits"] += 1
+                return vector
+        return None
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _embed(self, kind: str, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        results = {}
+        with self._lock:
+            for key in keys:
+                if key not in results:
+                    vector = self._lookup(key)
+                    if vector is not None:
+                        results[key] = vector
+
+            missing = list({key: text for key, text in zip(keys, texts) if key not in results}.items())
+            self.stats["misses"] += len(missing)
+        record_cache("embedding", hits=len(results), misses=len(missing))
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            batch_texts = [text for _, text in batch]
+            if kind == "query":
+                vectors = [self.inner.embed_query(text) for text in batch_texts]
+            else:
+                vectors = self.inner.embed_documents(batch_texts)
+
+            computed = [(key, np.asarray(vector, dtype=np.float32))
+                        for (key, _), vector in zip(batch, vectors)]
+            with self._lock:
+                self.stats["model_calls"] += 1
+                for key, vector in computed:
+                    self._remember(key, vector)
+                    results[key] = vector
+                if self._disk is not None:
+                    self._disk.put_many(computed)
+
+        return [results[key].tolist() for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed("document", texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text])[0]
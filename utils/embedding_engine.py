@@ -0,0 +1,132 @@
+# utils/embedding_engine.py
+"""
+Bulk embedding engine behind the registry's embedder.
+
+sentence-transformers is called directly rather than through LangChain's
+HuggingFaceEmbeddings so ingestion can control how it is fed:
+
+- texts are sorted by length and cut into batches of EMBED_BATCH_SIZE, so a
+  batch pads to its own longest text instead of the corpus' longest,
+- batches are spread over EMBED_WORKERS processes (each with its own copy of
+  the model and EMBED_THREADS torch threads) once a call is large enough,
+- vectors come back in the caller's order as float32; compact storage
+  (float16 / int8 + scales) is up to the vector index (LOCAL_INDEX_DTYPE).
+
+Queries and small calls run in-process on the shared model. Every call of at
+least EMBED_REPORT_MIN texts reports chunks/sec.
+"""
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+# torch threads per worker (0 = leave torch's default)
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+EMBED_DEVICE = os.getenv("EMBED_DEVICE") or None  # e.g. "cpu", "cuda"; None lets torch pick
+EMBED_REPORT_MIN = 256
+
+_worker_model = None
+
+
+def length_sorted_batches(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> list:
+    """Row indices of ``texts`` grouped into batches of similar length, longest first."""
+    order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def _load_model(model_name: str, threads: int, device: str = None):
+    import torch
+    from sentence_transformers import SentenceTransformer
+    if threads > 0:
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model_name, device=device)
+
+
+def _encode(model, texts: List[str]) -> np.ndarray:
+    return np.asarray(model.encode(texts, batch_size=len(texts), convert_to_numpy=True,
+                                   show_progress_bar=False), dtype=np.float32)
+
+
+def _init_worker(model_name: str, threads: int, device: str):
+    global _worker_model
+    _worker_model = _load_model(model_name, threads, device)
+
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    return _encode(_worker_model, texts)
+
+
+class EmbeddingEngine(Embeddings):
+    def __init__(self, model_name: str, batch_size: int = EMBED_BATCH_SIZE,
+                 workers: int = EMBED_WORKERS, threads: int = EMBED_THREADS,
+                 device: str = EMBED_DEVICE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = workers
+        self.threads = threads
+        self.device = device
+        self._model = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = _load_model(self.model_name, self.threads, self.device)
+        return self._model
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Started on the first large call and reused, so each worker loads the model once
+        with self._lock:
+            if self._pool is None:
+                threads = self.threads or max(1, (os.cpu_count() or 1) // self.workers)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker,
+                    initargs=(self.model_name, threads, self.device))
+                atexit.register(self.close)
+        return self._pool
+
+    def close(self):
+        """Stop the worker processes (a later large call starts them again)."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """``len(texts) x dim`` float32 matrix, rows in the order of ``texts``."""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        start = time.perf_counter()
+        batches = length_sorted_batches(texts, self.batch_size)
+        batch_texts = [[texts[i] for i in batch] for batch in batches]
+        if self.workers > 1 and len(batches) > 1:
+            results = list(self._get_pool().map(_encode_in_worker, batch_texts))
+        else:
+            results = [_encode(self.model, chunk) for chunk in batch_texts]
+
+        vectors = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for batch, result in zip(batches, results):
+            vectors[batch] = result
+        if len(texts) >= EMBED_REPORT_MIN:
+            elapsed = time.perf_counter() - start
+            print(f"🧮 Embedded {len(texts)} chunks in {elapsed:.1f}s "
+                  f"({len(texts) / max(elapsed, 1e-9):.1f} chunks/sec, "
+                  f"{max(self.workers, 1)} workers, batch {self.batch_size})")
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return _encode(self.model, [text])[0].tolist()
@@ -1,10 +1,23 @@
+import hashlib
 import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
 
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
-from langchain_ollama import ChatOllama
+from utils.model_registry import JUDGE_MODEL, get_chat_ollama
+from utils.telemetry import traced, record_cache
+from utils.llm_json import parse_llm_json, reask_fields
 
-judge_llm = ChatOllama(model="llama3.2", temperature=0)
+logger = logging.getLogger(__name__)
+
+CRITERIA = ("relevance", "completeness", "correctness", "clarity", "safety")
+# Judge verdicts by hash of (judge model, judge prompt, response); empty to disable
+VERDICT_CACHE_DB = os.getenv("VERDICT_CACHE_DB", os.path.join("data", "verdict_cache.sqlite"))
 
 evaluation_prompt = PromptTemplate(
     input_variables=["response"],
@@ -32,9 +45,99 @@ Return output ONLY in JSON:
 """
 )
 
-evaluation_chain = LLMChain(llm=judge_llm, prompt=evaluation_prompt)
+@lru_cache(maxsize=None)
+def get_evaluation_chain():
+    # Local llama3.2 judge via Ollama, shared through the registry
+    return LLMChain(llm=get_chat_ollama(JUDGE_MODEL, temperature=0), prompt=evaluation_prompt)
+
+
+# -------------------------
+# Verdict cache
+# -------------------------
+def verdict_key(response, model: str = JUDGE_MODEL) -> str:
+    """Changes when the response, the judge prompt or the judge model does."""
+    payload = f"{model}\0{evaluation_prompt.template}\0{response}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class VerdictCache:
+    """SQLite table of complete judge verdicts; a verdict never expires."""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts "
+            "(key TEXT PRIMARY KEY, verdict TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, verdict: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(verdict, ensure_ascii=False), time.time()),
+            )
+            self._db.commit()
+
+
+@lru_cache(maxsize=None)
+def get_verdict_cache():
+    return VerdictCache(VERDICT_CACHE_DB) if VERDICT_CACHE_DB else None
+
+
+def _score(value):
+    """A 1-5 score from 4, "4", "4/5" or 4.0; None otherwise."""
+    try:
+        score = round(float(str(value).split("/")[0].strip()))
+    except (TypeError, ValueError):
+        return None
+    return score if 1 <= score <= 5 else None
+
+def _evaluation_problems(scores):
+    if not isinstance(scores, dict):
+        return list(CRITERIA) + ["overall_feedback"]
+    problems = [name for name in CRITERIA if _score(scores.get(name)) is None]
+    if not isinstance(scores.get("overall_feedback"), str):
+        problems.append("overall_feedback")
+    return problems
+
+@traced("evaluation")
+def evaluate_response(response, use_cache: bool = True):
+    """
+    Judge scores for ``response``. Scores are normalised to ints; criteria
+    the judge left out are asked for once more and are None if still missing.
+    Complete verdicts are cached, so the same response is only judged once.
+    """
+    cache = get_verdict_cache() if use_cache else None
+    if cache is not None:
+        key = verdict_key(response)
+        verdict = cache.get(key)
+        record_cache("verdict", hits=verdict is not None, misses=verdict is None)
+        if verdict is not None:
+            return verdict
+
+    result = get_evaluation_chain().invoke({"response": response})
+    parsed = parse_llm_json(result["text"], "evaluation", _evaluation_problems)
+    evaluation_scores = dict(parsed.value) if isinstance(parsed.value, dict) else {}
+    if parsed.problems:
+        evaluation_scores.update(reask_fields(
+            get_evaluation_chain().llm, "evaluation",
+            "Score the travel plan below 1-5 per criterion, with short overall_feedback.\n"
+            + str(response)[:2000], result["text"], parsed.problems))
+        missing = _evaluation_problems(evaluation_scores)
+        if missing:
+            logger.warning("Evaluation still missing %s after re-ask", missing)
 
-def evaluate_response(response):
-    result = evaluation_chain.invoke({"response": response})
-    evaluation_scores = json.loads(result["text"])
+    for name in CRITERIA:
+        evaluation_scores[name] = _score(evaluation_scores.get(name))
+    evaluation_scores.setdefault("overall_feedback", "")
+    if cache is not None and all(evaluation_scores[name] is not None for name in CRITERIA):
+        cache.set(key, evaluation_scores)
     return evaluation_scores
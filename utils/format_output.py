@@ -1,18 +1,46 @@
 import re
+from utils.llm_json import IncrementalJSONParser
+from utils.telemetry import traced
 
 def clean_text(text: str) -> str:
     """Collapse weird newlines/spaces into one space."""
     return re.sub(r"\s+", " ", text).strip()
 
-def format_response(response: dict) -> str:
+def itinerary_days(members: dict) -> dict:
+    """The ``day_N`` entries among the parsed members of an itinerary object."""
+    return {key: value for key, value in members.items()
+            if key.startswith("day_") and isinstance(value, dict)}
+
+def parse_partial_itinerary(text: str) -> dict:
+    """
+    Pull every fully generated ``"day_N": {...}`` block out of a (possibly
+    truncated) itinerary JSON string, so a streaming response can be shown
+    day by day before the closing brace arrives.
+    """
+    return itinerary_days(IncrementalJSONParser(text).completed)
+
+@traced("format")
+def format_response(response: dict, partial: bool = False) -> str:
     """
     Nicely format itinerary + explanation into Markdown.
+
+    With ``partial=True`` the itinerary may be the raw, still-streaming JSON
+    text: completed days are rendered and a placeholder marks the one in progress
+    (or pass the completed days plus ``"day_in_progress"`` when the caller
+    already parses the stream incrementally).
     """
 
     formatted = "## 🧳 Your Personalized Travel Plan\n"
 
     # ---------- ITINERARY ----------
     itinerary = response.get("itinerary")
+    day_in_progress = None
+    if partial and isinstance(itinerary, str):
+        itinerary = parse_partial_itinerary(itinerary)
+        day_in_progress = len(itinerary) + 1
+    elif partial:
+        day_in_progress = response.get("day_in_progress")
+
     if isinstance(itinerary, dict):
         for i, (day, details) in enumerate(itinerary.items(), start=1):
             formatted += f"\n### Day {i}\n"
@@ -46,6 +74,9 @@ def format_response(response: dict) -> str:
     else:
         formatted += f"\n{str(itinerary)}\n"
 
+    if day_in_progress:
+        formatted += f"\n⏳ *Planning day {day_in_progress}...*\n"
+
     # ---------- EXPLANATION ----------
     explanation = response.get("explanation")
     if explanation:
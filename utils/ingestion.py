@@ -0,0 +1,320 @@
+# utils/ingestion.py
+"""
+Idempotent, incremental ingestion of the travel corpus.
+
+Every chunk gets a deterministic ID hashed from (source, page, chunk text,
+splitter params). A local manifest remembers which chunk IDs each source
+produced and the hash of the file they came from, so a re-run only parses
+changed files, only embeds chunks the index has never seen, and deletes
+the chunks that disappeared. Re-ingesting an unchanged corpus does no parsing,
+embedding or upserting at all.
+
+Chunks are tagged with the destinations they mention (via the slot
+extractor's gazetteer, falling back to their section heading and then their
+page), those destinations' regions, and the section heading they fall under,
+so retrieval can pre-filter on the trip's destination. When the tagging
+changes (METADATA_VERSION), existing chunks get their metadata rewritten
+in place without being embedded again.
+
+Pages come from utils.pdf_pages, which parses each PDF once (page ranges
+in parallel) and caches the page texts by file hash, so changing the
+splitter params or the tagging re-splits cached pages instead of re-parsing.
+"""
+import bisect
+import hashlib
+import json
+import os
+import re
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from utils.model_registry import get_embedder, get_pinecone_index
+from utils.pdf_pages import load_pages
+from utils.load_vectorstore import (
+    VECTOR_BACKEND, LOCAL_INDEX_DIR, LOCAL_INDEX_DTYPE, LOCAL_INDEX_ANN,
+    MAX_PINECONE_PAYLOAD, BATCH_SIZE,
+)
+
+SPLITTER_PARAMS = {"chunk_size": 512, "chunk_overlap": 50}
+MANIFEST_DIR = os.getenv("INGEST_MANIFEST_DIR", "data")
+SOURCE_EXTENSIONS = (".pdf",)
+# Pinecone metadata values must be strings, numbers, booleans or lists of strings
+PINECONE_METADATA_TYPES = (str, int, float, bool)
+# Bump when chunk tagging changes so the next run re-tags the existing chunks
+METADATA_VERSION = 1
+
+HEADING_MAX_CHARS = 80
+HEADING_MAX_WORDS = 10
+HEADING_MINOR_WORDS = {"a", "an", "and", "at", "for", "in", "of", "on", "or", "the", "to", "with"}
+WORD_PATTERN = re.compile(r"[A-Za-z][\w'’-]*")
+
+
+# -------------------------
+# Hashing
+# -------------------------
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, page, text: str, splitter_params: dict = SPLITTER_PARAMS) -> str:
+    """Deterministic chunk ID: same source/page/text/params always give the same ID."""
+    payload = json.dumps([source, page, text, splitter_params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+# -------------------------
+# Sources and chunks
+# -------------------------
+def discover_sources(path: str) -> list:
+    """A single file, or every supported document under a directory."""
+    if os.path.isfile(path):
+        return [path]
+    sources = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.lower().endswith(SOURCE_EXTENSIONS):
+                sources.append(os.path.join(root, name))
+    return sorted(sources)
+
+
+def _is_heading(line: str) -> bool:
+    """Short, unpunctuated line in Title Case or CAPITALS, e.g. "Things To Do In Goa"."""
+    line = line.strip().lstrip("#").strip()
+    if not line or len(line) > HEADING_MAX_CHARS or line[-1] in ".,;:!?" or not line[0].isupper():
+        return False
+    words = WORD_PATTERN.findall(line)
+    if not words or len(words) > HEADING_MAX_WORDS:
+        return False
+    return line.isupper() or all(w[0].isupper() or w.lower() in HEADING_MINOR_WORDS for w in words)
+
+
+def section_headings(text: str) -> list:
+    """``(offset, heading)`` of every heading-like line of a page, in order."""
+    headings, offset = [], 0
+    for line in text.splitlines(keepends=True):
+        if _is_heading(line):
+            headings.append((offset, line.strip().lstrip("#").strip()))
+        offset += len(line)
+    return headings
+
+
+def chunk_tags(text: str, start: int, headings: list, page_destinations: list) -> dict:
+    """Section, destinations and regions of one chunk starting at ``start`` in its page."""
+    from chains.slot_extractor import find_destinations, regions_of
+
+    position = bisect.bisect_right([offset for offset, _ in headings], max(start, 0))
+    section = headings[position - 1][1] if position else ""
+    destinations = find_destinations(text) or find_destinations(section) or page_destinations[:1]
+    return {"section": section, "destination": destinations[0] if destinations else "",
+            "destinations": destinations, "regions": regions_of(destinations)}
+
+
+def load_source_chunks(source: str, splitter_params: dict = SPLITTER_PARAMS,
+                       file_hash: str = None) -> list:
+    """Load one document's pages (page cache), split them and stamp chunk IDs and tags into metadata."""
+    from chains.slot_extractor import find_destinations
+
+    pages = load_pages(source, file_hash)
+    page_context = {}
+    for page_doc in pages:
+        page = page_doc.metadata.get("page_number", page_doc.metadata.get("page"))
+        page_context[page] = (section_headings(page_doc.page_content),
+                              find_destinations(page_doc.page_content))
+
+    # start_index is not part of splitter_params, so chunk IDs are unaffected
+    splitter = RecursiveCharacterTextSplitter(**splitter_params, add_start_index=True)
+    chunks = []
+    for doc in splitter.split_documents(pages):
+        if len(doc.page_content.encode("utf-8")) >= MAX_PINECONE_PAYLOAD:
+            continue
+        page = doc.metadata.get("page_number", doc.metadata.get("page"))
+        headings, page_destinations = page_context.get(page, ([], []))
+        doc.metadata = {
+            "source": source,
+            "page": page,
+            "chunk_id": chunk_id(source, page, doc.page_content, splitter_params),
+            **chunk_tags(doc.page_content, doc.metadata.get("start_index", 0),
+                         headings, page_destinations),
+        }
+        chunks.append(doc)
+    print(f"📄 {source}: {len(pages)} pages → {len(chunks)} chunks")
+    return chunks
+
+
+# -------------------------
+# Manifest
+# -------------------------
+def manifest_path_for(backend: str) -> str:
+    """One manifest per backend, since each holds its own copy of the vectors."""
+    return os.path.join(MANIFEST_DIR, f".ingest_manifest.{backend}.json")
+
+
+def load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"splitter": None, "sources": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)  # never leave a half-written manifest behind
+
+
+# -------------------------
+# Vector store writers
+# -------------------------
+def _pinecone_metadata(doc) -> dict:
+    metadata = {k: v for k, v in doc.metadata.items()
+                if isinstance(v, PINECONE_METADATA_TYPES)
+                or (isinstance(v, list) and v and all(isinstance(item, str) for item in v))}
+    metadata["text"] = doc.page_content  # text_key LangchainPinecone reads back
+    return metadata
+
+
+def _write_pinecone(docs, vectors, delete_ids):
+    index = get_pinecone_index()
+    for i in range(0, len(docs), BATCH_SIZE):
+        batch = [
+            {"id": doc.metadata["chunk_id"], "values": list(vector), "metadata": _pinecone_metadata(doc)}
+            for doc, vector in zip(docs[i:i + BATCH_SIZE], vectors[i:i + BATCH_SIZE])
+        ]
+        index.upsert(vectors=batch)
+        print(f"🚀 Upserted batch {i // BATCH_SIZE + 1} with {len(batch)} chunks")
+    delete_ids = list(delete_ids)
+    for i in range(0, len(delete_ids), 1000):
+        index.delete(ids=delete_ids[i:i + 1000])
+
+
+def _write_local(docs, vectors, delete_ids):
+    from utils.local_vectorstore import LocalVectorIndex
+    LocalVectorIndex.update(
+        LOCAL_INDEX_DIR,
+        ids=[doc.metadata["chunk_id"] for doc in docs],
+        vectors=vectors,
+        texts=[doc.page_content for doc in docs],
+        metadatas=[doc.metadata for doc in docs],
+        delete_ids=delete_ids,
+        dtype=LOCAL_INDEX_DTYPE,
+        ann=LOCAL_INDEX_ANN,
+    )
+
+
+def _retag_pinecone(docs):
+    index = get_pinecone_index()
+    for doc in docs:
+        index.update(id=doc.metadata["chunk_id"], set_metadata=_pinecone_metadata(doc))
+    print(f"🏷️ Re-tagged {len(docs)} chunks")
+
+
+def _retag_local(docs):
+    from utils.local_vectorstore import LocalVectorIndex
+    LocalVectorIndex.set_metadata(LOCAL_INDEX_DIR, {doc.metadata["chunk_id"]: doc.metadata
+                                                    for doc in docs})
+
+
+def _clear_pinecone():
+    get_pinecone_index().delete(delete_all=True)
+
+
+def _clear_local():
+    import shutil
+    shutil.rmtree(LOCAL_INDEX_DIR, ignore_errors=True)
+
+
+WRITERS = {"pinecone": _write_pinecone, "local": _write_local}
+RETAGGERS = {"pinecone": _retag_pinecone, "local": _retag_local}
+CLEARERS = {"pinecone": _clear_pinecone, "local": _clear_local}
+
+
+# -------------------------
+# Ingestion
+# -------------------------
+def ingest(path: str = "data", backend: str = VECTOR_BACKEND, manifest_path: str = None,
+           splitter_params: dict = SPLITTER_PARAMS, rebuild: bool = False) -> dict:
+    """
+    Bring ``backend`` in line with the documents under ``path``.
+
+    ``rebuild=True`` empties the backend first, e.g. to get rid of vectors
+    uploaded with random IDs before this module existed.
+    Returns counts of new, deleted, re-tagged and unchanged chunks.
+    """
+    manifest_path = manifest_path or manifest_path_for(backend)
+    manifest = load_manifest(manifest_path)
+    if rebuild:
+        CLEARERS[backend]()
+        manifest = {"splitter": splitter_params, "metadata_version": METADATA_VERSION,
+                    "sources": {}}
+
+    known_ids = {cid for entry in manifest["sources"].values() for cid in entry["chunk_ids"]}
+    # Chunk IDs hash the splitter params, so a new splitter re-chunks every file
+    if manifest.get("splitter") != splitter_params:
+        manifest = {"splitter": splitter_params, "sources": {}}
+    # Older tagging: re-parse every file, but only rewrite metadata of known chunks
+    retag = bool(known_ids) and manifest.get("metadata_version") != METADATA_VERSION
+
+    sources = discover_sources(path)
+    current_sources, new_docs, retag_docs, kept = {}, [], [], 0
+
+    for source in sources:
+        file_hash = file_sha256(source)
+        entry = manifest["sources"].get(source)
+        if entry and entry["sha256"] == file_hash and not retag:
+            current_sources[source] = entry
+            kept += len(entry["chunk_ids"])
+            continue
+
+        chunks = load_source_chunks(source, splitter_params, file_hash)
+        current_sources[source] = {"sha256": file_hash,
+                                   "chunk_ids": [doc.metadata["chunk_id"] for doc in chunks]}
+        for doc in chunks:
+            if doc.metadata["chunk_id"] not in known_ids:
+                new_docs.append(doc)
+            elif retag:
+                retag_docs.append(doc)
+            else:
+                kept += 1
+
+    current_ids = {cid for entry in current_sources.values() for cid in entry["chunk_ids"]}
+    stale_ids = known_ids - current_ids
+
+    # Chunks repeated within one run (identical text on the same page) embed once
+    unique_docs = list({doc.metadata["chunk_id"]: doc for doc in new_docs}.values())
+    if unique_docs or stale_ids:
+        vectors = get_embedder().embed_documents([doc.page_content for doc in unique_docs]) \
+            if unique_docs else []
+        WRITERS[backend](unique_docs, vectors, stale_ids)
+    retag_docs = list({doc.metadata["chunk_id"]: doc for doc in retag_docs}.values())
+    if retag_docs:
+        RETAGGERS[backend](retag_docs)
+
+    manifest["sources"] = current_sources
+    manifest["metadata_version"] = METADATA_VERSION
+    save_manifest(manifest, manifest_path)
+
+    # Teach the rule-based slot extractor the place names of the new chunks
+    if unique_docs:
+        from chains.slot_extractor import update_gazetteer
+        update_gazetteer([doc.page_content for doc in unique_docs])
+
+    stats = {"sources": len(sources), "new": len(unique_docs),
+             "deleted": len(stale_ids), "retagged": len(retag_docs), "unchanged": kept}
+    print(f"✅ Ingestion finished: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incrementally sync documents into the vector store")
+    parser.add_argument("path", nargs="?", default="data")
+    parser.add_argument("--backend", default=VECTOR_BACKEND, choices=sorted(WRITERS))
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+    ingest(args.path, backend=args.backend, rebuild=args.rebuild)
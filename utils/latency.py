@@ -0,0 +1,20 @@
+# utils/latency.py
+"""Latency percentiles shared by the batch runner and the benchmarks."""
+import math
+
+
+def percentile(sorted_samples, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, math.ceil(q / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def latency_summary(samples_by_stage: dict) -> dict:
+    """``{stage: [seconds, ...]}`` → ``{stage: {count, p50_ms, p95_ms, p99_ms}}``."""
+    summary = {}
+    for stage, samples in samples_by_stage.items():
+        ordered = sorted(samples)
+        summary[stage] = {"count": len(ordered),
+                          **{f"p{q}_ms": round(percentile(ordered, q) * 1000, 1)
+                             for q in (50, 95, 99)}}
+    return summary
@@ -0,0 +1,175 @@
+# utils/llm_coalescing.py
+"""
+Request coalescing in front of the shared LLM.
+
+``CoalescingLLM`` wraps the registry's LLM and is used exactly like it:
+
+- singleflight: while a prompt is in flight upstream, identical calls (same
+  prompt, stop sequences and kwargs) wait for that call and get its answer
+  instead of sending their own,
+- micro-batching (LLM_BATCH_WINDOW_MS > 0): distinct prompts arriving within
+  the window are sent together through the wrapped model's ``generate``, up
+  to LLM_MAX_BATCH at a time, one group per pipeline stage. Off by default:
+  HuggingFaceEndpoint has no batch request, so behind the resilient layer a
+  batch just runs its prompts concurrently (each with its own stage budget)
+  and the window only adds latency. Worth enabling for backends that serve
+  a list of prompts in one request.
+
+Streaming calls go straight through. Every call is counted in
+``voyage_llm_calls_total`` by outcome (upstream / coalesced / batched), and
+``stats`` keeps the same numbers per wrapper, including how many upstream
+calls were saved.
+"""
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+
+from utils.resilient_llm import current_stage, llm_stage
+from utils.telemetry import increment
+
+LLM_COALESCE = os.getenv("LLM_COALESCE", "1").lower() not in ("0", "false", "no")
+LLM_BATCH_WINDOW_MS = float(os.getenv("LLM_BATCH_WINDOW_MS", "0"))
+LLM_MAX_BATCH = int(os.getenv("LLM_MAX_BATCH", "8"))
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []  # (prompt, stop, stage, future)
+        self.closed = False
+
+
+class CoalescingLLM(LLM):
+    inner: Any
+    batch_window: float = LLM_BATCH_WINDOW_MS / 1000
+    max_batch: int = LLM_MAX_BATCH
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _in_flight: dict = PrivateAttr(default_factory=dict)
+    _batch_ready: Any = PrivateAttr(default_factory=threading.Condition)
+    _open_batch: Any = PrivateAttr(default=None)
+    _stats: dict = PrivateAttr(default_factory=lambda: {
+        "requests": 0, "upstream_calls": 0, "coalesced": 0, "batched": 0})
+
+    @property
+    def _llm_type(self) -> str:
+        return f"coalescing-{getattr(self.inner, '_llm_type', 'llm')}"
+
+    @property
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["saved_calls"] = stats["requests"] - stats["upstream_calls"]
+        return stats
+
+    def _count(self, outcome: str, amount: int = 1):
+        with self._lock:
+            self._stats[outcome if outcome != "upstream" else "upstream_calls"] += amount
+        increment("voyage_llm_calls_total", amount, outcome=outcome)
+
+    # -------------------------
+    # Singleflight
+    # -------------------------
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        key = (prompt, tuple(stop or ()), repr(sorted(kwargs.items())))
+        with self._lock:
+            self._stats["requests"] += 1
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = Future()
+        if not leader:
+            self._count("coalesced")
+            return flight.result()
+
+        try:
+            if self.batch_window > 0 and not kwargs:
+                text = self._batched(prompt, stop)
+            else:
+                self._count("upstream")
+                text = self.inner.invoke(prompt, stop=stop, **kwargs)
+            flight.set_result(text)
+            return text
+        except BaseException as e:
+            flight.set_exception(e)  # waiters fail with the leader, nobody retries for them
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    # -------------------------
+    # Micro-batching
+    # -------------------------
+    def _batched(self, prompt: str, stop: Optional[List[str]]) -> str:
+        """
+        Join the open batch, or open one and lead it: the leader waits for the
+        window (or a full batch), closes the batch and sends it.
+        """
+        future = Future()
+        with self._batch_ready:
+            batch = self._open_batch
+            leader = batch is None
+            if leader:
+                batch = self._open_batch = _Batch()
+            batch.items.append((prompt, stop, current_stage(), future))
+            if len(batch.items) >= self.max_batch:
+                batch.closed = True
+                self._open_batch = None
+                self._batch_ready.notify_all()
+            if leader:
+                self._batch_ready.wait_for(lambda: batch.closed, timeout=self.batch_window)
+                if not batch.closed:
+                    batch.closed = True
+                    self._open_batch = None
+        if leader:
+            self._send(batch.items)
+        return future.result()
+
+    def _send(self, items):
+        # Prompts of one stage share its latency budget (utils.resilient_llm);
+        # different stages' groups go out side by side
+        groups = {}
+        for prompt, stop, stage, future in items:
+            groups.setdefault((tuple(stop or ()), stage), []).append((prompt, future))
+        threads = [threading.Thread(target=self._send_group, args=(*key, group),
+                                    name="llm-batch", daemon=True)
+                   for key, group in groups.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _send_group(self, stop, stage, group):
+        self._count("upstream")
+        if len(group) > 1:
+            self._count("batched", len(group) - 1)
+        try:
+            with llm_stage(stage):
+                result = self.inner.generate([prompt for prompt, _ in group],
+                                             stop=list(stop) or None)
+        except Exception as e:
+            for _, future in group:
+                future.set_exception(e)
+            return
+        for (_, future), generations in zip(group, result.generations):
+            future.set_result(generations[0].text)
+
+    # -------------------------
+    # Streaming
+    # -------------------------
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        with self._lock:
+            self._stats["requests"] += 1
+        self._count("upstream")
+        for text in self.inner.stream(prompt, stop=stop, **kwargs):
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,369 @@
+# utils/llm_json.py
+"""
+Tolerant JSON parsing for LLM output.
+
+Models wrap their JSON in prose or code fences, leave trailing commas, use
+single quotes or Python literals, and get cut off at max_new_tokens. Each of
+those used to fall through to a chain's hard-coded default. Here:
+
+- ``repair_json`` finds the object inside the text and fixes those defects,
+  closing a truncated object at the last complete value;
+- ``IncrementalJSONParser`` follows a token stream and hands back every
+  top-level member as soon as its value is complete;
+- ``parse_llm_json`` combines both with a per-chain validator and reports
+  what is still missing, so the caller can ``reask_fields`` for exactly that.
+
+Per-chain outcomes are counted in ``parse_stats`` and the success rate is
+logged.
+"""
+import json
+import logging
+import re
+import threading
+from collections import namedtuple
+
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from utils.telemetry import current_span, increment
+
+logger = logging.getLogger(__name__)
+
+ParsedJSON = namedtuple("ParsedJSON", ["value", "status", "problems"])
+
+# ok: valid as-is; repaired: needed extraction/repair; partial: truncated or
+# fields missing; failed: no JSON object found at all
+PARSE_STATUSES = ("ok", "repaired", "partial", "failed")
+
+FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+PYTHON_LITERAL = re.compile(r"\b(True|False|None)\b")
+UNQUOTED_KEY = re.compile(r"((?:^|[{,])\s*)([A-Za-z_][\w\-]*)(\s*:)")
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+CLOSERS = {"{": "}", "[": "]"}
+MAX_CUT_ATTEMPTS = 8
+REASK_PREVIOUS_CHARS = 1500  # how much of the bad answer is quoted back
+
+
+# -------------------------
+# Repair
+# -------------------------
+def _json_start(text: str) -> int:
+    """Index of the first ``{`` (or ``[``), looking inside a code fence first."""
+    fence = FENCE_PATTERN.search(text)
+    if fence and "{" in fence.group(1):
+        return fence.start(1) + fence.group(1).index("{")
+    positions = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return min(positions) if positions else -1
+
+
+def _fix_segment(segment: str) -> str:
+    """Repairs that are only safe outside string literals."""
+    segment = TRAILING_COMMA.sub(r"\1", segment)
+    segment = PYTHON_LITERAL.sub(lambda m: PYTHON_LITERALS[m.group(1)], segment)
+    return UNQUOTED_KEY.sub(r'\1"\2"\3', segment)
+
+
+def _scan(text: str):
+    """
+    Re-emit the first JSON value in ``text`` with single-quoted strings,
+    comments and bare-token defects fixed. Returns ``(output, stack, cuts,
+    in_string)``: ``stack`` holds the containers still open when the text
+    ended, ``cuts`` are ``(position, stack)`` points after complete values
+    where a truncated object can be closed.
+    """
+    out, segment, stack, cuts = [], [], [], []
+    quote, escaped, string_chars = None, False, []
+    i, n = 0, len(text)
+
+    def flush():
+        if segment:
+            out.append(_fix_segment("".join(segment)))
+            segment.clear()
+
+    while i < n:
+        char = text[i]
+        if quote:
+            if escaped:
+                string_chars.append(char)
+                escaped = False
+            elif char == "\\":
+                string_chars.append(char)
+                escaped = True
+            elif char == quote:
+                body = "".join(string_chars)
+                if quote == "'":  # re-quote a single-quoted string
+                    body = body.replace("\\'", "'").replace('"', '\\"')
+                out.append('"' + body + '"')
+                quote, string_chars = None, []
+                cuts.append((sum(map(len, out)), tuple(stack)))
+            else:
+                string_chars.append(char)
+            i += 1
+            continue
+
+        if char in "\"'":
+            flush()
+            quote = char
+        elif char == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        elif char == "/" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        elif char in "{[":
+            segment.append(char)
+            stack.append(char)
+            flush()
+            cuts.append((sum(map(len, out)), tuple(stack)))
+        elif char in "}]":
+            segment.append(char)
+            if stack:
+                stack.pop()
+            flush()
+            cuts.append((sum(map(len, out)), tuple(stack)))
+            if not stack:
+                break  # root value closed; ignore trailing prose
+        elif char == ",":
+            flush()
+            cuts.append((sum(map(len, out)), tuple(stack)))
+            segment.append(char)
+        else:
+            segment.append(char)
+        i += 1
+
+    flush()
+    if quote:
+        # Truncated inside a string: keep what was generated of it
+        out.append('"' + "".join(string_chars).rstrip("\\") + '"')
+    return "".join(out), stack, cuts, quote is not None
+
+
+def _close(text: str, stack) -> str:
+    text = text.rstrip()
+    while text.endswith((",", ":")):
+        text = text[:-1].rstrip()
+    return text + "".join(CLOSERS[c] for c in reversed(stack))
+
+
+def _loads(text: str):
+    return json.loads(text, strict=False)  # tolerate raw newlines inside strings
+
+
+def repair_json(text: str):
+    """
+    Best-effort parse of the JSON value inside ``text``. Returns
+    ``(value, repaired, truncated)``; ``value`` is None when nothing usable
+    was found.
+    """
+    text = str(text)
+    try:
+        return _loads(text), False, False
+    except ValueError:
+        pass
+
+    start = _json_start(text)
+    if start < 0:
+        return None, True, False
+
+    for candidate_text in (text[start:], text[start:].translate(SMART_QUOTES)):
+        output, stack, cuts, in_string = _scan(candidate_text)
+        truncated = bool(stack) or in_string
+        candidates = [_close(output, stack)] if truncated else [output]
+        if truncated:
+            candidates += [_close(output[:position], cut_stack)
+                           for position, cut_stack in reversed(cuts[-MAX_CUT_ATTEMPTS:])]
+        for candidate in candidates:
+            try:
+                return _loads(candidate), True, truncated
+            except ValueError:
+                continue
+    return None, True, False
+
+
+def parse_partial_json(text: str):
+    """Value of a possibly truncated JSON text (None if nothing parses yet)."""
+    return repair_json(text)[0]
+
+
+# -------------------------
+# Streaming
+# -------------------------
+class IncrementalJSONParser:
+    """
+    Follows a streamed JSON object chunk by chunk. ``completed`` holds every
+    top-level member whose value has been fully generated, each parsed once
+    when it completes; ``feed`` only scans the new characters.
+    """
+
+    def __init__(self, text: str = ""):
+        self.text = ""
+        self.completed = {}
+        self._pos = 0
+        self._depth = 0
+        self._quote = None
+        self._escaped = False
+        self._key = None            # key of the top-level member being generated
+        self._key_start = None
+        self._value_start = None
+        self._expect_key = False
+        if text:
+            self.feed(text)
+
+    def feed(self, chunk: str) -> dict:
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == self._quote:
+                    self._quote = None
+                    if self._depth == 1 and self._expect_key and self._key_start is not None:
+                        self._key = text[self._key_start + 1:i]
+                        self._key_start = None
+                continue
+            if self._depth == 0:
+                if char == "{":
+                    self._depth, self._expect_key = 1, True
+                continue
+            if char in "\"'":
+                self._quote = char
+                if self._depth == 1 and self._expect_key:
+                    self._key_start = i
+                elif self._depth == 1 and self._value_start is None:
+                    self._value_start = i
+            elif char == ":" and self._depth == 1:
+                self._expect_key = False
+                self._value_start = None
+            elif char in "{[":
+                if self._depth == 1 and self._value_start is None:
+                    self._value_start = i
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete(text, i)
+                    self._pos = len(text)
+                    return self.completed
+            elif char == "," and self._depth == 1:
+                self._complete(text, i)
+                self._expect_key = True
+            elif self._depth == 1 and not char.isspace() and self._value_start is None \
+                    and not self._expect_key:
+                self._value_start = i  # number / literal
+        self._pos = len(text)
+        return self.completed
+
+    def _complete(self, text: str, end: int):
+        if self._key is not None and self._value_start is not None:
+            value = repair_json(text[self._value_start:end])[0]
+            if value is not None:
+                self.completed[self._key] = value
+        self._key, self._value_start = None, None
+
+    def value(self):
+        """The whole object so far, truncated members closed (or None)."""
+        return parse_partial_json(self.text)
+
+
+# -------------------------
+# Validation + stats
+# -------------------------
+parse_stats = {}
+_stats_lock = threading.Lock()
+
+
+def field_problems(value, fields: dict) -> list:
+    """
+    Names in ``fields`` ({name: type or tuple of types}) that are missing,
+    empty or of the wrong type in ``value``.
+    """
+    if not isinstance(value, dict):
+        return list(fields)
+    problems = []
+    for name, types in fields.items():
+        field = value.get(name)
+        if field is None or field == "" or not isinstance(field, types):
+            problems.append(name)
+    return problems
+
+
+def record_parse(chain: str, status: str):
+    with _stats_lock:
+        counts = parse_stats.setdefault(chain, dict.fromkeys(PARSE_STATUSES + ("reasked",), 0))
+        counts[status] += 1
+        parsed = counts["ok"] + counts["repaired"]
+        total = sum(counts[s] for s in PARSE_STATUSES)
+    increment("voyage_llm_json_total", chain=chain, status=status)
+    if status == "reasked":
+        return
+    current_span().set("json_parse", status)
+    log = logger.info if status in ("partial", "failed") else logger.debug
+    log("%s JSON %s; parse success rate %.1f%% over %d outputs",
+        chain, status, 100 * parsed / total, total)
+
+
+def parse_llm_json(text: str, chain: str, validate=None) -> ParsedJSON:
+    """
+    Parse ``text`` and check it with ``validate(value) -> [problems]``.
+    The status is counted under ``chain`` in ``parse_stats``.
+    """
+    value, repaired, truncated = repair_json(text)
+    if value is None:
+        result = ParsedJSON(None, "failed", validate(None) if validate else ["<json>"])
+    else:
+        problems = validate(value) if validate else []
+        if problems or truncated:
+            status = "partial"
+        else:
+            status = "repaired" if repaired else "ok"
+        result = ParsedJSON(value, status, problems)
+    record_parse(chain, result.status)
+    return result
+
+
+# -------------------------
+# Targeted re-ask
+# -------------------------
+reask_prompt = PromptTemplate(
+    input_variables=["context", "previous", "fields"],
+    template="""
+Your previous answer was missing or had invalid values for: {fields}
+
+Task context:
+{context}
+
+Previous answer:
+{previous}
+
+Respond ONLY with a JSON object containing exactly these keys: {fields}
+Do NOT include any text outside the JSON.
+"""
+)
+
+
+def reask_fields(llm, chain: str, context: str, previous: str, fields) -> dict:
+    """
+    Ask ``llm`` for just ``fields`` instead of regenerating the whole answer.
+    Returns whatever usable object came back ({} on any failure).
+    """
+    record_parse(chain, "reasked")
+    current_span().add("json_reasks")
+    try:
+        text = (reask_prompt | llm | StrOutputParser()).invoke({
+            "context": context,
+            "previous": str(previous)[:REASK_PREVIOUS_CHARS] or "(empty)",
+            "fields": ", ".join(fields),
+        })
+    except Exception as e:
+        logger.warning("%s re-ask for %s failed: %s", chain, list(fields), e)
+        return {}
+    value = repair_json(text)[0]
+    return value if isinstance(value, dict) else {}
@@ -1,11 +1,8 @@
 import os
 from dotenv import load_dotenv
-from pinecone import Pinecone  # v3 client
 from langchain.vectorstores import Pinecone as LangchainPinecone
 from langchain_community.embeddings import OllamaEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import UnstructuredPDFLoader
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from utils.model_registry import get_embedder
 
 # Load environment variables
 load_dotenv()
@@ -13,17 +10,18 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 INDEX_NAME = os.getenv("INDEX_NAME")
 PINECONE_ENV = os.getenv("PINECONE_ENV", "us-east1-gcp")
 
-# Initialize Pinecone client (v3)
-pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
+# "pinecone" (default) or "local" for the on-disk index in utils.local_vectorstore
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join("data", "local_index", INDEX_NAME or "default"))
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32")  # float32 / float16 / int8
+LOCAL_INDEX_ANN = os.getenv("LOCAL_INDEX_ANN", "auto")  # auto / exact / ivf / hnsw
 
-# For v3, do NOT import Index; instead use the client to upsert/query
-index = pinecone_client.Index(INDEX_NAME)  # returns an index object directly
+# Pinecone client/index and the embedder are built lazily by utils.model_registry
+# (get_pinecone_index / get_embedder) so importing this module needs no network.
 
 # Embedder
 #embedder = OllamaEmbeddings(model="mxbai-embed-large")
 
-embedder = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
 
 # Retriever
 #def get_pinecone_retriever(k: int = 5):
@@ -34,33 +32,32 @@ embedder = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6
 def get_pinecone_retriever(k: int = 5):
     vectorstore = LangchainPinecone.from_existing_index(
         index_name=INDEX_NAME,
-        embedding=embedder
+        embedding=get_embedder()
     )
     retriever = vectorstore.as_retriever(search_kwargs={"k": k})
     return retriever
 
-# PDF to Pinecone
+def get_local_retriever(k: int = 5):
+    from utils.local_vectorstore import LocalVectorIndex, LocalVectorRetriever
+    index = LocalVectorIndex(LOCAL_INDEX_DIR)
+    return LocalVectorRetriever(index=index, embedder=get_embedder(), k=k)
+
+def get_vectorstore_retriever(k: int = 5):
+    """Retriever for the backend selected by VECTOR_BACKEND."""
+    if VECTOR_BACKEND == "local":
+        return get_local_retriever(k)
+    return get_pinecone_retriever(k)
+
+# PDF to Pinecone (chunking, IDs and the manifest live in utils.ingestion)
 MAX_PINECONE_PAYLOAD = 4 * 1024 * 1024  # 4MB
 BATCH_SIZE = 50
 
 def embed_pdf_to_pinecone(pdf_path="data/Travel-Data-for-Model-Training.pdf"):
-    loader = UnstructuredPDFLoader(pdf_path, strategy="fast")
-    raw_documents = loader.load()
-    print(f"✅ Loaded {len(raw_documents)} pages from PDF")
-
-    splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=50)
-    chunks = splitter.split_documents(raw_documents)
-    print(f"📦 Split into {len(chunks)} chunks")
-
-    valid_chunks = [
-        doc for doc in chunks
-        if len(doc.page_content.encode("utf-8")) < MAX_PINECONE_PAYLOAD
-    ]
-    print(f"✅ {len(valid_chunks)} chunks fit within Pinecone size limits")
-
-    for i in range(0, len(valid_chunks), BATCH_SIZE):
-        batch = valid_chunks[i:i + BATCH_SIZE]
-        print(f"🚀 Uploading batch {i//BATCH_SIZE + 1} with {len(batch)} chunks...")
-        LangchainPinecone.from_documents(batch, embedding=embedder, index_name=INDEX_NAME)
-
-    print("✅ All chunks uploaded to Pinecone")
+    """Incrementally sync a PDF (or a directory of them) into Pinecone."""
+    from utils.ingestion import ingest
+    return ingest(pdf_path, backend="pinecone")
+
+def embed_pdf_to_local_index(pdf_path="data/Travel-Data-for-Model-Training.pdf"):
+    """Incrementally sync a PDF (or a directory of them) into the local index."""
+    from utils.ingestion import ingest
+    return ingest(pdf_path, backend="local")
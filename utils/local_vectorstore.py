@@ -0,0 +1,383 @@
+# utils/local_vectorstore.py
+"""
+On-disk vector index used as a drop-in for Pinecone (VECTOR_BACKEND=local).
+
+Layout of an index directory:
+
+    vectors.npy     L2-normalized embedding matrix (float32, float16 or int8), memory-mapped
+    scales.npy      per-row dequantization scale (dtype="int8" only)
+    chunks.jsonl    one {"id", "text", "metadata"} record per row
+    meta.json       dimension, dtype, row count, ANN type and recall@k vs float32
+    ivf_*.npy       IVF coarse centroids + rows grouped by list (ann="ivf")
+    hnsw.bin        hnswlib graph (ann="hnsw", needs the optional hnswlib package)
+
+Small corpora are searched exactly with one NumPy matrix-vector product;
+large ones go through the ANN structure and are re-scored exactly.
+
+A metadata ``filter`` (the Pinecone subset: ``{"field": {"$in": [...]}}``,
+``$eq``, ``$or``, ``$and``) is resolved to candidate rows through an
+inverted index first, and only those rows are scored.
+
+float16 halves and int8 quarters the vector memory. int8 rows are scaled
+symmetrically (max |value| -> 127). A quantized build measures how much of
+the float32 top-k it keeps, with up to RECALL_CHECK_QUERIES of its own rows as
+queries, and stores that in meta.json.
+"""
+import json
+import os
+from typing import Any, List
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Row count up to which "auto" keeps exact search
+EXACT_SEARCH_MAX_ROWS = int(os.getenv("EXACT_SEARCH_MAX_ROWS", "50000"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+# Rows scored per block so float16 matrices are never upcast in one piece
+SCORE_BLOCK_ROWS = 65536
+STORAGE_DTYPES = ("float32", "float16", "int8")
+RECALL_CHECK_QUERIES = 100
+RECALL_CHECK_K = 10
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors: np.ndarray):
+    """(int8 codes, float32 per-row scales) with ``codes * scales[:, None] ≈ vectors``."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def stored_copy(vectors: np.ndarray, dtype: str) -> np.ndarray:
+    """``vectors`` as they read back (float32) after being stored as ``dtype``."""
+    if dtype == "int8":
+        codes, scales = quantize_int8(vectors)
+        return codes.astype(np.float32) * scales[:, None]
+    return np.asarray(vectors, dtype=dtype).astype(np.float32)
+
+
+def quantization_recall(vectors: np.ndarray, dtype: str, queries: np.ndarray,
+                        k: int = RECALL_CHECK_K) -> float:
+    """Mean fraction of each query's float32 top-``k`` that ``dtype`` storage still returns."""
+    vectors, queries = _normalize(vectors), _normalize(queries)
+    k = min(k, len(vectors))
+    exact = np.empty((len(queries), len(vectors)), dtype=np.float32)
+    approx = np.empty_like(exact)
+    for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+        block = vectors[start:start + SCORE_BLOCK_ROWS]
+        exact[:, start:start + len(block)] = queries @ block.T
+        approx[:, start:start + len(block)] = queries @ stored_copy(block, dtype).T
+    hits = [len(set(_top_k(e, k)) & set(_top_k(a, k))) for e, a in zip(exact, approx)]
+    return float(np.mean(hits)) / k
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` largest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def _values(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def _condition_values(condition) -> list:
+    if isinstance(condition, dict):
+        if "$in" in condition:
+            return list(condition["$in"])
+        if "$eq" in condition:
+            return [condition["$eq"]]
+        raise ValueError(f"Unsupported filter condition: {condition}")
+    return [condition]
+
+
+def metadata_matches(metadata: dict, metadata_filter: dict) -> bool:
+    """Whether ``metadata`` passes a Pinecone-style filter (list fields match any element)."""
+    for field, condition in metadata_filter.items():
+        if field == "$or":
+            if not any(metadata_matches(metadata, part) for part in condition):
+                return False
+        elif field == "$and":
+            if not all(metadata_matches(metadata, part) for part in condition):
+                return False
+        elif not set(_values(metadata.get(field))) & set(_condition_values(condition)):
+            return False
+    return True
+
+
+def _kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0):
+    """Spherical k-means on a sample; good enough for an IVF coarse quantizer."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_clusters * 64)
+    sample = np.asarray(vectors[rng.choice(len(vectors), sample_size, replace=False)],
+                        dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = sample[assignment == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class LocalVectorIndex:
+    def __init__(self, directory: str, mmap: bool = True):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"),
+                               mmap_mode="r" if mmap else None)
+        self.scales = np.load(os.path.join(directory, "scales.npy")) \
+            if self.meta["dtype"] == "int8" else None
+        with open(os.path.join(directory, "chunks.jsonl"), encoding="utf-8") as f:
+            self.chunks = [json.loads(line) for line in f]
+
+        self.ann = self.meta.get("ann", "exact")
+        self._hnsw = None
+        self._postings = {}  # field -> {value: rows}, built on first filtered search
+        if self.ann == "ivf":
+            self.ivf_centroids = np.load(os.path.join(directory, "ivf_centroids.npy"))
+            self.ivf_order = np.load(os.path.join(directory, "ivf_order.npy"), mmap_mode="r")
+            self.ivf_offsets = np.load(os.path.join(directory, "ivf_offsets.npy"))
+        elif self.ann == "hnsw":
+            import hnswlib
+            self._hnsw = hnswlib.Index(space="ip", dim=self.meta["dim"])
+            self._hnsw.load_index(os.path.join(directory, "hnsw.bin"))
+            self._hnsw.set_ef(HNSW_EF_SEARCH)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    # -------------------------
+    # Build
+    # -------------------------
+    @classmethod
+    def build(cls, directory, ids, vectors, texts, metadatas=None,
+              dtype: str = "float32", ann: str = "auto") -> "LocalVectorIndex":
+        """Write a new index to ``directory`` and load it."""
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype!r}, expected one of {STORAGE_DTYPES}")
+        os.makedirs(directory, exist_ok=True)
+        vectors = _normalize(vectors)
+        metadatas = metadatas or [{} for _ in texts]
+
+        if ann == "auto":
+            ann = "exact" if len(vectors) <= EXACT_SEARCH_MAX_ROWS else "ivf"
+            if ann == "ivf":
+                try:
+                    import hnswlib  # noqa: F401
+                    ann = "hnsw"
+                except ImportError:
+                    pass
+
+        stored = np.lib.format.open_memmap(os.path.join(directory, "vectors.npy"), mode="w+",
+                                           dtype=np.dtype(dtype), shape=vectors.shape)
+        if dtype == "int8":
+            codes, scales = quantize_int8(vectors)
+            stored[:] = codes
+            np.save(os.path.join(directory, "scales.npy"), scales)
+        else:
+            stored[:] = vectors.astype(dtype)
+        stored.flush()
+        del stored
+
+        meta = {"dim": int(vectors.shape[1]), "dtype": dtype, "count": int(len(vectors))}
+        if dtype != "float32" and len(vectors):
+            rng = np.random.default_rng(0)
+            sample = rng.choice(len(vectors), min(len(vectors), RECALL_CHECK_QUERIES),
+                                replace=False)
+            meta[f"recall@{RECALL_CHECK_K}_vs_float32"] = round(
+                quantization_recall(vectors, dtype, vectors[sample]), 4)
+
+        with open(os.path.join(directory, "chunks.jsonl"), "w", encoding="utf-8") as f:
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                f.write(json.dumps({"id": chunk_id, "text": text, "metadata": metadata},
+                                   ensure_ascii=False) + "\n")
+
+        if ann == "ivf":
+            cls._build_ivf(directory, vectors)
+        elif ann == "hnsw":
+            import hnswlib
+            graph = hnswlib.Index(space="ip", dim=vectors.shape[1])
+            graph.init_index(max_elements=len(vectors), ef_construction=200, M=16)
+            graph.add_items(vectors, np.arange(len(vectors)))
+            graph.save_index(os.path.join(directory, "hnsw.bin"))
+
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(dict(meta, ann=ann), f)
+
+        return cls(directory)
+
+    @classmethod
+    def update(cls, directory, ids, vectors, texts, metadatas=None, delete_ids=(),
+               dtype: str = "float32", ann: str = "auto") -> "LocalVectorIndex":
+        """
+        Upsert rows by id and drop ``delete_ids``. Surviving rows keep their
+        stored vectors, so only the new chunks ever need embedding.
+        """
+        metadatas = metadatas or [{} for _ in texts]
+        if not os.path.exists(os.path.join(directory, "meta.json")):
+            return cls.build(directory, ids, vectors, texts, metadatas, dtype=dtype, ann=ann)
+
+        existing = cls(directory, mmap=False)
+        dropped = set(delete_ids) | set(ids)
+        keep = [row for row, chunk in enumerate(existing.chunks) if chunk["id"] not in dropped]
+
+        kept_vectors = existing.rows_as_float32(keep)
+        if len(ids):
+            all_vectors = np.concatenate([kept_vectors, _normalize(vectors)])
+        else:
+            all_vectors = kept_vectors
+
+        return cls.build(
+            directory,
+            [existing.chunks[row]["id"] for row in keep] + list(ids),
+            all_vectors,
+            [existing.chunks[row]["text"] for row in keep] + list(texts),
+            [existing.chunks[row]["metadata"] for row in keep] + list(metadatas),
+            dtype=dtype,
+            ann=ann,
+        )
+
+    @staticmethod
+    def set_metadata(directory, metadatas: dict):
+        """Replace the metadata of rows by id ({id: metadata}); vectors are untouched."""
+        path = os.path.join(directory, "chunks.jsonl")
+        with open(path, encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                if chunk["id"] in metadatas:
+                    chunk["metadata"] = metadatas[chunk["id"]]
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _build_ivf(directory, vectors):
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+        centroids = _kmeans(vectors, n_lists)
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            block = vectors[start:start + SCORE_BLOCK_ROWS]
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1)).astype(np.int64)
+        np.save(os.path.join(directory, "ivf_centroids.npy"), centroids)
+        np.save(os.path.join(directory, "ivf_order.npy"), order)
+        np.save(os.path.join(directory, "ivf_offsets.npy"), offsets)
+
+    # -------------------------
+    # Search
+    # -------------------------
+    def rows_as_float32(self, rows) -> np.ndarray:
+        """Stored vectors of ``rows`` (indices or a slice), dequantized to float32."""
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            block *= self.scales[rows][:, None]
+        return block
+
+    def _score_rows(self, query: np.ndarray, rows=None) -> np.ndarray:
+        if rows is None:
+            scores = np.empty(len(self.vectors), dtype=np.float32)
+            for start in range(0, len(self.vectors), SCORE_BLOCK_ROWS):
+                block = self.rows_as_float32(slice(start, start + SCORE_BLOCK_ROWS))
+                scores[start:start + len(block)] = block @ query
+            return scores
+        return self.rows_as_float32(rows) @ query
+
+    def _field_postings(self, field: str) -> dict:
+        postings = self._postings.get(field)
+        if postings is None:
+            postings = {}
+            for row, chunk in enumerate(self.chunks):
+                for value in _values(chunk["metadata"].get(field)):
+                    postings.setdefault(value, []).append(row)
+            postings = {value: np.asarray(rows, dtype=np.int64) for value, rows in postings.items()}
+            self._postings[field] = postings
+        return postings
+
+    def filter_rows(self, metadata_filter: dict) -> np.ndarray:
+        """Sorted rows whose metadata passes ``metadata_filter``."""
+        selected = None
+        for field, condition in metadata_filter.items():
+            if field in ("$or", "$and"):
+                parts = [self.filter_rows(part) for part in condition]
+                combine = np.union1d if field == "$or" else np.intersect1d
+                rows = parts[0] if parts else np.empty(0, dtype=np.int64)
+                for part in parts[1:]:
+                    rows = combine(rows, part)
+            else:
+                postings = self._field_postings(field)
+                matches = [postings[v] for v in _condition_values(condition) if v in postings]
+                rows = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int64)
+            selected = rows if selected is None else np.intersect1d(selected, rows)
+        return selected if selected is not None else np.arange(len(self), dtype=np.int64)
+
+    def filtered_search(self, query_vector, metadata_filter: dict, k: int = 5):
+        """Exact top-k among the rows passing ``metadata_filter``."""
+        rows = self.filter_rows(metadata_filter)
+        if not len(rows):
+            return []
+        scores = self._score_rows(_normalize(query_vector), rows)
+        return [(float(scores[i]), int(rows[i])) for i in _top_k(scores, k)]
+
+    def exact_search(self, query_vector, k: int = 5):
+        """Brute-force top-k; returns [(score, row), ...] best first."""
+        query = _normalize(query_vector)
+        scores = self._score_rows(query)
+        return [(float(scores[i]), int(i)) for i in _top_k(scores, k)]
+
+    def search(self, query_vector, k: int = 5):
+        """Top-k through the index's ANN structure (exact for small corpora)."""
+        if self.ann == "exact":
+            return self.exact_search(query_vector, k)
+
+        query = _normalize(query_vector)
+        if self.ann == "hnsw":
+            labels, _ = self._hnsw.knn_query(query, k=min(k, len(self)))
+            rows = labels[0].astype(np.int64)
+        else:
+            probes = _top_k(self.ivf_centroids @ query, IVF_NPROBE)
+            rows = np.concatenate([self.ivf_order[self.ivf_offsets[p]:self.ivf_offsets[p + 1]]
+                                   for p in probes])
+        # Re-score candidates exactly so quantized storage and the graph agree on order
+        rows = np.sort(rows)
+        scores = self._score_rows(query, rows)
+        return [(float(scores[i]), int(rows[i])) for i in _top_k(scores, k)]
+
+    def get_documents(self, hits) -> List[Document]:
+        return [Document(page_content=self.chunks[row]["text"],
+                         metadata=dict(self.chunks[row]["metadata"], id=self.chunks[row]["id"]))
+                for _, row in hits]
+
+
+class LocalVectorRetriever(BaseRetriever):
+    """LangChain retriever over a LocalVectorIndex, interchangeable with Pinecone's."""
+    index: Any
+    embedder: Any
+    k: int = 5
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None, k: int = None,
+                                filter: dict = None) -> List[Document]:
+        # k / filter per call, like the search_kwargs of Pinecone's retriever
+        query_vector = self.embedder.embed_query(query)
+        if filter:
+            hits = self.index.filtered_search(query_vector, filter, k or self.k)
+        else:
+            hits = self.index.search(query_vector, k or self.k)
+        return self.index.get_documents(hits)
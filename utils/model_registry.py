@@ -0,0 +1,187 @@
+# utils/model_registry.py
+"""
+Central registry for LLMs, the embedder and the retriever.
+
+Nothing is built at import time: each component is constructed on first use,
+shared by every chain that asks for the same config, and can be built up front
+with ``warm_up()`` so the cold-start cost is paid once and reported.
+"""
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_REPO_ID = os.getenv("LLM_REPO_ID", "meta-llama/Llama-2-13b-chat-hf")
+# A dedicated (or local stub) inference server to use instead of the repo's hosted endpoint
+LLM_ENDPOINT_URL = os.getenv("LLM_ENDPOINT_URL") or None
+# Hard cap on one HTTP request to the endpoint; stage budgets are usually tighter
+LLM_REQUEST_TIMEOUT = int(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+JUDGE_MODEL = os.getenv("JUDGE_MODEL", "llama3.2")
+# Local Ollama model answering when the endpoint is slow or down (LLM_FALLBACK=0 disables)
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", JUDGE_MODEL)
+LLM_FALLBACK = os.getenv("LLM_FALLBACK", "1").lower() not in ("0", "false", "no")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL") or None
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+INDEX_NAME = os.getenv("INDEX_NAME")
+MAX_NEW_TOKENS = int(os.getenv("MAX_NEW_TOKENS", "512"))
+# Set EMBEDDING_CACHE=0 to call the embedder directly
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "1").lower() not in ("0", "false", "no")
+
+_instances = {}
+_lock = threading.RLock()
+
+# Seconds spent building each component, keyed like _instances
+build_timings = {}
+
+
+def _get_or_build(key, builder):
+    """Return the shared instance for ``key``, building it once if needed."""
+    instance = _instances.get(key)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        if key not in _instances:
+            start = time.perf_counter()
+            _instances[key] = builder()
+            build_timings[key] = time.perf_counter() - start
+        return _instances[key]
+
+
+def register(key, instance):
+    """Install a pre-built instance (e.g. a stub) under ``key``."""
+    with _lock:
+        _instances[key] = instance
+
+
+def reset():
+    """Drop every cached instance so the next call rebuilds it."""
+    with _lock:
+        _instances.clear()
+        build_timings.clear()
+
+
+# -------------------------
+# Builders
+# -------------------------
+def get_llm(repo_id: str = LLM_REPO_ID, temperature: float = 0):
+    """
+    Shared HuggingFace Inference endpoint LLM, with latency budgets, hedging
+    and the local Ollama fallback (utils.resilient_llm), behind request coalescing.
+    """
+    def build():
+        from langchain_community.llms import HuggingFaceEndpoint
+        from utils.llm_coalescing import LLM_COALESCE, CoalescingLLM
+        from utils.resilient_llm import ResilientLLM
+        from utils.telemetry import TokenCountingCallback
+        target = {"endpoint_url": LLM_ENDPOINT_URL} if LLM_ENDPOINT_URL else {"repo_id": repo_id}
+        endpoint = HuggingFaceEndpoint(
+            **target,
+            huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
+            temperature=temperature,
+            max_new_tokens=MAX_NEW_TOKENS,
+            timeout=LLM_REQUEST_TIMEOUT,
+            callbacks=[TokenCountingCallback()],
+        )
+        fallback = get_ollama_llm(temperature=temperature) if LLM_FALLBACK else None
+        llm = ResilientLLM(primary=endpoint, fallback=fallback)
+        return CoalescingLLM(inner=llm) if LLM_COALESCE else llm
+
+    return _get_or_build(("llm", repo_id, temperature), build)
+
+
+def get_chat_ollama(model: str = JUDGE_MODEL, temperature: float = 0):
+    """Shared local Ollama chat model (used by the judge)."""
+    def build():
+        from langchain_ollama import ChatOllama
+        from utils.telemetry import TokenCountingCallback
+        return ChatOllama(model=model, temperature=temperature,
+                          callbacks=[TokenCountingCallback()])
+
+    return _get_or_build(("ollama", model, temperature), build)
+
+
+def get_ollama_llm(model: str = LLM_FALLBACK_MODEL, temperature: float = 0):
+    """Shared local Ollama completion model (the endpoint's fallback)."""
+    def build():
+        from langchain_ollama import OllamaLLM
+        from utils.telemetry import TokenCountingCallback
+        return OllamaLLM(model=model, temperature=temperature, num_predict=MAX_NEW_TOKENS,
+                         base_url=OLLAMA_BASE_URL, callbacks=[TokenCountingCallback()])
+
+    return _get_or_build(("ollama_llm", model, temperature), build)
+
+
+def get_embedder(model_name: str = EMBEDDING_MODEL):
+    """Shared sentence-transformers embedder, behind the persistent embedding cache."""
+    def build():
+        from utils.embedding_engine import EmbeddingEngine
+        embedder = EmbeddingEngine(model_name)
+        if not EMBEDDING_CACHE:
+            return embedder
+        from utils.embedding_cache import CachedEmbeddings
+        return CachedEmbeddings(embedder, model_name)
+
+    return _get_or_build(("embedder", model_name), build)
+
+
+def get_pinecone_index(index_name: str = INDEX_NAME):
+    """Shared Pinecone (v3 client) index handle."""
+    def build():
+        from pinecone import Pinecone
+        client = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        return client.Index(index_name)
+
+    return _get_or_build(("pinecone_index", index_name), build)
+
+
+def get_retriever(k: int = 5):
+    """Shared vector-store retriever returning the top ``k`` chunks."""
+    def build():
+        from utils.load_vectorstore import get_vectorstore_retriever
+        return get_vectorstore_retriever(k=k)
+
+    return _get_or_build(("retriever", k), build)
+
+
+# -------------------------
+# Warm-up
+# -------------------------
+def _warm_embedder():
+    # Loading the weights happens lazily inside sentence-transformers, so run
+    # one tiny query to actually pay for it here (bypassing the embedding cache,
+    # which would otherwise answer it without touching the model).
+    embedder = get_embedder()
+    getattr(embedder, "inner", embedder).embed_query("warm up")
+
+
+WARM_UP_STEPS = {
+    "llm": get_llm,
+    "embedder": _warm_embedder,
+    "retriever": get_retriever,
+}
+
+
+def warm_up(components=None) -> dict:
+    """
+    Build the given components (default: all of WARM_UP_STEPS) and return
+    ``{"timings": {name: seconds}, "errors": {name: message}}``.
+
+    Failures are recorded rather than raised, so the app still starts when a
+    backend is unreachable and the error surfaces on first real use instead.
+    """
+    timings, errors = {}, {}
+    for name in components or WARM_UP_STEPS:
+        start = time.perf_counter()
+        try:
+            WARM_UP_STEPS[name]()
+        except Exception as e:
+            errors[name] = str(e)
+        timings[name] = round(time.perf_counter() - start, 3)
+
+    print(f"🔥 Warm-up finished in {sum(timings.values()):.2f}s: {timings}")
+    if errors:
+        print("⚠️ Warm-up errors:", errors)
+    return {"timings": timings, "errors": errors}
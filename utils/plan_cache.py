@@ -0,0 +1,230 @@
+# utils/plan_cache.py
+"""
+Full-pipeline result cache keyed on canonicalized slots.
+
+Two tiers: an in-memory LRU and an optional on-disk SQLite table, both with
+the same TTL. Repeat plans for the same destination/trip_type/budget/days
+skip every LLM call and the vector query.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "512"))
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", str(6 * 60 * 60)))  # seconds
+PLAN_CACHE_DB = os.getenv("PLAN_CACHE_DB")  # e.g. data/plan_cache.sqlite
+PLAN_CACHE_BYPASS = os.getenv("PLAN_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+SLOT_KEYS = ("destination", "trip_type", "budget", "days")
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15,
+}
+# Whole words only, longest first ("fourteen" before "four")
+_NUMBER = r"\d+|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True))
+DURATION_PATTERN = re.compile(rf"\b({_NUMBER}|an?)\s*-?\s*(days?|nights?|weeks?)\b")
+BARE_NUMBER_PATTERN = re.compile(rf"^({_NUMBER})$")
+
+# An amount counts when it carries a currency mark or a k/lakh multiplier,
+# or when two of them form an explicit range
+_AMOUNT = r"(?:(₹|rs\.?|inr)\s*)?(\d+(?:\.\d+)?)\s*(k|lakhs?|l|rupees|inr)?\b"
+AMOUNT_PATTERN = re.compile(_AMOUNT)
+RANGE_PATTERN = re.compile(rf"{_AMOUNT}\s*(?:-|–|to|and)\s*{_AMOUNT}")
+AMOUNT_MULTIPLIERS = {"k": 1_000, "l": 100_000, "lakh": 100_000, "lakhs": 100_000}
+
+
+# -------------------------
+# Slot canonicalization
+# -------------------------
+def _normalize_text(value) -> str:
+    return re.sub(r"\s+", " ", str(value or "")).strip().lower()
+
+
+def _number(word: str) -> int:
+    return int(word) if word.isdigit() else NUMBER_WORDS.get(word, 1)  # "a"/"an" week
+
+
+def _normalize_days(value) -> str:
+    """
+    '3', 'three days' and '3 nights' map to '3', 'two weeks' to '14';
+    anything else (e.g. 'a weekend') is kept as text.
+    """
+    text = _normalize_text(value)
+    match = DURATION_PATTERN.search(text)
+    if match:
+        days = _number(match.group(1))
+        return str(days * 7 if match.group(2).startswith("week") else days)
+    match = BARE_NUMBER_PATTERN.match(text)
+    if match:
+        return str(_number(match.group(1)))
+    return text
+
+
+def _amount(number: str, suffix: str) -> str:
+    return str(int(float(number) * AMOUNT_MULTIPLIERS.get(suffix or "", 1)))
+
+
+def _normalize_budget(value) -> str:
+    """
+    '₹20,000 - ₹30,000', 'Rs 20k-30k' and '20000 to 30000' all map to
+    '20000-30000', 'around ₹25k' to '25000'; tiers like 'Moderate ' map to
+    'moderate'. Unmarked numbers ('under 50000 for 2 people') are kept as text.
+    """
+    text = _normalize_text(value).replace(",", "")
+    if re.fullmatch(r"\d+(?:\.\d+)?", text):
+        return _amount(text, None)
+    match = RANGE_PATTERN.search(text)
+    if match:
+        groups = match.groups()
+        return f"{_amount(groups[1], groups[2])}-{_amount(groups[4], groups[5])}"
+    amounts = [_amount(number, suffix)
+               for currency, number, suffix in AMOUNT_PATTERN.findall(text)
+               if currency or suffix]
+    if amounts:
+        return "-".join(amounts)
+    return text
+
+
+def canonicalize_slots(slots: dict) -> dict:
+    """Return the normalized slot values the cache key is built from."""
+    return {
+        "destination": _normalize_text(slots.get("destination")),
+        "trip_type": _normalize_text(slots.get("trip_type")),
+        "budget": _normalize_budget(slots.get("budget")),
+        "days": _normalize_days(slots.get("days")),
+    }
+
+
+def slot_cache_key(slots: dict) -> str:
+    canonical = canonicalize_slots(slots)
+    payload = json.dumps([canonical[k] for k in SLOT_KEYS], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+# -------------------------
+# Cache
+# -------------------------
+class PlanCache:
+    """In-memory LRU + optional SQLite tier with TTL and hit/miss counters."""
+
+    def __init__(self, max_entries=PLAN_CACHE_SIZE, ttl_seconds=PLAN_CACHE_TTL,
+                 db_path=None, bypass=False):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.bypass = bypass
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+                      "expired": 0, "evictions": 0, "bypassed": 0}
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS plans "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _is_fresh(self, stored_at: float) -> bool:
+        return time.time() - stored_at < self.ttl_seconds
+
+    def get(self, slots: dict, bypass: bool = False):
+        """Return the cached value for ``slots`` or None."""
+        if bypass or self.bypass:
+            with self._lock:
+                self.stats["bypassed"] += 1
+            return None
+
+        key = slot_cache_key(slots)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self._is_fresh(stored_at):
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._entries[key]
+                self.stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, stored_at FROM plans WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, stored_at = json.loads(row[0]), row[1]
+                    if self._is_fresh(stored_at):
+                        self._remember(key, stored_at, value)
+                        self.stats["hits"] += 1
+                        self.stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM plans WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.stats["expired"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, slots: dict, value, bypass: bool = False):
+        """Store a JSON-serializable ``value`` for ``slots``."""
+        if bypass or self.bypass:
+            return
+
+        key = slot_cache_key(slots)
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO plans (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), stored_at),
+                )
+                self._db.commit()
+
+    def remaining_ttl(self, slots: dict):
+        """Seconds until the entry for ``slots`` expires, or None; not counted in ``stats``."""
+        key = slot_cache_key(slots)
+        with self._lock:
+            entry = self._entries.get(key)
+            stored_at = entry[0] if entry is not None else None
+            if stored_at is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT stored_at FROM plans WHERE key = ?", (key,)
+                ).fetchone()
+                stored_at = row[0] if row is not None else None
+        if stored_at is None or not self._is_fresh(stored_at):
+            return None
+        return self.ttl_seconds - (time.time() - stored_at)
+
+    def _remember(self, key, stored_at, value):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM plans")
+                self._db.commit()
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+
+@lru_cache(maxsize=None)
+def get_plan_cache() -> PlanCache:
+    """Process-wide cache configured from PLAN_CACHE_* env vars."""
+    return PlanCache(db_path=PLAN_CACHE_DB, bypass=PLAN_CACHE_BYPASS)
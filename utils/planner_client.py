@@ -0,0 +1,83 @@
+# utils/planner_client.py
+"""
+Thin client for service.py, used by the Streamlit app when
+PLANNER_SERVICE_URL is set.
+
+One keep-alive HTTP connection per thread (Streamlit runs every browser
+session's script in its own thread), re-opened once if the server dropped it.
+A 503 (or a streamed error with status 503) raises LLMUnavailableError, as
+the in-process pipeline does.
+"""
+import http.client
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+from utils.resilient_llm import LLMUnavailableError
+
+PLANNER_SERVICE_URL = os.getenv("PLANNER_SERVICE_URL")
+PLANNER_TIMEOUT = float(os.getenv("PLANNER_TIMEOUT", "300"))
+
+
+class PlannerServiceError(Exception):
+    pass
+
+
+class PlannerClient:
+    def __init__(self, base_url: str = PLANNER_SERVICE_URL, timeout: float = PLANNER_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, fresh: bool = False):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or fresh:
+            if connection is not None:
+                connection.close()
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = cls(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _request(self, method: str, path: str, body: dict = None):
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload else {}
+        for attempt in range(2):
+            connection = self._connection(fresh=attempt > 0)
+            try:
+                connection.request(method, self.prefix + path, body=payload, headers=headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if attempt:
+                    raise
+                continue  # idle keep-alive connection was closed by the server
+            if response.status != 200:
+                detail = response.read().decode("utf-8", "replace")
+                if response.status == 503:
+                    raise LLMUnavailableError(detail)
+                raise PlannerServiceError(f"{response.status} from planner service: {detail}")
+            return response
+
+    def plan(self, query: str, session_id: str = None) -> dict:
+        response = self._request("POST", "/plan", {"query": query, "session_id": session_id})
+        return json.loads(response.read())
+
+    def stream(self, query: str, session_id: str = None):
+        """Yield the service's events: "context", then "partial"s, then "final"."""
+        response = self._request("POST", "/stream", {"query": query, "session_id": session_id})
+        for line in response:
+            if line.strip():
+                event = json.loads(line)
+                if event["type"] == "error":
+                    if event.get("status") == 503:
+                        raise LLMUnavailableError(event["error"])
+                    raise PlannerServiceError(event["error"])
+                yield event
+
+    def session(self, session_id: str) -> dict:
+        return json.loads(self._request("GET", f"/session/{session_id}").read())
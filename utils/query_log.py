@@ -0,0 +1,78 @@
+# utils/query_log.py
+"""
+Log of the slots every live plan was requested for.
+
+One JSON line per user request, i.e. ``plan_trip`` / ``stream_plan`` called
+with ``live=True`` by the app or the service (never by batches, benchmarks,
+evaluations or the warmer), with its slots (never the query text) and what
+served it: ``pipeline`` (generated), ``cache`` (plan cache hit), ``warmed``
+(hit on an entry the cache warmer precomputed) or ``guard`` (blocked by the
+input guardrails). The file is size-rotated like the trace file;
+QUERY_LOG="" turns it off.
+
+The cache warmer (utils.cache_warmer) derives the popular slot combinations
+from it and reports which share of traffic its entries served.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from utils.plan_cache import SLOT_KEYS
+from utils.telemetry import increment
+
+QUERY_LOG = os.getenv("QUERY_LOG", os.path.join("logs", "queries.jsonl"))
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+QUERY_LOG_BACKUPS = int(os.getenv("QUERY_LOG_BACKUPS", "5"))
+
+SERVED_BY = ("pipeline", "cache", "warmed", "guard")
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def _get_logger():
+    global _logger
+    if _logger is not None:
+        return _logger
+    with _logger_lock:
+        if _logger is None:
+            os.makedirs(os.path.dirname(QUERY_LOG) or ".", exist_ok=True)
+            logger = logging.getLogger("agentic_voyage.queries")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(QUERY_LOG, maxBytes=QUERY_LOG_MAX_BYTES,
+                                          backupCount=QUERY_LOG_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            _logger = logger
+        return _logger
+
+
+def log_query(slots: dict, served_by: str):
+    """Record one live plan request; ``served_by`` is one of SERVED_BY."""
+    increment("voyage_plan_requests_total", served_by=served_by)
+    if not QUERY_LOG:
+        return
+    record = {"ts": round(time.time(), 3), "slots": {key: slots.get(key) for key in SLOT_KEYS},
+              "served_by": served_by}
+    _get_logger().info(json.dumps(record, ensure_ascii=False))
+
+
+def read_query_log(path: str = None, since: float = 0.0):
+    """Yield the records logged after ``since`` (epoch seconds), oldest file first."""
+    path = path or QUERY_LOG
+    paths = [f"{path}.{n}" for n in range(QUERY_LOG_BACKUPS, 0, -1)] + [path]
+    for name in paths:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn line of a crashed writer
+                if record.get("ts", 0) >= since and isinstance(record.get("slots"), dict):
+                    yield record
@@ -0,0 +1,403 @@
+# utils/resilient_llm.py
+"""
+Resilient LLM backend: latency budgets, hedged requests, circuit breaking
+and fallback to the local Ollama model.
+
+``ResilientLLM`` wraps the remote endpoint (``primary``) and the local model
+(``fallback``):
+
+- every call gets the latency budget of the stage it runs in
+  (LLM_STAGE_BUDGETS, stage set with ``llm_stage`` / ``in_stage``); the endpoint call runs
+  on a worker thread and is abandoned when the budget runs out,
+- once enough latencies are known, a call still running after their p95
+  (at least LLM_HEDGE_MIN_DELAY) gets a duplicate request and the first
+  answer wins; a failed first attempt is retried the same way,
+- LLM_BREAKER_FAILURES failed calls in a row open the circuit: for
+  LLM_BREAKER_COOLDOWN seconds the endpoint is skipped, then one trial call
+  decides whether it closes again,
+- a timed-out, failed or skipped call is answered by the fallback instead,
+  which runs on its own pool so endpoint calls can never queue it out.
+  Only when that fails too does the caller get an ``LLMUnavailableError``.
+
+An endpoint call abandoned at its budget keeps its worker until the HTTP
+timeout; once LLM_MAX_ABANDONED of them are still running, the endpoint is
+skipped (no attempts, no hedges) until some finish.
+
+A batch (``generate`` with several prompts, e.g. from micro-batching) runs
+its prompts concurrently, each with the full stage budget, instead of one
+after another inside a single budget.
+
+Streaming gets the budget as a time-to-first-token limit (falling back if
+the endpoint misses it) and as the longest allowed gap between tokens.
+Outcomes are counted in ``voyage_llm_backend_total``.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+from pydantic import PrivateAttr
+
+from utils.latency import percentile
+from utils.telemetry import increment
+
+# Seconds an LLM call may take per pipeline stage; override with a JSON object
+LLM_STAGE_BUDGETS = {"intent": 10.0, "destination": 20.0, "itinerary": 60.0,
+                     "explanation": 30.0, "default": 30.0,
+                     **json.loads(os.getenv("LLM_STAGE_BUDGETS", "{}"))}
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1").lower() not in ("0", "false", "no")
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_PERCENTILE = 95
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LLM_CALL_WORKERS = int(os.getenv("LLM_CALL_WORKERS", "32"))
+LLM_FALLBACK_WORKERS = int(os.getenv("LLM_FALLBACK_WORKERS", "8"))
+# Abandoned endpoint calls allowed to hold call workers; keeps room for live ones
+LLM_MAX_ABANDONED = int(os.getenv("LLM_MAX_ABANDONED", str(LLM_CALL_WORKERS // 2)))
+
+_stage = contextvars.ContextVar("llm_stage", default="default")
+_executors = {}
+_executor_lock = threading.Lock()
+_DONE = object()
+
+
+class LLMUnavailableError(RuntimeError):
+    """Neither the endpoint nor the fallback model answered in time."""
+
+
+@contextlib.contextmanager
+def llm_stage(name: str):
+    """LLM calls inside the block (or decorated function) get the budget of stage ``name``."""
+    token = _stage.set(name)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def in_stage(name: str, iterable):
+    """
+    ``iterable`` with every step run under ``llm_stage(name)``, for token
+    streams, which do their LLM calls lazily and may be consumed elsewhere.
+    """
+    iterator = iter(iterable)
+    while True:
+        with llm_stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def current_stage() -> str:
+    return _stage.get()
+
+
+def stage_budget(stage: str = None) -> float:
+    stage = stage or _stage.get()
+    return LLM_STAGE_BUDGETS.get(stage, LLM_STAGE_BUDGETS["default"])
+
+
+def _get_executor(name: str = "llm-call", workers: int = LLM_CALL_WORKERS) -> ThreadPoolExecutor:
+    with _executor_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        return _executors[name]
+
+
+def _submit(fn, *args):
+    # Run in a copy of the caller's context so token counts land on its span
+    return _get_executor().submit(contextvars.copy_context().run, fn, *args)
+
+
+def _submit_fallback(fn, *args):
+    return _get_executor("llm-fallback", LLM_FALLBACK_WORKERS).submit(
+        contextvars.copy_context().run, fn, *args)
+
+
+class AbandonedCalls:
+    """Endpoint calls given up on by their caller that still hold a call worker."""
+
+    def __init__(self, limit: int = LLM_MAX_ABANDONED):
+        self.limit = limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def saturated(self) -> bool:
+        with self._lock:
+            return self.count >= self.limit
+
+    def add(self, future):
+        with self._lock:
+            self.count += 1
+        future.add_done_callback(self._release)
+
+    def _release(self, future):
+        with self._lock:
+            self.count -= 1
+
+
+class CircuitBreaker:
+    """closed → (N failures in a row) → open → (cooldown) → half-open: one trial call."""
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES,
+                 cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"  # this caller is the trial
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._consecutive = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or self._consecutive >= self.failures:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Latencies of the last LATENCY_WINDOW successful endpoint calls."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < MIN_LATENCY_SAMPLES:
+                return None
+            return percentile(sorted(self._samples), q)
+
+
+class ResilientLLM(LLM):
+    primary: Any
+    fallback: Any = None
+    hedge: bool = LLM_HEDGE
+
+    _breaker: Any = PrivateAttr(default_factory=CircuitBreaker)
+    _latencies: Any = PrivateAttr(default_factory=LatencyTracker)
+    _abandoned: Any = PrivateAttr(default_factory=AbandonedCalls)
+    _stats_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _stats: dict = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"resilient-{getattr(self.primary, '_llm_type', 'llm')}"
+
+    @property
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats, circuit=self._breaker.state,
+                        abandoned_in_flight=self._abandoned.count)
+
+    def _count(self, outcome: str):
+        with self._stats_lock:
+            self._stats[outcome] = self._stats.get(outcome, 0) + 1
+        increment("voyage_llm_backend_total", outcome=outcome)
+
+    # -------------------------
+    # Blocking calls
+    # -------------------------
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or self._breaker.state != "closed" or self._abandoned.saturated():
+            return None
+        p95 = self._latencies.percentile(LLM_HEDGE_PERCENTILE)
+        return None if p95 is None else max(LLM_HEDGE_MIN_DELAY, p95)
+
+    def _attempt(self, prompt, stop, kwargs):
+        start = time.perf_counter()
+        text = self.primary.invoke(prompt, stop=stop, **kwargs)
+        self._latencies.add(time.perf_counter() - start)
+        return text
+
+    def _call_primary(self, prompt, stop, kwargs, deadline: float) -> str:
+        """First answer of the endpoint (plus at most one hedge) before ``deadline``."""
+        attempts = [_submit(self._attempt, prompt, stop, kwargs)]
+        running = set(attempts)
+        delay = self._hedge_delay()
+        hedge_at = None if delay is None else time.monotonic() + delay
+        error = None
+
+        while running and time.monotonic() < deadline:
+            timeout = deadline - time.monotonic()
+            if len(attempts) == 1 and hedge_at is not None:
+                timeout = min(timeout, max(0.0, hedge_at - time.monotonic()))
+            done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._breaker.record_success()
+                    self._count("primary" if future is attempts[0] else "hedge_won")
+                    return future.result()
+                error = future.exception()
+            # A slow first attempt gets a duplicate after the hedge delay, a failed one a retry
+            slow = hedge_at is not None and time.monotonic() >= hedge_at
+            if len(attempts) == 1 and (not running or slow):
+                if not self._abandoned.saturated():
+                    self._count("hedged")
+                    attempts.append(_submit(self._attempt, prompt, stop, kwargs))
+                    running.add(attempts[-1])
+                hedge_at = None  # sent or given up: from here on wait for the deadline
+
+        for future in running:
+            self._abandoned.add(future)  # keeps its worker until the HTTP timeout
+        self._breaker.record_failure()
+        self._count("error" if error is not None and not running else "timeout")
+        raise error if error is not None and not running else \
+            TimeoutError(f"LLM endpoint gave no answer within {stage_budget():.0f}s")
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        budget = stage_budget()
+        error = None
+        if self._abandoned.saturated():
+            self._count("saturated")
+            error = "too many abandoned endpoint calls"
+        elif self._breaker.allow():
+            try:
+                return self._call_primary(prompt, stop, kwargs, time.monotonic() + budget)
+            except Exception as e:
+                error = e
+        else:
+            self._count("circuit_open")
+        return self._call_fallback(prompt, stop, budget, error)
+
+    def _generate(self, prompts: List[str], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> LLMResult:
+        if len(prompts) == 1:
+            return super()._generate(prompts, stop, run_manager, **kwargs)
+        # A thread per prompt, each only waiting on the call pools
+        results = [None] * len(prompts)
+
+        def call(i, context):
+            try:
+                results[i] = context.run(self._call, prompts[i], stop, None, **kwargs)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=call, args=(i, contextvars.copy_context()),
+                                    name="llm-batch", daemon=True)
+                   for i in range(len(prompts))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return LLMResult(generations=[[Generation(text=text)] for text in results])
+
+    def _call_fallback(self, prompt, stop, budget: float, error) -> str:
+        if self.fallback is None:
+            raise LLMUnavailableError(f"LLM endpoint unavailable: {error or 'circuit open'}")
+        self._count("fallback")
+        future = _submit_fallback(lambda: self.fallback.invoke(prompt, stop=stop))
+        try:
+            return future.result(timeout=budget)
+        except Exception as e:
+            self._count("unavailable")
+            raise LLMUnavailableError(
+                f"LLM endpoint ({error or 'circuit open'}) and local fallback ({e!r}) "
+                f"both failed") from e
+
+    # -------------------------
+    # Streaming
+    # -------------------------
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        budget = stage_budget()
+        texts = None
+        if self._abandoned.saturated():
+            self._count("saturated")
+        elif self._breaker.allow():
+            texts = self._stream_primary(prompt, stop, kwargs, budget)
+        else:
+            self._count("circuit_open")
+        if texts is None:
+            if self.fallback is None:
+                raise LLMUnavailableError("LLM endpoint unavailable and no fallback configured")
+            self._count("fallback")
+            texts = self.fallback.stream(prompt, stop=stop)
+
+        for text in texts:
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def _stream_primary(self, prompt, stop, kwargs, budget: float):
+        """Token iterator of the endpoint, or None if no first token came within ``budget``."""
+        tokens, cancelled = queue.Queue(), threading.Event()
+
+        def pump():
+            try:
+                for text in self.primary.stream(prompt, stop=stop, **kwargs):
+                    if cancelled.is_set():
+                        return
+                    tokens.put(text)
+                tokens.put(_DONE)
+            except Exception as e:
+                tokens.put(e)
+
+        pumping = _submit(pump)
+        try:
+            first = tokens.get(timeout=budget)
+        except queue.Empty:
+            first = TimeoutError(f"no first token within {budget:.0f}s")
+            self._abandoned.add(pumping)
+        if isinstance(first, Exception):
+            cancelled.set()
+            self._breaker.record_failure()
+            self._count("timeout" if isinstance(first, TimeoutError) else "error")
+            return None
+        self._breaker.record_success()
+        self._count("primary")
+
+        def rest(item):
+            try:
+                while item is not _DONE:
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+                    try:
+                        item = tokens.get(timeout=budget)
+                    except queue.Empty:
+                        self._abandoned.add(pumping)
+                        raise LLMUnavailableError(f"LLM stream stalled for {budget:.0f}s")
+            finally:
+                cancelled.set()
+
+        return rest(first)
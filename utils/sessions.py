@@ -0,0 +1,72 @@
+# utils/sessions.py
+"""
+Per-session slot memory for the planning service.
+
+Same merge rule as the Streamlit app's ``update_slots``: a new non-empty
+value overwrites the stored one, empty values keep what the user said
+earlier. Sessions expire after SESSION_TTL seconds of inactivity and the
+least recently used ones are dropped beyond SESSION_MAX.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(6 * 3600)))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+
+EMPTY_SLOTS = {"destination": None, "trip_type": None, "budget": None, "days": None}
+
+
+def merge_slots(stored: dict, new_slots: dict) -> dict:
+    """Merge ``new_slots`` into ``stored`` in place and return it."""
+    for key, value in new_slots.items():
+        if value and str(value).strip():
+            stored[key] = value
+    return stored
+
+
+class SessionStore:
+    def __init__(self, ttl_seconds: float = SESSION_TTL, max_sessions: int = SESSION_MAX):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # id -> (last_seen, slots)
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._sessions:
+            session_id, (last_seen, _) = next(iter(self._sessions.items()))
+            if now - last_seen <= self.ttl_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def get(self, session_id: str) -> dict:
+        """A copy of the session's slots (empty slots for an unknown session)."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or time.time() - entry[0] > self.ttl_seconds:
+                return dict(EMPTY_SLOTS)
+            return dict(entry[1])
+
+    def update(self, session_id: str, new_slots: dict) -> dict:
+        """Merge ``new_slots`` into the session and return a copy of the result."""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            slots = entry[1] if entry and now - entry[0] <= self.ttl_seconds else dict(EMPTY_SLOTS)
+            merge_slots(slots, new_slots)
+            self._sessions[session_id] = (now, slots)
+            self._expire(now)
+            return dict(slots)
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
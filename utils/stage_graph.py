@@ -0,0 +1,132 @@
+# utils/stage_graph.py
+"""
+Small stage-graph executor for the planning pipeline.
+
+Each Stage declares the values it reads (``inputs``), the value it produces
+(``output``) and optional ordering-only dependencies (``after``). A stage is
+submitted to a shared thread pool as soon as everything it depends on exists,
+so independent stages overlap. A stage with ``abort_when`` stops the run when
+its predicate is true: queued stages are cancelled, in-flight ones are
+abandoned and their results discarded.
+"""
+import contextvars
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "16"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Process-wide pool shared by every graph run and background task."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS,
+                                           thread_name_prefix="stage")
+        return _executor
+
+
+class Stage:
+    def __init__(self, name, fn, inputs=(), output=None, after=(), abort_when=None):
+        self.name = name
+        self.fn = fn
+        self.inputs = list(inputs)
+        self.output = output or name
+        self.after = list(after)
+        self.abort_when = abort_when
+
+    @property
+    def dependencies(self):
+        return self.inputs + self.after
+
+
+class StageGraph:
+    def __init__(self, stages, initial_inputs=()):
+        self.stages = list(stages)
+        self._validate(set(initial_inputs))
+
+    def _validate(self, available):
+        """Reject unknown inputs and cycles up front rather than hanging at run time."""
+        remaining = list(self.stages)
+        while remaining:
+            ready = [s for s in remaining if all(d in available for d in s.dependencies)]
+            if not ready:
+                missing = {s.name: [d for d in s.dependencies if d not in available]
+                           for s in remaining}
+                raise ValueError(f"Unsatisfiable stage dependencies: {missing}")
+            for stage in ready:
+                available.add(stage.output)
+                remaining.remove(stage)
+
+    def run(self, **initial) -> dict:
+        """
+        Execute the graph and return
+        ``{"values": {...}, "timings": {stage: seconds}, "aborted_by": name or None}``.
+        Exceptions raised by a stage propagate after the other stages are cancelled.
+        """
+        values = dict(initial)
+        timings = {}
+        pending = list(self.stages)
+        running = {}
+        executor = get_executor()
+
+        def timed(stage, args):
+            start = time.perf_counter()
+            try:
+                return stage.fn(*args)
+            finally:
+                timings[stage.name] = round(time.perf_counter() - start, 4)
+
+        def cancel_running():
+            for future in running:
+                future.cancel()
+
+        while pending or running:
+            for stage in [s for s in pending if all(d in values for d in s.dependencies)]:
+                pending.remove(stage)
+                args = [values[name] for name in stage.inputs]
+                # Each stage runs in a copy of the caller's context so tracing
+                # spans opened inside it nest under the caller's span
+                context = contextvars.copy_context()
+                running[executor.submit(context.run, timed, stage, args)] = stage
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    value = future.result()
+                except Exception:
+                    cancel_running()
+                    raise
+                values[stage.output] = value
+
+                if stage.abort_when is not None and stage.abort_when(value):
+                    cancel_running()
+                    return {"values": values, "timings": timings, "aborted_by": stage.name}
+
+        return {"values": values, "timings": timings, "aborted_by": None}
+
+
+def run_in_background(fn, *args, on_done=None):
+    """
+    Run ``fn(*args)`` off the caller's critical path. ``on_done(result, error)``
+    is called from the worker thread when it finishes.
+    """
+    def task():
+        try:
+            result = fn(*args)
+        except Exception as e:
+            if on_done:
+                on_done(None, e)
+            return None
+        if on_done:
+            on_done(result, None)
+        return result
+
+    # Copy the context so the task's spans stay in the caller's trace
+    return get_executor().submit(contextvars.copy_context().run, task)
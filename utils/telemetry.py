@@ -0,0 +1,339 @@
+# utils/telemetry.py
+"""
+Lightweight tracing and metrics for the planning pipeline.
+
+``span(name)`` times a block and records its status, attributes, token
+counts and errors; spans nest (also across stage-graph threads) and share a
+trace id per request. Finished spans are
+
+- appended as JSON lines to a size-rotated trace file (TRACE_FILE), and
+- aggregated into Prometheus metrics served as text on METRICS_PORT.
+
+Set TELEMETRY=1 to enable. When disabled ``span`` hands back one shared
+no-op object and ``traced`` calls straight through, so the instrumentation
+costs a flag check per call.
+
+Prompt/completion tokens are counted with tiktoken's cl100k_base encoding,
+an approximation for Llama-family models that is stable across runs.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from logging.handlers import RotatingFileHandler
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY", "0").lower() in ("1", "true", "yes")
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join("logs", "trace.jsonl"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "5"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = no endpoint
+
+# Upper bounds (seconds) of the span duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_enabled = TELEMETRY_ENABLED
+
+
+def configure(enabled: bool = None, trace_file: str = None):
+    """Switch telemetry on/off (and move the trace file) at run time."""
+    global _enabled, TRACE_FILE, _trace_logger
+    if enabled is not None:
+        _enabled = enabled
+    if trace_file is not None:
+        TRACE_FILE = trace_file
+        _trace_logger = None
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+# -------------------------
+# Spans
+# -------------------------
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id",
+                 "start_time", "_start", "_token")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def add(self, key, amount=1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = uuid.uuid4().hex[:16]
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        status = "ok"
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            status = "error"
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _export(self, duration, status)
+        return False
+
+
+def span(name: str, **attributes):
+    """Context manager timing one unit of work; a no-op when telemetry is off."""
+    if not _enabled:
+        return NOOP_SPAN
+    return Span(name, attributes)
+
+
+def current_span():
+    """The innermost open span of this context (or the no-op span)."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def traced(name: str):
+    """Decorator form of ``span`` for plain (non-generator) functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0):
+    """Count cache hits/misses, both as metrics and on the current span."""
+    if not _enabled:
+        return
+    if hits:
+        _metrics.inc("voyage_cache_events_total", {"cache": cache, "result": "hit"}, hits)
+    if misses:
+        _metrics.inc("voyage_cache_events_total", {"cache": cache, "result": "miss"}, misses)
+    current = current_span()
+    if hits:
+        current.add(f"{cache}_cache_hits", hits)
+    if misses:
+        current.add(f"{cache}_cache_misses", misses)
+
+
+def increment(name: str, amount: float = 1, **labels):
+    """Add ``amount`` to the counter ``name`` with the given labels."""
+    if _enabled:
+        _metrics.inc(name, labels, amount)
+
+
+# -------------------------
+# Tokens
+# -------------------------
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # no tiktoken or no cached encoding offline
+            _encoding = False
+    if _encoding is False:
+        return max(1, len(text) // 4) if text else 0
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+class TokenCountingCallback(BaseCallbackHandler):
+    """Adds prompt/completion token counts of every LLM call to the current span."""
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        if _enabled:
+            current_span().add("prompt_tokens", sum(count_tokens(p) for p in prompts))
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        if _enabled:
+            current_span().add("prompt_tokens", sum(count_tokens(str(m.content))
+                                                    for batch in messages for m in batch))
+
+    def on_llm_end(self, response, **kwargs):
+        if _enabled:
+            current_span().add("completion_tokens", sum(count_tokens(g.text)
+                                                        for batch in response.generations
+                                                        for g in batch))
+
+
+# -------------------------
+# Export
+# -------------------------
+_trace_logger = None
+_trace_lock = threading.Lock()
+
+
+def _get_trace_logger():
+    global _trace_logger
+    if _trace_logger is not None:
+        return _trace_logger
+    with _trace_lock:
+        if _trace_logger is None:
+            os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+            logger = logging.getLogger("agentic_voyage.trace")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                handler.close()
+            handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_MAX_BYTES,
+                                          backupCount=TRACE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            _trace_logger = logger
+        return _trace_logger
+
+
+def _export(finished: Span, duration: float, status: str):
+    labels = {"span": finished.name}
+    _metrics.inc("voyage_span_total", {**labels, "status": status})
+    _metrics.observe("voyage_span_duration_seconds", labels, duration)
+    for kind in ("prompt", "completion"):
+        tokens = finished.attributes.get(f"{kind}_tokens")
+        if tokens:
+            _metrics.inc("voyage_tokens_total", {**labels, "kind": kind}, tokens)
+
+    record = {
+        "trace_id": finished.trace_id, "span_id": finished.span_id,
+        "parent_id": finished.parent_id, "name": finished.name,
+        "start": round(finished.start_time, 6), "duration_ms": round(duration * 1000, 3),
+        "status": status, "attributes": finished.attributes,
+    }
+    _get_trace_logger().info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class _Metrics:
+    """Counters and histograms keyed by (name, sorted label pairs)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name: str, labels: dict, amount: float = 1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, labels: dict, value: float):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * len(DURATION_BUCKETS),
+                                                    "sum": 0.0, "count": 0}
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+_metrics = _Metrics()
+
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines, typed = [], set()
+    with _metrics._lock:
+        counters = sorted(_metrics.counters.items())
+        histograms = sorted((key, dict(h, buckets=list(h["buckets"])))
+                            for key, h in _metrics.histograms.items())
+    for (name, pairs), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(pairs)} {value}")
+    for (name, pairs), histogram in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+            lines.append(f"{name}_bucket{_format_labels(pairs + (('le', bound),))} {count}")
+        lines.append(f"{name}_bucket{_format_labels(pairs + (('le', '+Inf'),))} {histogram['count']}")
+        lines.append(f"{name}_sum{_format_labels(pairs)} {round(histogram['sum'], 6)}")
+        lines.append(f"{name}_count{_format_labels(pairs)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve ``/metrics`` from a daemon thread; no-op when port is 0 or already running."""
+    global _metrics_server
+    if not port or _metrics_server is not None:
+        return _metrics_server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # keep scrapes out of the console
+
+    _metrics_server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+    return _metrics_server
@@ -0,0 +1,87 @@
+# warm_cache.py
+"""
+Precompute the plans of the most requested slot combinations.
+
+    python warm_cache.py                       # one run now (inside WARM_WINDOW)
+    python warm_cache.py --daemon              # once per off-peak window, forever
+    python warm_cache.py --report              # share of live traffic warmed entries served
+
+Targets are data/warm_slots.json plus the top combinations of the query log
+(logs/queries.jsonl); see utils.cache_warmer for the limits. A separate
+process only helps the app and service when they share its PLAN_CACHE_DB;
+otherwise start the service with CACHE_WARMER=1.
+"""
+import argparse
+import json
+import logging
+import time
+
+from utils.cache_warmer import (WARM_LOOKBACK_HOURS, WARM_MAX_PLANS, WARM_MAX_SECONDS,
+                                WARM_RATE_PER_MINUTE, WARM_SLOTS_FILE, WARM_TOP_N, WARM_WINDOW,
+                                parse_window, run_scheduled, traffic_report, warm_cache,
+                                warm_targets)
+from utils.model_registry import warm_up
+from utils.plan_cache import PLAN_CACHE_DB
+from utils.query_log import QUERY_LOG, read_query_log
+from utils.telemetry import start_metrics_server
+
+
+def print_traffic(report: dict, hours: float):
+    print(f"\n📈 Last {hours:g}h: {report['requests']} requests, "
+          f"cache hit rate {report['cache_hit_rate']:.1%}, "
+          f"served by warmed entries {report['warmed_share']:.1%}")
+    for name, count in report["served_by"].items():
+        print(f"  {name:<10}{count:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm the plan cache with popular slot combinations")
+    parser.add_argument("--slots", default=WARM_SLOTS_FILE, help="JSON list of slot objects to warm first")
+    parser.add_argument("--log", default=QUERY_LOG, help="query log to derive popular combinations from")
+    parser.add_argument("--top", type=int, default=WARM_TOP_N)
+    parser.add_argument("--lookback-hours", type=float, default=WARM_LOOKBACK_HOURS)
+    parser.add_argument("--rate", type=float, default=WARM_RATE_PER_MINUTE, help="plans started per minute")
+    parser.add_argument("--max-plans", type=int, default=WARM_MAX_PLANS)
+    parser.add_argument("--max-seconds", type=float, default=WARM_MAX_SECONDS,
+                        help="pipeline seconds to spend at most")
+    parser.add_argument("--window", default=WARM_WINDOW, help='off-peak "HH:MM-HH:MM"; "" = any time')
+    parser.add_argument("--daemon", action="store_true", help="warm once per window until stopped")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be warmed")
+    parser.add_argument("--report", action="store_true", help="only print the traffic report")
+    parser.add_argument("--report-hours", type=float, default=24.0)
+    parser.add_argument("--skip-warm-up", action="store_true")
+    args = parser.parse_args()
+
+    if args.report:
+        records = list(read_query_log(args.log, time.time() - args.report_hours * 3600))
+        print_traffic(traffic_report(records), args.report_hours)
+        raise SystemExit(0)
+
+    if not PLAN_CACHE_DB:
+        print("⚠️ PLAN_CACHE_DB is not set: warmed plans only live in this process's memory")
+    start_metrics_server()  # only when METRICS_PORT is set
+    if not args.skip_warm_up and not args.dry_run:
+        warm_up()
+
+    window = parse_window(args.window)
+    limits = {"rate_per_minute": args.rate, "max_plans": args.max_plans,
+              "max_seconds": args.max_seconds}
+
+    def targets():
+        return warm_targets(args.slots, args.log, args.top, args.lookback_hours)
+
+    if args.daemon:
+        # run_scheduled reports each run through the utils.cache_warmer logger
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
+        try:
+            run_scheduled(window, targets=targets, **limits)
+        except KeyboardInterrupt:
+            pass
+        raise SystemExit(0)
+
+    report = warm_cache(targets(), window=window, dry_run=args.dry_run, **limits)
+    for slots in report.pop("would_warm", []):
+        print(f"Would warm {slots}")
+    print(json.dumps(report, indent=2))
+    records = list(read_query_log(args.log, time.time() - args.report_hours * 3600))
+    print_traffic(traffic_report(records), args.report_hours)